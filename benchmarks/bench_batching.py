@@ -0,0 +1,77 @@
+"""
+Benchmark dynamic batching against running one request per session run.
+
+Drives an in-process TFServeApp serving `tests/models/graph.pb` from
+concurrent client threads and reports requests per second.
+
+Run from the repository root:
+
+    $ python benchmarks/bench_batching.py --requests 5000 --concurrency 32
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import TFServeApp
+
+MODEL_PATH = "./tests/models/graph.pb"
+IN_T = "import/x:0"
+OUT_T = "import/out:0"
+
+
+def encode(req_bytes):
+    return {IN_T: np.array(json.loads(req_bytes.decode('utf-8')), dtype=np.float32)}
+
+
+def decode(outputs):
+    return float(outputs[OUT_T])
+
+
+def requests_per_sec(app, total, concurrency):
+    body = json.dumps([1.0, 2.0, 3.0, 4.0, 5.0]).encode()
+    per_thread = total // concurrency
+
+    def worker():
+        for _ in range(per_thread):
+            app._make_inference_impl(body)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return per_thread * concurrency / (time.perf_counter() - start)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Dynamic batching benchmark")
+    p.add_argument('--requests', type=int, default=5000)
+    p.add_argument('--concurrency', type=int, default=32)
+    p.add_argument('--max-batch-size', type=int, default=32)
+    p.add_argument('--max-queue-delay', type=int, default=1000)
+    args = p.parse_args()
+
+    unbatched = TFServeApp(MODEL_PATH, [IN_T], [OUT_T], encode, decode)
+    batched = TFServeApp(
+        MODEL_PATH, [IN_T], [OUT_T], encode, decode,
+        max_batch_size=args.max_batch_size,
+        max_queue_delay_us=args.max_queue_delay)
+
+    print("concurrency: %i, requests: %i" % (args.concurrency, args.requests))
+    print("  batch size 1:       %10.1f req/s" % requests_per_sec(
+        unbatched, args.requests, args.concurrency))
+    print("  max batch size %-4i %10.1f req/s" % (args.max_batch_size, requests_per_sec(
+        batched, args.requests, args.concurrency)))
+
+
+if __name__ == '__main__':
+    main()
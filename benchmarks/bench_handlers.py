@@ -0,0 +1,73 @@
+"""
+Benchmark request/response processing of the built-in handlers.
+
+Measures the time spent by each handler to encode a request body into
+model inputs and to decode model outputs into a response body, for an
+image-sized input and a classifier-sized output. No model is run.
+
+Run from the repository root:
+
+    $ python benchmarks/bench_handlers.py --repeat 20
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import binary_handler
+from tfserve import json_handler
+
+IN_T = "input:0"
+OUT_T = "output:0"
+
+
+def _json_body(inputs):
+    return json.dumps({name: value.tolist() for name, value in inputs.items()}).encode()
+
+
+def _response_bytes(resp_val):
+    if hasattr(resp_val, "get_data"):
+        return resp_val.get_data()
+    return json.dumps(resp_val).encode()
+
+
+HANDLERS = [
+    ("json", json_handler, _json_body),
+    ("binary", binary_handler, binary_handler.pack_tensors),
+]
+
+
+def bench(name, module, make_body, inputs, outputs, repeat):
+    handler = module.create_handler(inputs=[IN_T], outputs=[OUT_T], batch=False)
+    body = bytes(make_body(inputs))
+    encode = min(timeit.repeat(lambda: handler.encode(body), number=1, repeat=repeat))
+    decode = min(timeit.repeat(
+        lambda: _response_bytes(handler.decode(outputs)), number=1, repeat=repeat))
+    print("  %-8s %10i %12.3f %12.3f" % (name, len(body), encode * 1e3, decode * 1e3))
+
+
+def main():
+    p = argparse.ArgumentParser(description="Handler encode/decode benchmark")
+    p.add_argument('--repeat', type=int, default=20)
+    p.add_argument('--image-size', type=int, default=224)
+    p.add_argument('--classes', type=int, default=1001)
+    args = p.parse_args()
+
+    inputs = {IN_T: np.random.rand(args.image_size, args.image_size, 3).astype(np.float32)}
+    outputs = {OUT_T: np.random.rand(args.classes).astype(np.float32)}
+
+    print("input %s float32, output %s float32 (best of %i)" % (
+        inputs[IN_T].shape, outputs[OUT_T].shape, args.repeat))
+    print("  %-8s %10s %12s %12s" % ("handler", "bytes", "encode ms", "decode ms"))
+    for name, module, make_body in HANDLERS:
+        bench(name, module, make_body, inputs, outputs, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark the fast JSON handler against the JSON handler.
+
+For a few payload sizes, measures encode (request body to model inputs,
+including the conversion to an array of the placeholder dtype) and decode
+(model outputs to response body) times. No model is run.
+
+Run from the repository root:
+
+    $ python benchmarks/bench_json.py --repeat 10
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import fastjson_handler
+from tfserve import json_handler
+
+IN_T = "input:0"
+OUT_T = "output:0"
+
+SIZES = [10, 1000, 100000, 1000000]
+
+
+def _response_bytes(resp_val):
+    if hasattr(resp_val, "get_data"):
+        return resp_val.get_data()
+    return json.dumps(resp_val).encode()
+
+
+def bench(handler, body, outputs, repeat):
+    def encode():
+        inputs = handler.encode(body)
+        return np.asarray(inputs[IN_T], dtype=np.float32)
+    encode_s = min(timeit.repeat(encode, number=1, repeat=repeat))
+    decode_s = min(timeit.repeat(
+        lambda: _response_bytes(handler.decode(outputs)), number=1, repeat=repeat))
+    return encode_s, decode_s
+
+
+def main():
+    p = argparse.ArgumentParser(description="JSON handlers benchmark")
+    p.add_argument('--repeat', type=int, default=10)
+    args = p.parse_args()
+
+    print("float32 payloads (best of %i)" % args.repeat)
+    print("  %10s %-9s %12s %12s" % ("elements", "handler", "encode ms", "decode ms"))
+    for size in SIZES:
+        value = np.random.rand(size).astype(np.float32)
+        body = json.dumps({IN_T: value.tolist()}).encode()
+        outputs = {OUT_T: value}
+        specs = {IN_T: (np.dtype(np.float32), [None, size])}
+        handlers = [
+            ("json", json_handler.create_handler(inputs=[IN_T], outputs=[OUT_T])),
+            ("fastjson", fastjson_handler.create_handler(inputs=[IN_T], outputs=[OUT_T])),
+        ]
+        for name, handler in handlers:
+            handler.set_input_specs(specs)
+            encode_s, decode_s = bench(handler, body, outputs, args.repeat)
+            print("  %10i %-9s %12.3f %12.3f" % (size, name, encode_s * 1e3, decode_s * 1e3))
+
+
+if __name__ == '__main__':
+    main()
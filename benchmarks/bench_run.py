@@ -0,0 +1,59 @@
+"""
+Benchmark the per call overhead of running the model.
+
+Runs the tiny `tests/models/graph.pb` model with a single input, so the time
+per call is almost all Python and session overhead, with `Session.run` and a
+feed dict, with a callable made by `Session.make_callable`, and through
+`TFServeApp._run_session` (which uses the callable). Reports microseconds
+per call.
+
+Run from the repository root:
+
+    $ python benchmarks/bench_run.py --calls 20000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import TFServeApp
+
+MODEL_PATH = "./tests/models/graph.pb"
+IN_T = "import/x:0"
+OUT_T = "import/out:0"
+
+
+def us_per_call(fn, calls):
+    for _ in range(min(calls, 100)):
+        fn()
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    p = argparse.ArgumentParser(description="Model run overhead benchmark")
+    p.add_argument('--calls', type=int, default=20000)
+    args = p.parse_args()
+
+    app = TFServeApp(MODEL_PATH, [IN_T], [OUT_T], None, None)
+    x = np.ones((1, 5), dtype=np.float32)
+    run_callable = app.sess.make_callable([OUT_T], [IN_T])
+
+    print("calls: %i" % args.calls)
+    print("  Session.run:           %8.1f us/call" % us_per_call(
+        lambda: app.sess.run([OUT_T], feed_dict={IN_T: x}), args.calls))
+    print("  Session.make_callable: %8.1f us/call" % us_per_call(
+        lambda: run_callable(x), args.calls))
+    print("  TFServeApp run:        %8.1f us/call" % us_per_call(
+        lambda: app._run_session({IN_T: x}), args.calls))
+
+
+if __name__ == '__main__':
+    main()
@@ -44,7 +44,8 @@ setup(name='tfserve',
       include_package_data=True,
       entry_points={
           'console_scripts': [
-              'tfserve = tfserve.main:main'
+              'tfserve = tfserve.main:main',
+              'tfserve-bench = tfserve.bench:main',
           ]
       }
 )
@@ -0,0 +1,129 @@
+"""Tests request admission control.
+"""
+
+import os
+import sys
+import threading
+import time
+
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.exceptions import TooManyRequests
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve.admission import AdmissionControl
+from tfserve.admission import TIMEOUT_HEADER
+
+class RequestProxy():
+    """Proxy for a Werkzeug request object."""
+
+    def __init__(self, headers=None):
+        self.headers = Headers(headers or {})
+
+def _acquire_in_thread(admission, deadline=None):
+    result = []
+
+    def acquire():
+        try:
+            admission.acquire(deadline)
+        except Exception as e:  # pylint: disable=broad-except
+            result.append(e)
+        else:
+            result.append(None)
+
+    t = threading.Thread(target=acquire)
+    t.start()
+    return t, result
+
+def _wait_queued(admission, count, timeout=5):
+    timeout_at = time.time() + timeout
+    while admission.stats()['queued'] < count:
+        assert time.time() < timeout_at
+        time.sleep(0.001)
+
+class TestAdmission():
+
+    def test_invalid_params(self):
+        with pytest.raises(ValueError):
+            AdmissionControl(0)
+        with pytest.raises(ValueError):
+            AdmissionControl(1, max_queued=-1)
+        with pytest.raises(ValueError):
+            AdmissionControl(1, timeout=0)
+
+    def test_deadline(self):
+        admission = AdmissionControl(1)
+        assert admission.deadline(RequestProxy()) is None
+        now = time.monotonic()
+        deadline = admission.deadline(RequestProxy({TIMEOUT_HEADER: '0.5'}))
+        assert now + 0.5 <= deadline < now + 1
+        for value in ('0', '-1', 'soon', 'nan'):
+            with pytest.raises(BadRequest):
+                admission.deadline(RequestProxy({TIMEOUT_HEADER: value}))
+
+        admission = AdmissionControl(1, timeout=10)
+        assert admission.deadline(RequestProxy()) > time.monotonic() + 5
+
+    def test_queue_full(self):
+        admission = AdmissionControl(1, max_queued=1)
+        admission.acquire()
+        t, result = _acquire_in_thread(admission)
+        _wait_queued(admission, 1)
+        with pytest.raises(TooManyRequests):
+            admission.acquire()
+        admission.release()
+        t.join()
+        assert result == [None]
+        admission.release()
+        stats = admission.stats()
+        assert stats['admitted'] == 2
+        assert stats['queue_full'] == 1
+        assert stats['running'] == 0 and stats['queued'] == 0
+
+    def test_no_queue(self):
+        admission = AdmissionControl(2, max_queued=0)
+        admission.acquire()
+        admission.acquire()
+        with pytest.raises(TooManyRequests):
+            admission.acquire()
+
+    def test_deadline_cant_be_met(self):
+        admission = AdmissionControl(1)
+        admission.observe(1.0)
+        with pytest.raises(ServiceUnavailable):
+            admission.acquire(time.monotonic() + 0.5)
+        admission.acquire(time.monotonic() + 5)
+        with pytest.raises(ServiceUnavailable):
+            admission.acquire(time.monotonic() + 0.5)
+        with pytest.raises(ServiceUnavailable):
+            admission.check(time.monotonic() + 0.5)
+        admission.check(time.monotonic() + 5)
+        admission.check(None)
+        stats = admission.stats()
+        assert stats['deadline'] == 2
+        assert stats['expired'] == 1
+        assert stats['run_ms'] == 1000.0
+
+    def test_expired_while_queued(self):
+        admission = AdmissionControl(1, max_queued=2)
+        admission.observe(0.01)
+        admission.acquire()
+        t, result = _acquire_in_thread(admission, time.monotonic() + 0.1)
+        _wait_queued(admission, 1)
+        other, other_result = _acquire_in_thread(admission)
+        t.join(5)
+        assert isinstance(result[0], ServiceUnavailable)
+        admission.release()
+        other.join(5)
+        assert other_result == [None]
+        assert admission.stats()['expired'] == 1
+
+    def test_observe(self):
+        admission = AdmissionControl(1)
+        admission.observe(0.1)
+        admission.observe(0.2)
+        assert admission.stats()['run_ms'] == pytest.approx(110.0)
@@ -0,0 +1,168 @@
+"""Tests dynamic batching.
+"""
+
+import os
+import sys
+import threading
+
+import numpy as np
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve.batching import Batcher
+
+class RecordingRun():
+    """Fake session run that doubles its input and records batch sizes."""
+
+    def __init__(self):
+        self.batch_sizes = []
+        self.lock = threading.Lock()
+
+    def __call__(self, feed_dict):
+        x = feed_dict['x:0']
+        with self.lock:
+            self.batch_sizes.append(x.shape[0])
+        return [x * 2]
+
+def _run_concurrently(batcher, feeds):
+    """Run feeds from concurrent threads.
+
+    Errors raised by the batcher are returned in place of results.
+    """
+    results = [None] * len(feeds)
+    def target(i):
+        try:
+            results[i] = batcher.run(feeds[i])
+        except Exception as e:  # pylint: disable=broad-except
+            results[i] = e
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(len(feeds))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+class TestBatcher():
+
+    def test_invalid_params(self):
+        with pytest.raises(ValueError):
+            Batcher(RecordingRun(), 0, 1000)
+
+        with pytest.raises(ValueError):
+            Batcher(RecordingRun(), 4, -1)
+
+    def test_single_feed(self):
+        run = RecordingRun()
+        batcher = Batcher(run, 8, 0)
+        out = batcher.run({'x:0': np.array([[1.0, 2.0]])})
+        assert out[0].tolist() == [[2.0, 4.0]]
+        assert run.batch_sizes == [1]
+        batcher.close()
+
+    def test_concurrent_feeds_are_batched(self):
+        run = RecordingRun()
+        batcher = Batcher(run, 4, 2000000)
+        feeds = [{'x:0': np.array([[float(i)]])} for i in range(4)]
+        results = _run_concurrently(batcher, feeds)
+        for i, out in enumerate(results):
+            assert out[0].tolist() == [[2.0 * i]]
+        assert run.batch_sizes == [4]
+        batcher.close()
+
+    def test_incompatible_shapes_not_stacked(self):
+        run = RecordingRun()
+        batcher = Batcher(run, 2, 100000)
+        feeds = [
+            {'x:0': np.zeros((1, 2))},
+            {'x:0': np.zeros((1, 3))},
+        ]
+        results = _run_concurrently(batcher, feeds)
+        assert [r[0].shape for r in results] == [(1, 2), (1, 3)]
+        assert sorted(run.batch_sizes) == [1, 1]
+        batcher.close()
+
+    def test_errors_raised_for_every_feed(self):
+        def failing_run(_feed_dict):
+            raise ValueError("bad feed")
+        batcher = Batcher(failing_run, 2, 100000)
+        feeds = [{'x:0': np.zeros((1, 2))} for _ in range(2)]
+        results = _run_concurrently(batcher, feeds)
+        assert [str(r) for r in results] == ["bad feed", "bad feed"]
+        batcher.close()
+
+    def test_outputs_without_batch_dimension(self):
+        batcher = Batcher(lambda feed_dict: [np.float32(1.0)], 2, 100000)
+        feeds = [{'x:0': np.zeros((1, 2))} for _ in range(2)]
+        results = _run_concurrently(batcher, feeds)
+        assert all(isinstance(r, ValueError) for r in results)
+        batcher.close()
+
+    def test_padding_to_bucket_boundaries(self):
+        run = RecordingRun()
+        batcher = Batcher(run, 2, 2000000, bucket_boundaries=[4, 8])
+        feeds = [
+            {'x:0': np.ones((1, 3))},
+            {'x:0': np.ones((1, 4))},
+        ]
+        results = _run_concurrently(batcher, feeds)
+        assert results[0][0].tolist() == [[2.0, 2.0, 2.0, 0.0]]
+        assert results[1][0].tolist() == [[2.0, 2.0, 2.0, 2.0]]
+        assert run.batch_sizes == [2]
+        batcher.close()
+
+    def test_padding_only_unknown_dims(self):
+        def run(feed_dict):
+            return [feed_dict['x:0'], feed_dict['y:0']]
+        specs = {
+            'x:0': (np.float64, [None, None]),
+            'y:0': (np.float64, [None, 5]),
+        }
+        batcher = Batcher(run, 2, 2000000, bucket_boundaries=[8, 16], input_specs=specs)
+        feeds = [
+            {'x:0': np.ones((1, 3)), 'y:0': np.ones((1, 5))},
+            {'x:0': np.ones((1, 6)), 'y:0': np.ones((1, 5))},
+        ]
+        results = _run_concurrently(batcher, feeds)
+        for x, y in results:
+            assert x.shape == (1, 8)
+            assert y.shape == (1, 5)
+        assert x[0, 6:].tolist() == [0.0, 0.0]
+        batcher.close()
+
+    def test_inputs_longer_than_boundaries(self):
+        run = RecordingRun()
+        batcher = Batcher(run, 1, 0, bucket_boundaries=[2])
+        out = batcher.run({'x:0': np.ones((1, 3))})
+        assert out[0].shape == (1, 3)
+        batcher.close()
+
+    def test_invalid_boundaries(self):
+        with pytest.raises(ValueError):
+            Batcher(RecordingRun(), 2, 0, bucket_boundaries=[8, 4])
+
+    def test_stats(self):
+        batcher = Batcher(RecordingRun(), 4, 2000000, bucket_boundaries=[4])
+        feeds = [{'x:0': np.ones((1, 2))} for _ in range(4)]
+        _run_concurrently(batcher, feeds)
+        stats = batcher.stats()
+        assert stats == {
+            "x:0[4]float64": {
+                "batches": 1,
+                "requests": 4,
+                "occupancy": 1.0,
+                "padding_waste": 0.5,
+            }
+        }
+        batcher.close()
+
+    def test_multiple_workers(self):
+        run = RecordingRun()
+        batcher = Batcher(run, 1, 0, num_workers=4)
+        feeds = [{'x:0': np.array([[float(i)]])} for i in range(8)]
+        results = _run_concurrently(batcher, feeds)
+        for i, out in enumerate(results):
+            assert out[0].tolist() == [[2.0 * i]]
+        assert run.batch_sizes == [1] * 8
+        batcher.close()
@@ -0,0 +1,102 @@
+"""Tests benchmark tool.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import bench
+from tfserve import binary_handler
+
+class Sender():
+    """Send function that records bodies and fails on b'error'."""
+
+    def __init__(self, delay=0):
+        self.delay = delay
+        self.bodies = []
+        self.lock = threading.Lock()
+
+    def __call__(self, body):
+        time.sleep(self.delay)
+        with self.lock:
+            self.bodies.append(body)
+        if body == b'error':
+            raise IOError(body)
+
+class TestBench():
+
+    specs = {
+        'x:0': (np.dtype(np.float32), [None, 5]),
+        'y:0': (np.dtype(np.int64), [None, None, 2]),
+    }
+
+    def test_closed_loop(self):
+        send = Sender()
+        result = bench.run_closed_loop(send, [b'a', b'b', b'error'], 4, requests=30)
+        assert len(send.bodies) == 30
+        assert result.errors == 10
+        summary = result.summary()
+        assert summary['requests'] == 30
+        assert summary['errors'] == 10
+        assert set(summary['latency_ms']) == {'p50', 'p90', 'p99', 'p99.9', 'mean', 'max'}
+
+    def test_open_loop(self):
+        send = Sender()
+        result = bench.run_open_loop(send, [b'a'], rate=200, concurrency=4, requests=20)
+        assert len(result.latencies) == 20
+        # 20 requests at 200 req/s are scheduled over 95 ms.
+        assert result.elapsed >= 0.095
+
+    def test_duration(self):
+        send = Sender(delay=0.01)
+        result = bench.run_closed_loop(send, [b'a'], 2, duration=0.1)
+        assert 0 < len(result.latencies) <= 22
+
+    def test_generate_inputs(self):
+        inputs = bench.generate_inputs(self.specs, 3, dim_size=4)
+        assert len(inputs) == 3
+        assert inputs[0]['x:0'].shape == (5,)
+        assert inputs[0]['x:0'].dtype == np.float32
+        assert inputs[0]['y:0'].shape == (4, 2)
+        assert inputs[0]['y:0'].dtype == np.int64
+
+        batches = bench.generate_inputs(self.specs, 1, batch_size=8)
+        assert batches[0]['x:0'].shape == (8, 5)
+
+        with pytest.raises(ValueError):
+            bench.generate_inputs({'x:0': (np.dtype(np.float32), None)}, 1)
+
+    def test_request_body(self):
+        inputs = bench.generate_inputs(self.specs, 1)[0]
+        decoded = json.loads(bench.request_body(inputs, 'json').decode('utf-8'))
+        assert np.allclose(decoded['x:0'], inputs['x:0'])
+        unpacked = binary_handler.unpack_tensors(bench.request_body(inputs, 'binary'))
+        assert np.array_equal(unpacked['y:0'], inputs['y:0'])
+        with pytest.raises(ValueError):
+            bench.request_body(inputs, 'my.handler')
+
+    def test_read_replay(self, tmpdir):
+        path = tmpdir.join('requests.jsonl')
+        path.write('{"x:0": [1, 2]}\n\n{"x:0": [3, 4]}\n')
+        assert bench.read_requests(str(path)) == [b'{"x:0": [1, 2]}', b'{"x:0": [3, 4]}']
+        path.write('{"x:0": [1, 2]}\nfoo\n')
+        with pytest.raises(ValueError):
+            bench.read_requests(str(path))
+
+    def test_main_invalid_replay(self, tmpdir, monkeypatch):
+        path = tmpdir.join('requests.jsonl')
+        path.write('foo\n')
+        for replay in (str(path), str(tmpdir.join('missing.jsonl'))):
+            monkeypatch.setattr(
+                sys, 'argv', ['tfserve-bench', '--url', 'http://localhost:1/', '--replay', replay])
+            with pytest.raises(SystemExit) as e:
+                bench.main()
+            assert replay in str(e.value)
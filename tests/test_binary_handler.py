@@ -0,0 +1,92 @@
+"""Tests binary tensor handler.
+"""
+
+import json
+import os
+import struct
+import sys
+
+import numpy as np
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import BadInput
+from tfserve import binary_handler
+
+class TestBinaryHandler():
+
+    handler = binary_handler.create_handler(
+        inputs=['x:0'], outputs=['out:0'], batch=False)
+
+    def test_round_trip(self):
+        tensors = {
+            'x:0': np.arange(12, dtype=np.float32).reshape(3, 4),
+            'y:0': np.array(7, dtype=np.int64),
+            'z:0': np.zeros((0, 2), dtype=np.uint8),
+        }
+        unpacked = binary_handler.unpack_tensors(binary_handler.pack_tensors(tensors))
+        assert sorted(unpacked) == sorted(tensors)
+        for name, value in tensors.items():
+            assert unpacked[name].dtype == value.dtype
+            assert unpacked[name].shape == value.shape
+            assert np.array_equal(unpacked[name], value)
+
+    def test_alignment(self):
+        frame = binary_handler.pack_tensors({
+            'a': np.ones(3, dtype=np.float64),
+            'b': np.ones(5, dtype=np.float64),
+        })
+        for value in binary_handler.unpack_tensors(frame).values():
+            assert value.ctypes.data % binary_handler.ALIGNMENT == (
+                np.frombuffer(frame, np.uint8).ctypes.data % binary_handler.ALIGNMENT)
+
+    def test_big_endian_and_non_contiguous(self):
+        value = np.arange(6, dtype='>i4').reshape(2, 3).T
+        unpacked = binary_handler.unpack_tensors(binary_handler.pack_tensors({'x': value}))
+        assert unpacked['x'].dtype.str == '<i4'
+        assert np.array_equal(unpacked['x'], value)
+
+    def test_unsupported_dtype(self):
+        with pytest.raises(ValueError):
+            binary_handler.pack_tensors({'x': np.array(['foo'])})
+
+    def test_encode(self):
+        frame = binary_handler.pack_tensors({'x:0': np.ones(5, dtype=np.float32)})
+        inputs = self.handler.encode(frame)
+        assert inputs['x:0'].tolist() == [1.0] * 5
+        assert not inputs['x:0'].flags.writeable
+
+    def test_encode_errors(self):
+        with pytest.raises(BadInput):
+            self.handler.encode(b'')
+
+        with pytest.raises(BadInput):
+            self.handler.encode(b'not a tensor frame')
+
+        with pytest.raises(BadInput):
+            self.handler.encode(binary_handler.pack_tensors({}))
+
+        frame = binary_handler.pack_tensors({'x:0': np.ones(5, dtype=np.float32)})
+        with pytest.raises(BadInput):
+            self.handler.encode(frame[:-4])
+
+    def test_invalid_shapes(self):
+        for shape, nbytes in [([-1, -4], 16), ([2 ** 62, 2 ** 62], 0), ([2.0, 2], 16), (4, 16)]:
+            header = json.dumps({"tensors": [{
+                "name": "x:0", "dtype": "<f4", "shape": shape, "offset": 0, "nbytes": nbytes,
+            }]}).encode()
+            frame = struct.pack("<4sI", binary_handler.MAGIC, len(header)) + header
+            frame += bytes(-len(frame) % binary_handler.ALIGNMENT + nbytes)
+            with pytest.raises(BadInput):
+                self.handler.encode(frame)
+            with pytest.raises(BadInput):
+                parser = self.handler.stream_parser()
+                parser.close(frame[:parser.feed(frame)])
+
+    def test_decode(self):
+        resp = self.handler.decode({'out:0': np.float32(0.5)})
+        assert resp.content_type == binary_handler.MEDIA_TYPE
+        outputs = binary_handler.unpack_tensors(resp.get_data())
+        assert outputs['out:0'].tolist() == 0.5
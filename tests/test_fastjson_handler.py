@@ -0,0 +1,114 @@
+"""Tests fast JSON handler.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import BadInput
+from tfserve import fastjson_handler
+
+def _handler(batch=False, shape=None, precision=None, dtype=np.float32):
+    handler = fastjson_handler.create_handler(
+        inputs=['x:0'], outputs=['out:0'], batch=batch, precision=precision)
+    handler.set_input_specs({'x': (np.dtype(dtype), shape or [None, 5])})
+    return handler
+
+class TestFastJSONHandler():
+
+    def test_typed_arrays(self):
+        inputs = _handler().encode(b'{"x:0": [1, 2, 3, 4.5, -5e-1]}')
+        assert inputs['x:0'].dtype == np.float32
+        assert inputs['x:0'].tolist() == [1.0, 2.0, 3.0, 4.5, -0.5]
+
+    def test_batch_arrays(self):
+        inputs = _handler(batch=True, shape=[None, 2]).encode(
+            b'{"x:0": [[1, 2], [3, 4], [5, 6]]}')
+        assert inputs['x:0'].dtype == np.float32
+        assert inputs['x:0'].shape == (3, 2)
+
+    def test_unconvertible_values(self):
+        """Values that can't be converted to the placeholder dtype are left as is.
+
+        """
+        handler = _handler(batch=True, shape=[None, 2])
+        examples = [
+            (b'{"x:0": [[1, 2, 3], [4]]}', [[1, 2, 3], [4]]),
+            (b'{"x:0": [1, "foo"]}', [1, "foo"]),
+            (b'{"x:0": "foo"}', "foo"),
+        ]
+        for body, expected in examples:
+            inputs = handler.encode(body)
+            assert inputs['x:0'] == expected
+
+        inputs = handler.encode(b'{"x:0": [[1, 2]], "y": {"a": [1]}}')
+        assert inputs['x:0'].dtype == np.float32
+        assert inputs['y'] == {"a": [1]}
+
+    def test_integer_inputs(self):
+        handler = _handler(batch=True, shape=[None, 2], dtype=np.uint8)
+        inputs = handler.encode(b'{"x:0": [[0, 255], [1.0, 2]]}')
+        assert inputs['x:0'].dtype == np.uint8
+        assert inputs['x:0'].tolist() == [[0, 255], [1, 2]]
+        for body in (b'[[0, 256]]', b'[[-1, 0]]', b'[[1.7, 0]]', b'[[1e30, 0]]', b'[[1e999, 0]]'):
+            with pytest.raises(BadInput):
+                handler.encode(b'{"x:0": ' + body + b'}')
+
+        handler = _handler(batch=True, shape=[None, 1], dtype=np.int64)
+        with pytest.raises(BadInput):
+            handler.encode(b'{"x:0": [[100000000000000000000000000000]]}')
+
+        handler = _handler(batch=True, shape=[None, 1], dtype=np.float32)
+        with pytest.raises(BadInput):
+            handler.encode(b'{"x:0": [[1' + b'0' * 400 + b']]}')
+
+    def test_errors(self):
+        handler = _handler()
+        with pytest.raises(BadInput) as e:
+            handler.encode(b'')
+        assert "empty request" in e.value.description
+
+        with pytest.raises(BadInput):
+            handler.encode(b'{"x:0": [1, 2,, 4, 5]}')
+
+        with pytest.raises(BadInput):
+            handler.encode(b'{"x:0": [1, 2, 3, 4, 5]')
+
+        with pytest.raises(BadInput) as e:
+            handler.encode(b'[1, 2, 3, 4, 5]')
+        assert "inputs must be a JSON object" in e.value.description
+
+        with pytest.raises(BadInput) as e:
+            handler.encode(b'{}')
+        assert "missing inputs: x:0" in e.value.description
+
+    def test_decode(self):
+        resp = _handler().decode({
+            'out:0': np.array([[0.25, 0.5], [1.0, 2.0]], dtype=np.float32),
+            'classes': np.array([1, 2], dtype=np.int64),
+        })
+        assert resp.content_type == 'application/json'
+        assert json.loads(resp.get_data().decode('utf-8')) == {
+            'out:0': [[0.25, 0.5], [1.0, 2.0]],
+            'classes': [1, 2],
+        }
+
+    def test_decode_non_finite(self):
+        resp = _handler().decode({'out:0': np.array([np.nan, 1.0])})
+        assert resp.get_data() == b'{"out:0":[NaN, 1.0]}'
+
+    def test_decode_round_trip(self):
+        value = np.random.rand(3, 4).astype(np.float32)
+        resp = _handler().decode({'out:0': value})
+        decoded = json.loads(resp.get_data().decode('utf-8'))
+        assert np.array_equal(np.array(decoded['out:0'], dtype=np.float32), value)
+
+    def test_decode_precision(self):
+        resp = _handler(precision=3).decode({'out:0': np.array([1.0 / 3])})
+        assert resp.get_data() == b'{"out:0":[0.333]}'
@@ -1,9 +1,12 @@
 import os
+import shutil
 import sys
+import numpy as np
 import pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from tfserve import loader
+from tfserve import mmap_graph
 
 class TestLoadModel():
 
@@ -24,3 +27,65 @@ class TestLoadModel():
 
     def test_pb(self):
         assert loader.load_model("./tests/models/graph.pb") is not None
+
+    def test_config(self):
+        config = loader.session_config(intra_op_threads=1, inter_op_threads=1)
+        sess = loader.load_model("./tests/models/graph.pb", config)
+        assert sess is not None
+
+    def test_default_config(self):
+        assert loader.session_config() is None
+
+    def test_optimize(self):
+        sess = loader.load_model("./tests/models/graph.pb")
+        optimized = loader.load_model(
+            "./tests/models/graph.pb", optimize_for=(["import/x:0"], ["import/out:0"]))
+        assert len(optimized.graph_def.node) < len(sess.graph_def.node)
+        feed_dict = {"import/x:0": [[1.0, 2.0, 3.0, 4.0, 5.0]]}
+        assert np.allclose(
+            optimized.run("import/out:0", feed_dict=feed_dict),
+            sess.run("import/out:0", feed_dict=feed_dict))
+
+    def test_optimize_inexistent_tensor(self):
+        with pytest.raises(ValueError):
+            loader.load_model(
+                "./tests/models/graph.pb", optimize_for=(["x:0"], ["import/out:0"]))
+
+    def test_freeze_cache(self, tmpdir, monkeypatch):
+        model_dir = tmpdir.mkdir("model")
+        for name in os.listdir("./tests/models"):
+            if not name.endswith(".pb"):
+                shutil.copy(os.path.join("./tests/models", name), str(model_dir))
+        cache_dir = str(tmpdir.join("cache"))
+        feed_dict = {"x:0": [[1.0, 2.0, 3.0, 4.0, 5.0]]}
+        expected = loader.load_model(str(model_dir)).run("out:0", feed_dict=feed_dict)
+
+        sess = loader.load_model(str(model_dir), freeze_for=["out:0"], cache_dir=cache_dir)
+        cached = os.listdir(cache_dir)
+        assert len(cached) == 1
+        assert not [op for op in sess.graph.get_operations() if op.type == "VariableV2"]
+        assert np.allclose(sess.run("out:0", feed_dict=feed_dict), expected)
+
+        def no_restore(*_args, **_kw):
+            raise AssertionError("checkpoint restored")
+        monkeypatch.setattr(loader.tf.train, "import_meta_graph", no_restore)
+        sess = loader.load_model(str(model_dir), freeze_for=["out:0"], cache_dir=cache_dir)
+        assert os.listdir(cache_dir) == cached
+        assert np.allclose(sess.run("out:0", feed_dict=feed_dict), expected)
+
+    def test_mmap(self, tmpdir):
+        feed_dict = {"import/x:0": [[1.0, 2.0, 3.0, 4.0, 5.0]]}
+        expected = loader.load_model("./tests/models/graph.pb").run(
+            "import/out:0", feed_dict=feed_dict)
+
+        graph_def = loader._read_graph_def("./tests/models/graph.pb")
+        converted = mmap_graph.convert(graph_def, str(tmpdir.join("graph")), min_bytes=1)
+        assert [node for node in converted.node if node.op == "ImmutableConst"]
+        sess = loader._import_graph_def(converted)
+        assert np.allclose(sess.run("import/out:0", feed_dict=feed_dict), expected)
+
+        mmap_dir = str(tmpdir.join("mmap"))
+        for _ in range(2):
+            sess = loader.load_model("./tests/models/graph.pb", mmap_dir=mmap_dir)
+            assert np.allclose(sess.run("import/out:0", feed_dict=feed_dict), expected)
+            assert len(os.listdir(mmap_dir)) == 1
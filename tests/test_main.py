@@ -128,9 +128,49 @@ class TestJSON():
             inputs=cls.in_t,
             outputs=cls.out_t,
             handler='json',
+            json_precision=None,
             host='localhost',
             port=port,
-            batch=False)
+            batch=False,
+            max_batch_size=None,
+            max_queue_delay=main.DEFAULT_MAX_QUEUE_DELAY,
+            bucket_boundaries=None,
+            bucket_axis=0,
+            sessions=1,
+            intra_op_threads=None,
+            inter_op_threads=None,
+            dispatch='round-robin',
+            npz=False,
+            max_request_bytes=None,
+            cache_bytes=None,
+            cache_ttl=None,
+            cache_policy='lru',
+            response_cache_bytes=None,
+            response_cache_entry_bytes=None,
+            no_metrics=False,
+            trace_dir=None,
+            trace_rate=0.0,
+            max_traces=100,
+            trace_header=False,
+            warmup=None,
+            warmup_batch_sizes=None,
+            optimize=False,
+            optimize_report=False,
+            freeze_cache=None,
+            mmap=None,
+            config=None,
+            reload_interval=None,
+            canary=None,
+            canary_weight=main.DEFAULT_CANARY_WEIGHT,
+            shadow=None,
+            shadow_rate=0.1,
+            max_concurrency=None,
+            max_queued=None,
+            request_timeout=None,
+            server='werkzeug',
+            asgi_threads=None,
+            workers=1,
+            reuse_port=False)
         cls.server = server = Server(args)
         server.start()
         server.wait_for_ready()
@@ -219,6 +259,20 @@ class TestJSON():
             self.server.post('/foobar')
         assert e.value.getcode() == 404
 
+class TestInitHandler():
+
+    def test_json_precision(self):
+        """Test that --json-precision is only used by the fastjson handler.
+
+        """
+        args = Args(handler='fastjson', batch=False, json_precision=3)
+        handler = main._init_handler(['x:0'], ['out:0'], args)
+        assert handler.precision == 3
+
+        args = Args(handler='json', batch=False, json_precision=3)
+        with pytest.raises(SystemExit):
+            main._init_handler(['x:0'], ['out:0'], args)
+
 def _free_port():
     attempts = 0
     while True:
@@ -0,0 +1,46 @@
+"""Tests Prometheus metrics.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import metrics
+from tfserve.metrics import Histogram
+from tfserve.metrics import Metrics
+
+class TestMetrics():
+
+    def test_histogram(self):
+        histogram = Histogram(buckets=(1, 2, 5))
+        for value in (0.5, 1, 1.5, 3, 10):
+            histogram.observe(value)
+        counts, total = histogram.snapshot()
+        assert counts == [2, 3, 4, 5]
+        assert total == 16
+
+    def test_render(self):
+        m = Metrics(labels={'model': 'a"b'})
+        m.request_started()
+        m.request_started()
+        m.observe('encode', 0.002)
+        m.request_finished(200, 0.01)
+        m.input_converted('x:0', 'dtype')
+        m.input_converted('x:0', 'dtype')
+        text = m.render()
+        lines = text.splitlines()
+        assert 'tfserve_requests_total{code="200",model="a\\"b"} 1' in lines
+        assert 'tfserve_requests_in_flight{model="a\\"b"} 1' in lines
+        assert 'tfserve_request_duration_seconds_count{model="a\\"b"} 1' in lines
+        assert 'tfserve_input_conversions_total{input="x:0",kind="dtype",model="a\\"b"} 2' in lines
+        assert ('tfserve_stage_duration_seconds_bucket{le="0.001",model="a\\"b",stage="encode"} 0'
+                in lines)
+        assert ('tfserve_stage_duration_seconds_bucket{le="0.0025",model="a\\"b",stage="encode"} 1'
+                in lines)
+        assert ('tfserve_stage_duration_seconds_bucket{le="+Inf",model="a\\"b",stage="encode"} 1'
+                in lines)
+        for stage in metrics.STAGES:
+            assert ('tfserve_stage_duration_seconds_count{model="a\\"b",stage="%s"}' % stage
+                    in text)
+        assert text.endswith('\n')
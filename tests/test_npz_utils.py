@@ -0,0 +1,82 @@
+"""Tests numpy request and response bodies.
+"""
+
+import io
+import os
+import sys
+import zipfile
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import npz_utils
+
+class TestNpzUtils():
+
+    arrays = {
+        'x:0': np.arange(12, dtype=np.float32).reshape(3, 4),
+        'y:0': np.array(7, dtype=np.int64),
+        'z:0': np.asfortranarray(np.arange(6, dtype=np.float64).reshape(2, 3)),
+    }
+
+    def test_npz_round_trip(self):
+        buf = npz_utils.dump_npz(self.arrays)
+        loaded = npz_utils.load_npz(buf)
+        assert sorted(loaded) == sorted(self.arrays)
+        for name, value in self.arrays.items():
+            assert loaded[name].dtype == value.dtype
+            assert np.array_equal(loaded[name], value)
+
+    def test_npz_no_copy(self):
+        buf = npz_utils.dump_npz(self.arrays)
+        for value in npz_utils.load_npz(buf).values():
+            assert not value.flags.owndata
+            assert not value.flags.writeable
+
+    def test_compressed_npz(self):
+        f = io.BytesIO()
+        np.savez_compressed(f, **self.arrays)
+        loaded = npz_utils.load_npz(f.getvalue())
+        for name, value in self.arrays.items():
+            assert np.array_equal(loaded[name], value)
+
+    def test_npy_round_trip(self):
+        for value in self.arrays.values():
+            loaded = npz_utils.load_npy(npz_utils.dump_npy(value))
+            assert loaded.dtype == value.dtype
+            assert np.array_equal(loaded, value)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            npz_utils.load_npz(b'foo')
+        with pytest.raises(ValueError):
+            npz_utils.load_npy(b'foo')
+        with pytest.raises(ValueError):
+            npz_utils.load_npy(npz_utils.dump_npy(np.ones(10))[:-8])
+
+    def test_objects_rejected(self):
+        f = io.BytesIO()
+        np.save(f, np.array([{}, None], dtype=object), allow_pickle=True)
+        with pytest.raises(ValueError):
+            npz_utils.load_npy(f.getvalue())
+
+    def test_compressed_size_mismatch(self):
+        header = io.BytesIO()
+        npy_format.write_array_header_1_0(
+            header, {'descr': '<f4', 'fortran_order': False, 'shape': (2 ** 38,)})
+        f = io.BytesIO()
+        with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr('x:0.npy', header.getvalue() + b'\0' * 16)
+        with pytest.raises(ValueError):
+            npz_utils.load_npz(f.getvalue())
+
+    def test_npz_bytearray_no_copy(self):
+        buf = bytearray(npz_utils.dump_npz(self.arrays))
+        body = np.frombuffer(buf, dtype=np.uint8)
+        for value in npz_utils.load_npz(buf).values():
+            assert np.shares_memory(value, body)
+            assert not value.flags.writeable
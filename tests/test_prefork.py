@@ -0,0 +1,170 @@
+"""Tests pre-fork multi-process serving.
+"""
+
+import os
+import signal
+import sys
+import threading
+import time
+import urllib.request
+
+import pytest
+from werkzeug import routing
+from werkzeug.wrappers import Response
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import main
+from tfserve import prefork
+from tfserve.tfserve import BaseApp
+
+class Args():
+    """Proxy for main args."""
+
+    def __init__(self, **kw):
+        for name in kw:
+            setattr(self, name, kw[name])
+
+def _started(path):
+    """Return the pids of the workers started so far."""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [int(line) for line in f.read().split()]
+
+def _wait_started(path, count, timeout=10):
+    timeout_at = time.time() + timeout
+    while len(_started(path)) < count:
+        assert time.time() < timeout_at
+        time.sleep(0.01)
+    return _started(path)
+
+def _is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+class StubSupervisor(prefork._Supervisor):
+    """Supervisor whose workers record their pid instead of serving.
+
+    Workers started before `exit_until` workers exit right away, later ones
+    wait for SIGTERM.
+    """
+
+    def __init__(self, path, workers, exit_until=0):
+        super(StubSupervisor, self).__init__(None, '127.0.0.1', 0, workers, None, None)
+        self.path = path
+        self.exit_until = exit_until
+
+    def _run_worker(self):
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        with open(self.path, 'a') as f:
+            f.write("%i\n" % os.getpid())
+        if len(_started(self.path)) > self.exit_until:
+            time.sleep(60)
+
+class WorkersApp(BaseApp):
+    """App answering with the number of workers set in the request environ."""
+
+    def _routes(self):
+        return routing.Map([
+            routing.Rule('/', endpoint=self._handle_workers),
+            routing.Rule('/shutdown', endpoint=self._handle_shutdown),
+        ])
+
+    @staticmethod
+    def _handle_workers(req):
+        return Response(str(req.environ.get(prefork.WORKERS_ENVIRON_KEY)))
+
+@pytest.fixture
+def restore_signals():
+    handlers = {s: signal.getsignal(s) for s in (signal.SIGTERM, signal.SIGINT)}
+    yield
+    for s, handler in handlers.items():
+        signal.signal(s, handler)
+
+def _stop_when_started(path, count, signum):
+    def stop():
+        _wait_started(path, count)
+        os.kill(os.getpid(), signum)
+    t = threading.Thread(target=stop)
+    t.start()
+    return t
+
+def _args(**kw):
+    args = dict(server='werkzeug', workers=1, reuse_port=False, host='127.0.0.1', port=0)
+    args.update(kw)
+    return Args(**args)
+
+class TestPrefork():
+
+    @pytest.mark.parametrize('signum', [signal.SIGTERM, signal.SIGINT])
+    def test_stop_reaps_workers(self, tmpdir, restore_signals, signum):
+        path = str(tmpdir.join('pids'))
+        t = _stop_when_started(path, 2, signum)
+        StubSupervisor(path, 2).run()
+        t.join()
+        pids = _started(path)
+        assert len(pids) == 2
+        assert not any(_is_alive(pid) for pid in pids)
+
+    def test_dead_workers_restarted(self, tmpdir, restore_signals, monkeypatch):
+        monkeypatch.setattr(prefork, 'RESTART_BACKOFF', 0.0)
+        path = str(tmpdir.join('pids'))
+        t = _stop_when_started(path, 3, signal.SIGTERM)
+        StubSupervisor(path, 1, exit_until=2).run()
+        t.join()
+        pids = _started(path)
+        assert len(pids) == 3
+        assert len(set(pids)) == 3
+        assert not any(_is_alive(pid) for pid in pids)
+
+    def test_serve_validation(self):
+        with pytest.raises(ValueError):
+            prefork.serve(lambda: None, '127.0.0.1', 0, 0)
+
+        def invalid_model():
+            raise ValueError("invalid model")
+
+        with pytest.raises(ValueError):
+            prefork.serve(invalid_model, '127.0.0.1', 0, 2)
+
+    @pytest.mark.parametrize('args', [
+        _args(workers=0),
+        _args(reuse_port=True),
+        _args(server='asgi', workers=2),
+    ])
+    def test_main_invalid_args(self, args):
+        with pytest.raises(SystemExit):
+            main._serve(lambda: pytest.fail("app built with invalid args"), args)
+
+    def test_main_invalid_model(self):
+        def invalid_model():
+            raise ValueError("invalid model")
+
+        with pytest.raises(SystemExit):
+            main._serve(invalid_model, _args(workers=2))
+
+    def test_workers_environ(self, restore_signals):
+        sock = prefork._listen('127.0.0.1', 0, reuse_port=False)
+        url = 'http://127.0.0.1:%i/' % sock.getsockname()[1]
+        responses = []
+
+        def request():
+            responses.append(urllib.request.urlopen(url, timeout=10).read())
+            urllib.request.urlopen(url + 'shutdown', b'', timeout=10)
+
+        class Supervisor(prefork._Supervisor):
+            def _spawn(self):
+                super(Supervisor, self)._spawn()
+                # Requests start once all workers are forked.
+                if len(self._children) == self.workers:
+                    threading.Thread(target=request).start()
+
+        try:
+            Supervisor(WorkersApp, '127.0.0.1', 0, 2, None, sock).run()
+        finally:
+            sock.close()
+        assert responses == [b'2']
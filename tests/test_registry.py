@@ -0,0 +1,144 @@
+"""Tests multi-model registry.
+"""
+
+import json
+import os
+import sys
+
+from werkzeug.exceptions import NotFound
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import registry
+from tfserve.metrics import Metrics
+from tfserve.registry import ModelRegistry
+
+CONFIG = {
+    'shared_threads': 4,
+    'models': [
+        {'name': 'a', 'model': 'a.pb', 'inputs': 'x:0, y:0', 'outputs': ['out:0'],
+         'handler': 'binary', 'max_batch_size': 8},
+        {'name': 'b', 'model': 'b/', 'inputs': ['x:0'], 'outputs': ['out:0']},
+    ],
+}
+
+class AppProxy():
+    """Proxy for a TFServeApp."""
+
+    def __init__(self, name, ready=True, max_request_bytes=None):
+        self.in_t = ['x:0']
+        self.out_t = ['out:0']
+        self.ready = ready
+        self.max_request_bytes = max_request_bytes
+        self._metrics = Metrics({'model': name})
+        self.name = name
+        self.reloads = 0
+
+    def warmup(self):
+        self.ready = True
+
+    def stats(self):
+        return {'name': self.name}
+
+    def _handle_reload(self, _req):
+        self.reloads += 1
+        return Response()
+
+    def _handle_inference(self, req):
+        self._metrics.request_started()
+        self._metrics.request_finished(200, 0.001)
+        return Response(json.dumps({'model': self.name, 'body': req.get_data().decode()}))
+
+class TestRegistry():
+
+    def test_read_config(self, tmpdir):
+        path = tmpdir.join('models.json')
+        path.write(json.dumps(CONFIG))
+        config = registry.read_config(str(path))
+        assert config['models'][0]['inputs'] == ['x:0', 'y:0']
+        assert registry.model_options(config['models'][0]) == {'max_batch_size': 8}
+        assert registry.model_options(config['models'][1]) == {}
+
+    def test_read_yaml_config(self, tmpdir):
+        yaml = pytest.importorskip('yaml')
+        path = tmpdir.join('models.yaml')
+        path.write(yaml.safe_dump(CONFIG))
+        config = registry.read_config(str(path))
+        assert [model['name'] for model in config['models']] == ['a', 'b']
+
+    def test_invalid_config(self):
+        def model(**kw):
+            return dict({'name': 'a', 'model': 'a.pb', 'inputs': 'x', 'outputs': 'y'}, **kw)
+        for config in [
+                [],
+                {'models': []},
+                {'models': [model()], 'unknown': 1},
+                {'models': [model(name=None)]},
+                {'models': [model(name='a/b')]},
+                {'models': [model(outputs=[])]},
+                {'models': [model(), model()]},
+        ]:
+            with pytest.raises(ValueError):
+                registry.check_config(config)
+
+    def test_routes(self):
+        apps = {'a': AppProxy('a'), 'b': AppProxy('b', ready=False)}
+        client = Client(ModelRegistry(apps)._init_app())
+
+        resp = client.post('/models/b', data=b'foo')
+        assert json.loads(resp.get_data()) == {'model': 'b', 'body': 'foo'}
+        assert client.post('/models/c').status_code == 404
+        assert client.post('/').status_code == 404
+
+        assert client.get('/ping').status_code == 503
+        models = json.loads(client.get('/models').get_data())
+        assert models['a'] == {'inputs': ['x:0'], 'outputs': ['out:0'], 'ready': True}
+        assert not models['b']['ready']
+
+        apps['b'].warmup()
+        assert client.get('/ping').status_code == 200
+        assert json.loads(client.get('/stats').get_data()) == {
+            'a': {'name': 'a'}, 'b': {'name': 'b'}}
+
+        assert client.post('/models/a/reload').status_code == 200
+        assert apps['a'].reloads == 1
+
+        metrics = client.get('/metrics').get_data().decode()
+        assert 'tfserve_requests_total{code="200",model="b"} 1' in metrics
+        assert 'model="a"' in metrics
+
+    def test_warmup(self):
+        apps = {'a': AppProxy('a', ready=False), 'b': AppProxy('b', ready=False)}
+        models = ModelRegistry(apps)
+        assert not models.ready
+        models.warmup()
+        assert models.ready
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            ModelRegistry({})
+        with pytest.raises(ValueError):
+            ModelRegistry({'a b': AppProxy('a')})
+
+    def test_no_metrics(self):
+        app = AppProxy('a')
+        app._metrics = None
+        with pytest.raises(NotFound):
+            ModelRegistry({'a': app})._handle_metrics(None)
+
+    def test_max_request_bytes(self):
+        models = ModelRegistry({
+            'a': AppProxy('a', max_request_bytes=10),
+            'b': AppProxy('b', max_request_bytes=20),
+        })
+        assert models.max_request_bytes == 20
+        assert models._init_asgi_app().max_body_bytes == 20
+        models = ModelRegistry({
+            'a': AppProxy('a', max_request_bytes=10),
+            'b': AppProxy('b'),
+        })
+        assert models.max_request_bytes is None
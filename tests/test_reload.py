@@ -0,0 +1,64 @@
+"""Tests model reloading.
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import reload
+
+class AppProxy():
+    """Proxy for a TFServeApp that records reloads."""
+
+    def __init__(self, model_path, fail=False):
+        self.model_path = model_path
+        self.fail = fail
+        self.reloads = 0
+        self.reloaded = threading.Event()
+
+    def reload(self):
+        self.reloads += 1
+        self.reloaded.set()
+        if self.fail:
+            raise ValueError("invalid model")
+
+class TestReload():
+
+    def test_model_signature(self, tmpdir):
+        path = tmpdir.join('graph.pb')
+        assert reload.model_signature(str(path)) is None
+        path.write('a')
+        signature = reload.model_signature(str(path))
+        assert signature == [(str(path), 1, os.stat(str(path)).st_mtime_ns)]
+        assert reload.model_signature(str(tmpdir)) == signature
+        path.write('ab')
+        assert reload.model_signature(str(path)) != signature
+
+    def test_watcher(self, tmpdir):
+        path = tmpdir.join('graph.pb')
+        path.write('a')
+        app = AppProxy(str(path))
+        watcher = reload.ModelWatcher(app, 0.02)
+        time.sleep(0.1)
+        assert app.reloads == 0
+        path.write('ab')
+        assert app.reloaded.wait(5)
+        time.sleep(0.1)
+        watcher.stop()
+        assert app.reloads == 1
+
+    def test_watcher_keeps_running_on_errors(self, tmpdir, capsys):
+        path = tmpdir.join('graph.pb')
+        path.write('a')
+        app = AppProxy(str(path), fail=True)
+        watcher = reload.ModelWatcher(app, 0.02)
+        path.write('ab')
+        assert app.reloaded.wait(5)
+        app.reloaded.clear()
+        path.write('abc')
+        assert app.reloaded.wait(5)
+        watcher.stop()
+        assert 'model reload failed' in capsys.readouterr().err
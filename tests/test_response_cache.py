@@ -0,0 +1,80 @@
+"""Tests response cache.
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import response_cache
+from tfserve.response_cache import ResponseCache
+
+HEADERS = [('Content-Type', 'application/json')]
+
+# Size of a cached entry with a 16 bytes key and a 100 bytes body.
+ENTRY_SIZE = response_cache.ENTRY_OVERHEAD + 16 + 100
+
+def _key(i):
+    return ResponseCache.key('/', 'application/json', str(i))
+
+class TestResponseCache():
+
+    def test_key(self):
+        key = ResponseCache.key
+        assert key('/', b'foo') == key('/', bytearray(b'foo'))
+        assert key('/', b'foo') != key('/a', b'foo')
+        assert key('/a', b'b') != key('/', b'ab')
+
+    def test_hit_and_miss(self):
+        cache = ResponseCache(10 * ENTRY_SIZE, max_entry_bytes=ENTRY_SIZE)
+        assert cache.get(_key(1)) is None
+        stored = cache.put(_key(1), b'x' * 100, HEADERS)
+        entry = cache.get(_key(1))
+        assert entry.body == b'x' * 100
+        assert entry.headers == HEADERS
+        assert entry.etag == stored.etag == ResponseCache.etag(b'x' * 100)
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['bytes'] == ENTRY_SIZE
+
+    def test_lru(self):
+        cache = ResponseCache(3 * ENTRY_SIZE, max_entry_bytes=ENTRY_SIZE)
+        for i in range(3):
+            cache.put(_key(i), b'x' * 100, HEADERS)
+        cache.get(_key(0))
+        cache.put(_key(3), b'x' * 100, HEADERS)
+        assert cache.get(_key(1)) is None
+        assert cache.get(_key(0)) is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_entry_size_limit(self):
+        cache = ResponseCache(3 * ENTRY_SIZE, max_entry_bytes=ENTRY_SIZE)
+        for i in range(3):
+            cache.put(_key(i), b'x' * 100, HEADERS)
+        entry = cache.put(_key(3), b'x' * 101, HEADERS)
+        assert entry.body == b'x' * 101
+        assert cache.get(_key(3)) is None
+        assert cache.stats()['entries'] == 3
+        assert cache.stats()['too_large'] == 1
+
+        assert ResponseCache(1600).max_entry_bytes == 100
+
+    def test_ttl(self):
+        cache = ResponseCache(10 * ENTRY_SIZE, max_entry_bytes=ENTRY_SIZE, ttl=0.05)
+        cache.put(_key(1), b'x' * 100, HEADERS)
+        assert cache.get(_key(1)) is not None
+        time.sleep(0.1)
+        assert cache.get(_key(1)) is None
+        assert cache.stats()['entries'] == 0
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            ResponseCache(0)
+        with pytest.raises(ValueError):
+            ResponseCache(100, max_entry_bytes=0)
+        with pytest.raises(ValueError):
+            ResponseCache(100, ttl=0)
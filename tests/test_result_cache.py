@@ -0,0 +1,112 @@
+"""Tests inference result cache.
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import result_cache
+from tfserve.result_cache import ResultCache
+
+# Size of a cached entry with a single float64 output of 4 elements.
+ENTRY_SIZE = result_cache.ENTRY_OVERHEAD + 16 + 32
+
+def _outputs(i):
+    return {'out:0': np.full(4, i, dtype=np.float64)}
+
+class TestResultCache():
+
+    def test_key(self):
+        key = ResultCache.key
+        a = {'x:0': np.arange(4, dtype=np.float32)}
+        assert key(a) == key({'x:0': np.arange(4, dtype=np.float32)})
+        strided = {'x:0': np.arange(8, dtype=np.float32)[::2]}
+        assert key(strided) == key({'x:0': np.arange(0, 8, 2, dtype=np.float32)})
+        assert key(a) != key({'x:0': np.arange(4, dtype=np.float64)})
+        assert key(a) != key({'x:0': np.arange(4, dtype=np.float32).reshape(2, 2)})
+        assert key(a) != key({'y:0': np.arange(4, dtype=np.float32)})
+        assert key({'x:0': [1.0, 2.0]}) == key({'x:0': np.array([1.0, 2.0])})
+        assert key({'x:0': ['foo']}) != key({'x:0': ['bar']})
+
+    def test_hit_and_miss(self):
+        cache = ResultCache(10 * ENTRY_SIZE)
+        assert cache.get(b'a') is None
+        cache.put(b'a', _outputs(1))
+        assert np.array_equal(cache.get(b'a')['out:0'], _outputs(1)['out:0'])
+        stats = cache.stats()
+        assert stats['hits'] == 1
+        assert stats['misses'] == 1
+        assert stats['entries'] == 1
+        assert stats['bytes'] == ENTRY_SIZE - 16 + 1
+
+    def test_lru(self):
+        cache = ResultCache(3 * ENTRY_SIZE, policy='lru')
+        for k in (b'a' * 16, b'b' * 16, b'c' * 16):
+            cache.put(k, _outputs(0))
+        cache.get(b'a' * 16)
+        cache.put(b'd' * 16, _outputs(0))
+        assert cache.get(b'b' * 16) is None
+        assert cache.get(b'a' * 16) is not None
+        assert cache.stats()['evictions'] == 1
+
+    def test_lfu(self):
+        cache = ResultCache(3 * ENTRY_SIZE, policy='lfu')
+        for k in (b'a' * 16, b'b' * 16, b'c' * 16):
+            cache.put(k, _outputs(0))
+        for _ in range(3):
+            cache.get(b'a' * 16)
+        cache.get(b'c' * 16)
+        cache.put(b'd' * 16, _outputs(0))
+        cache.put(b'e' * 16, _outputs(0))
+        assert cache.get(b'b' * 16) is None
+        assert cache.get(b'd' * 16) is None
+        assert cache.get(b'a' * 16) is not None
+        assert cache.get(b'c' * 16) is not None
+        assert cache.stats()['bytes'] <= 3 * ENTRY_SIZE
+
+    def test_ttl(self):
+        cache = ResultCache(10 * ENTRY_SIZE, ttl=0.05)
+        cache.put(b'a', _outputs(1))
+        assert cache.get(b'a') is not None
+        time.sleep(0.1)
+        assert cache.get(b'a') is None
+        assert cache.stats()['expirations'] == 1
+        assert cache.stats()['entries'] == 0
+
+    def test_large_outputs(self):
+        cache = ResultCache(ENTRY_SIZE)
+        cache.put(b'a', {'out:0': np.zeros(1000)})
+        assert cache.get(b'a') is None
+
+    def test_views_are_copied(self):
+        cache = ResultCache(10 * ENTRY_SIZE)
+        batch = np.zeros((100, 4))
+        cache.put(b'a', {'out:0': batch[0]})
+        assert cache.get(b'a')['out:0'].base is None
+
+    def test_outputs_are_read_only(self):
+        cache = ResultCache(10 * ENTRY_SIZE)
+        outputs = {'out:0': np.zeros(4)}
+        cache.put(b'a', outputs)
+        outputs['out:0'][0] = 1.0
+        hit = cache.get(b'a')
+        assert hit['out:0'].tolist() == [0.0] * 4
+        with pytest.raises(ValueError):
+            hit['out:0'][0] = 1.0
+        with pytest.raises(ValueError):
+            np.squeeze(hit['out:0'])[0] = 1.0
+        assert cache.get(b'a')['out:0'].tolist() == [0.0] * 4
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            ResultCache(0)
+        with pytest.raises(ValueError):
+            ResultCache(100, ttl=-1)
+        with pytest.raises(ValueError):
+            ResultCache(100, policy='foo')
@@ -1,30 +1,47 @@
 """Tests TFServeApp server functionality.
 """
 
+import asyncio
 import io
 import json
 import os
+import shutil
 import sys
+import threading
+import time
 
 import numpy as np
+from werkzeug.datastructures import Headers
+from werkzeug.exceptions import BadRequest
 from werkzeug.exceptions import MethodNotAllowed
+from werkzeug.exceptions import NotAcceptable
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.test import Client
 
 import pytest
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import tfserve
+from tfserve import npz_utils
+from tfserve import prefork
 
 class RequestProxy():
     """Proxy for a Werkzeug request object."""
 
-    def __init__(self, req_data=None, method='POST'):
-        if req_data:
+    def __init__(self, req_data=None, method='POST', headers=None, body=None, environ=None):
+        if body is not None:
+            req_encoded = body
+        elif req_data:
             req_encoded = json.dumps(req_data).encode()
         else:
             req_encoded = b''
         self.stream = io.BytesIO(req_encoded)
+        self.content_length = len(req_encoded)
+        self.path = '/'
         self.method = method
+        self.headers = Headers(headers or {})
+        self.environ = environ or {}
 
 class TestRun():
     """Tests server run."""
@@ -44,6 +61,7 @@ class TestRun():
         [1.0, 2.0, 3.0, 4.0],
         1234,
         'foo',
+        [10 ** 400] * 5,
     ]
 
     @classmethod
@@ -75,6 +93,33 @@ class TestRun():
             cls._decode,
             False)
 
+        cls.server_D = tfserve.TFServeApp(
+            cls.model_path,
+            [cls.in_t],
+            [cls.out_t],
+            cls._encode,
+            cls._decode,
+            False,
+            npz=True)
+
+        cls.server_E = tfserve.TFServeApp(
+            cls.model_path,
+            [cls.in_t],
+            [cls.out_t],
+            cls._encode,
+            cls._decode,
+            False,
+            cache_bytes=1024 * 1024)
+
+        cls.server_F = tfserve.TFServeApp(
+            cls.model_path,
+            [cls.in_t],
+            [cls.out_t],
+            cls._encode,
+            cls._decode,
+            False,
+            response_cache_bytes=1024 * 1024)
+
     @classmethod
     def _encode(cls, req_bytes):
         return {
@@ -134,11 +179,543 @@ class TestRun():
     def test_bad_input(self):
         """Test various invalid inputs.
 
-        Bad values are passed through to TensorFlow, which in turn
-        raises ValueError.
+        Values that don't fit the input placeholder dtype and shape are
+        rejected with BadRequest before the session runs.
 
         """
         for example_in in self.bad_input:
             req = RequestProxy(example_in)
-            with pytest.raises(ValueError):
+            with pytest.raises(BadRequest):
                 self.server_A._handle_inference(req)
+
+    def test_batching(self):
+        """Test dynamic batching of concurrent requests.
+
+        Fails if concurrent requests are not run in batches or a request
+        doesn't get the output of its own input.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            max_batch_size=4,
+            max_queue_delay_us=2000000)
+        examples = self.examples * 2
+        results = _infer_concurrently(server, [example_in for example_in, _ in examples])
+        assert results == pytest.approx([example_out for _, example_out in examples])
+        stats = list(server.stats()['batching'].values())
+        assert sum(bucket['requests'] for bucket in stats) == 4
+        assert sum(bucket['batches'] for bucket in stats) < 4
+
+    def test_bucket_padding(self):
+        """Test bucket boundaries with an input of fixed size.
+
+        Fails if the fixed size input is padded (the session would reject the
+        batch) or requests don't get their own outputs.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            max_batch_size=2,
+            max_queue_delay_us=2000000,
+            bucket_boundaries=[8, 16])
+        results = _infer_concurrently(server, [example_in for example_in, _ in self.examples])
+        assert results == pytest.approx([example_out for _, example_out in self.examples])
+        stats = server.stats()['batching']
+        assert list(stats) == ["{}[5]float32".format(self.in_t)]
+        assert stats["{}[5]float32".format(self.in_t)]['padding_waste'] == 0.0
+
+    def test_sessions(self):
+        """Test serving concurrent requests from a pool of two sessions.
+
+        Fails if the sessions don't hold their own graph or a request doesn't
+        get the output of its own input.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            sessions=2,
+            dispatch='least-loaded')
+        sessions = server._pool.sessions
+        assert len(sessions) == 2
+        assert sessions[0].graph is not sessions[1].graph
+        examples = self.examples * 4
+        results = _infer_concurrently(server, [example_in for example_in, _ in examples])
+        assert results == pytest.approx([example_out for _, example_out in examples])
+        assert server._pool.in_flight() == 0
+
+    def test_npz_examples(self):
+        """Test inference with numpy request and response bodies.
+
+        Fails if outputs don't match expected results.
+
+        """
+        npz = npz_utils.NPZ_MEDIA_TYPE
+        npy = npz_utils.NPY_MEDIA_TYPE
+        for example_in, example_out in self.examples:
+            body = npz_utils.dump_npz({self.in_t: np.array(example_in)})
+            req = RequestProxy(body=body, headers={'Content-Type': npz, 'Accept': npz})
+            resp = self.server_D._handle_inference(req)
+            assert resp.headers.get('Content-Type') == npz
+            outputs = npz_utils.load_npz(resp.get_data())
+            assert np.allclose(outputs[self.out_t], example_out)
+
+            req = RequestProxy(example_in, headers={'Accept': npy})
+            resp = self.server_D._handle_inference(req)
+            assert resp.headers.get('Content-Type') == npy
+            output = npz_utils.load_npy(resp.get_data())
+            assert np.allclose(output, example_out)
+
+            req = RequestProxy(body=body, headers={'Content-Type': npz})
+            resp = self.server_D._handle_inference(req)
+            assert resp.headers.get('Content-Type') == 'application/json'
+            assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+        req = RequestProxy(self.examples[0][0], headers={'Accept': 'text/html'})
+        with pytest.raises(NotAcceptable):
+            self.server_D._handle_inference(req)
+
+    def test_cache(self):
+        """Test inference with the result cache.
+
+        Fails if cached outputs don't match expected results.
+
+        """
+        for _ in range(2):
+            for example_in, example_out in self.examples:
+                req = RequestProxy(example_in)
+                resp = self.server_E._handle_inference(req)
+                assert json.loads(resp.get_data().decode('utf-8')) == example_out
+        stats = self.server_E.stats()['cache']
+        assert stats['misses'] == len(self.examples)
+        assert stats['hits'] == len(self.examples)
+
+    def test_response_cache(self):
+        """Test inference with the response cache and conditional requests.
+
+        Fails if cached responses don't match expected results.
+
+        """
+        for example_in, example_out in self.examples:
+            req = RequestProxy(example_in)
+            resp = self.server_F._handle_inference(req)
+            etag, _weak = resp.get_etag()
+            assert etag
+            assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+            req = RequestProxy(example_in)
+            resp = self.server_F._handle_inference(req)
+            assert resp.get_etag()[0] == etag
+            assert resp.headers.get('Content-Type') == 'application/json'
+            assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+            req = RequestProxy(example_in, headers={'If-None-Match': '"%s"' % etag})
+            resp = self.server_F._handle_inference(req)
+            assert resp.status_code == 304
+            assert resp.get_data() == b''
+        stats = self.server_F.stats()['response_cache']
+        assert stats['misses'] == len(self.examples)
+        assert stats['hits'] == 2 * len(self.examples)
+        assert stats['not_modified'] == len(self.examples)
+
+    def test_metrics(self):
+        """Test Prometheus metrics of inference requests.
+
+        """
+        for example_in, _example_out in self.examples:
+            self.server_A._handle_inference(RequestProxy(example_in))
+        resp = self.server_A._handle_metrics(None)
+        assert resp.status == '200 OK'
+        lines = resp.get_data().decode('utf-8').splitlines()
+        assert any(line.startswith('tfserve_requests_total{code="200"}') for line in lines)
+        assert 'tfserve_requests_in_flight 0' in lines
+        assert any(line.startswith('tfserve_stage_duration_seconds_count{stage="session_run"}')
+                   for line in lines)
+
+    def test_input_conversions(self):
+        """Test counting inputs converted to the placeholder dtype and layout.
+
+        Fails if outputs change or conversions are not reported.
+
+        """
+        def encode(req_bytes):
+            values = json.loads(req_bytes.decode('utf-8'))
+            return {self.in_t: np.asarray(values['x'], dtype=values['dtype'])[::values['step']]}
+
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            encode,
+            self._decode,
+            False)
+        example_in, example_out = self.examples[1]
+        for dtype, step in (('float64', 1), ('float32', 2), ('float32', 1)):
+            values = example_in if step == 1 else [v for v in example_in for _ in range(2)]
+            resp = server._handle_inference(
+                RequestProxy({'x': values, 'dtype': dtype, 'step': step}))
+            assert json.loads(resp.get_data().decode('utf-8')) == pytest.approx(example_out)
+        assert server.stats()['input_conversions'] == {self.in_t: {'dtype': 1, 'layout': 1}}
+        lines = server._handle_metrics(None).get_data().decode('utf-8').splitlines()
+        assert 'tfserve_input_conversions_total{input="%s",kind="layout"} 1' % self.in_t in lines
+
+    def test_admission(self):
+        """Test admission control with request deadlines.
+
+        Fails if admitted requests don't match expected results or requests
+        whose deadline can't be met are not rejected.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            max_concurrency=2,
+            request_timeout=10)
+        example_in, example_out = self.examples[0]
+        resp = server._handle_inference(RequestProxy(example_in))
+        assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+        server._admission.observe(60)
+        with pytest.raises(ServiceUnavailable):
+            server._handle_inference(RequestProxy(example_in))
+        with pytest.raises(BadRequest):
+            server._handle_inference(RequestProxy(example_in, headers={'X-Request-Timeout': 'x'}))
+        stats = server.stats()['admission']
+        assert stats['admitted'] == 1
+        assert stats['deadline'] == 1
+        assert stats['running'] == 0
+
+    def test_admission_after_body_read(self):
+        """Test that requests take an admission slot once their body is read.
+
+        Fails if a request whose body is still being read, or a response
+        cache hit, holds a slot and other requests are rejected with 429.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            response_cache_bytes=1024 * 1024,
+            max_concurrency=1,
+            max_queued=0)
+        example_in, example_out = self.examples[0]
+        body = json.dumps(example_in).encode()
+        uploading = threading.Event()
+        uploaded = threading.Event()
+
+        class SlowStream():
+            """Stream that blocks until `uploaded` is set."""
+
+            def __init__(self):
+                self.data = io.BytesIO(body)
+
+            def read(self, size):
+                uploading.set()
+                uploaded.wait()
+                return self.data.read(size)
+
+        slow_req = RequestProxy(body=body)
+        slow_req.stream = SlowStream()
+        results = []
+        t = threading.Thread(target=lambda: results.append(server._handle_inference(slow_req)))
+        t.start()
+        uploading.wait()
+        for _ in range(2):
+            resp = server._handle_inference(RequestProxy(example_in))
+            assert json.loads(resp.get_data().decode('utf-8')) == example_out
+        uploaded.set()
+        t.join()
+        assert json.loads(results[0].get_data().decode('utf-8')) == example_out
+        stats = server.stats()['admission']
+        assert stats['admitted'] == 1
+        assert stats['queue_full'] == 0
+
+    def test_trace(self, tmpdir):
+        """Test tracing requests with the trace header.
+
+        Fails if no Chrome trace is written.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            trace_dir=str(tmpdir),
+            trace_header=True)
+        example_in, example_out = self.examples[0]
+        resp = server._handle_inference(RequestProxy(example_in))
+        assert json.loads(resp.get_data().decode('utf-8')) == example_out
+        assert os.listdir(str(tmpdir)) == []
+
+        req = RequestProxy(example_in, headers={'X-TFServe-Trace': '1'})
+        resp = server._handle_inference(req)
+        assert json.loads(resp.get_data().decode('utf-8')) == example_out
+        traces = os.listdir(str(tmpdir))
+        assert len(traces) == 1
+        with open(os.path.join(str(tmpdir), traces[0])) as f:
+            assert 'traceEvents' in json.load(f)
+
+    def test_optimize(self):
+        """Test inference with an optimized graph.
+
+        Fails if outputs don't match expected results.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            optimize=True)
+        for example_in, example_out in self.examples:
+            resp = server._handle_inference(RequestProxy(example_in))
+            assert json.loads(resp.get_data().decode('utf-8')) == pytest.approx(example_out)
+
+    def test_registry(self):
+        """Test serving several models with a registry.
+
+        Fails if outputs don't match expected results or metrics have no model label.
+
+        """
+        apps = {
+            name: tfserve.TFServeApp(
+                self.model_path,
+                [self.in_t],
+                [self.out_t],
+                self._encode,
+                self._decode,
+                False,
+                name=name)
+            for name in ('a', 'b')
+        }
+        client = Client(tfserve.ModelRegistry(apps)._init_app())
+        for example_in, example_out in self.examples:
+            resp = client.post('/models/b', data=json.dumps(example_in))
+            assert json.loads(resp.get_data().decode('utf-8')) == example_out
+        metrics = client.get('/metrics').get_data().decode('utf-8')
+        assert 'tfserve_requests_total{code="200",model="b"} 2' in metrics
+
+    def test_versions(self):
+        """Test canary and shadow versions.
+
+        Fails if outputs don't match expected results or shadow runs are not reported.
+
+        """
+        apps = {
+            name: tfserve.TFServeApp(
+                self.model_path,
+                [self.in_t],
+                [self.out_t],
+                self._encode,
+                self._decode,
+                False)
+            for name in ('stable', 'canary', 'shadow')
+        }
+        manager = tfserve.VersionManager(
+            apps, {'stable': 0.5, 'canary': 0.5}, shadow='shadow', shadow_rate=1.0)
+        client = Client(manager._init_app())
+        for example_in, example_out in self.examples:
+            resp = client.post('/', data=json.dumps(example_in))
+            assert resp.headers['X-TFServe-Version'] in ('stable', 'canary')
+            assert json.loads(resp.get_data().decode('utf-8')) == example_out
+        resp = client.post(
+            '/', data=json.dumps(self.examples[0][0]), headers={'X-TFServe-Version': 'shadow'})
+        assert resp.headers['X-TFServe-Version'] == 'shadow'
+
+        timeout_at = time.time() + 10
+        while manager.shadow.stats()['mirrored'] < len(self.examples) and time.time() < timeout_at:
+            time.sleep(0.01)
+        stats = manager.stats()['shadow']
+        assert stats['mirrored'] == len(self.examples)
+        assert stats['divergence']['max'] == 0.0
+
+    def test_reload(self, tmpdir):
+        """Test reloading the model.
+
+        Fails if the reloaded model doesn't serve requests or an invalid model
+        replaces the served one.
+
+        """
+        model_path = tmpdir.join('graph.pb')
+        shutil.copy(self.model_path, str(model_path))
+        server = tfserve.TFServeApp(
+            str(model_path),
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            cache_bytes=1024 * 1024)
+        old_sess = server.sess
+        resp = server._handle_reload(RequestProxy())
+        assert json.loads(resp.get_data().decode('utf-8'))['reloads'] == 1
+        assert server.sess is not old_sess
+        with pytest.raises(BadRequest):
+            server._handle_reload(RequestProxy(environ={prefork.WORKERS_ENVIRON_KEY: 2}))
+        for example_in, example_out in self.examples:
+            resp = server._handle_inference(RequestProxy(example_in))
+            assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+        model_path.write('invalid')
+        sess = server.sess
+        with pytest.raises(Exception):
+            server.reload()
+        assert server.sess is sess
+        assert server.stats()['reload']['failures'] == 1
+        example_in, example_out = self.examples[0]
+        resp = server._handle_inference(RequestProxy(example_in))
+        assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+    def test_reload_without_warmup_inputs(self, monkeypatch, capsys):
+        """Test reloading a model whose random warmup inputs can't be generated.
+
+        Fails if the reload fails instead of serving the new model without
+        warmup, like models with string or unknown rank inputs.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False)
+
+        def synthetic_feeds(_specs, _batch_sizes):
+            raise ValueError("unknown rank of input {}".format(self.in_t))
+
+        monkeypatch.setattr(tfserve.tfserve, 'synthetic_feeds', synthetic_feeds)
+        old_sess = server.sess
+        stats = server.reload()
+        assert server.sess is not old_sess
+        assert stats['last']['warmup']['runs'] == 0
+        assert "without warmup" in capsys.readouterr().err
+        example_in, example_out = self.examples[0]
+        resp = server._handle_inference(RequestProxy(example_in))
+        assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+    def test_warmup(self, tmpdir):
+        """Test warmup with synthetic and recorded inputs.
+
+        Fails if '/ping' is ready before warmup or warmup runs are not reported.
+
+        """
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            max_batch_size=4,
+            warmup=True)
+        assert server._handle_ping(RequestProxy(method='GET')).status_code == 503
+        server.warmup()
+        assert server._handle_ping(RequestProxy(method='GET')).status_code == 200
+        assert server.stats()['warmup']['runs'] == 3
+
+        path = tmpdir.join('requests.jsonl')
+        path.write('\n'.join(json.dumps(x) for x, _ in self.examples))
+        server = tfserve.TFServeApp(
+            self.model_path,
+            [self.in_t],
+            [self.out_t],
+            self._encode,
+            self._decode,
+            False,
+            warmup=str(path),
+            warmup_batch_sizes=[1, 8])
+        assert server.warmup()['runs'] == 4
+        assert server.ready
+
+        example_in, example_out = self.examples[0]
+        resp = server._handle_inference(RequestProxy(example_in))
+        assert json.loads(resp.get_data().decode('utf-8')) == example_out
+
+    def test_asgi_examples(self):
+        """Test inference through the ASGI application.
+
+        Fails if outputs don't match expected results.
+
+        """
+        app = self.server_A._init_asgi_app()
+        for example_in, example_out in self.examples:
+            status, headers, body = _asgi_post(app, '/', json.dumps(example_in).encode())
+            assert status == 200
+            assert headers[b'content-type'] == b'application/json'
+            assert json.loads(body.decode('utf-8')) == example_out
+
+        status, _headers, _body = _asgi_post(app, '/foobar', b'')
+        assert status == 404
+
+def _infer_concurrently(server, inputs):
+    """Run inference on each input from concurrent threads.
+
+    Returns the decoded responses in the order of `inputs`.
+    """
+    results = [None] * len(inputs)
+
+    def infer(i):
+        resp = server._handle_inference(RequestProxy(inputs[i]))
+        results[i] = json.loads(resp.get_data().decode('utf-8'))
+
+    threads = [threading.Thread(target=infer, args=(i,)) for i in range(len(inputs))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+def _asgi_post(app, path, body):
+    """Post `body` to ASGI `app` at `path`.
+
+    Returns status, headers and body of the response.
+    """
+    scope = {
+        'type': 'http',
+        'method': 'POST',
+        'path': path,
+        'headers': [(b'content-type', b'application/json')],
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(app(scope, receive, send))
+    finally:
+        loop.close()
+    return sent[0]['status'], dict(sent[0]['headers']), sent[1]['body']
@@ -0,0 +1,102 @@
+"""Tests session pool dispatching.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve.session_pool import PoolClosed
+from tfserve.session_pool import SessionPool
+
+class SessionProxy():
+    """Proxy for a tf.Session that records its runs."""
+
+    def __init__(self, name, block=None):
+        self.name = name
+        self.block = block
+        self.runs = 0
+        self.closed = False
+
+    def run(self, fetches, feed_dict=None, options=None, run_metadata=None):
+        self.runs += 1
+        if self.block:
+            self.block.wait()
+        return self.name
+
+    def make_callable(self, fetches, feed_list):
+        return lambda *feed_values: (self.name, feed_values)
+
+    def close(self):
+        self.closed = True
+
+class TestSessionPool():
+
+    def test_invalid_params(self):
+        with pytest.raises(ValueError):
+            SessionPool([])
+
+        with pytest.raises(ValueError):
+            SessionPool([SessionProxy("a")], dispatch="random")
+
+    def test_round_robin(self):
+        pool = SessionPool([SessionProxy("a"), SessionProxy("b")])
+        assert [pool.run([], {}) for _ in range(4)] == ["a", "b", "a", "b"]
+
+    def test_least_loaded(self):
+        block = threading.Event()
+        busy = SessionProxy("busy", block)
+        idle = SessionProxy("idle")
+        pool = SessionPool([busy, idle], dispatch="least-loaded")
+        t = threading.Thread(target=pool.run, args=([], {}))
+        t.start()
+        while pool.in_flight() == 0:
+            pass
+        assert [pool.run([], {}) for _ in range(3)] == ["idle"] * 3
+        block.set()
+        t.join()
+        assert pool.in_flight() == 0
+
+    def test_make_callable(self):
+        pool = SessionPool([SessionProxy("a"), SessionProxy("b")])
+        run = pool.make_callable(["y:0"], ["x:0", "z:0"])
+        assert [run(1, 2) for _ in range(3)] == [("a", (1, 2)), ("b", (1, 2)), ("a", (1, 2))]
+        assert pool.in_flight() == 0
+        assert [call(3, 4) for call in run.callables] == [("a", (3, 4)), ("b", (3, 4))]
+        pool.close()
+        with pytest.raises(PoolClosed):
+            run(1, 2)
+
+    def test_close(self):
+        sessions = [SessionProxy("a"), SessionProxy("b")]
+        SessionPool(sessions).close()
+        assert all(s.closed for s in sessions)
+
+    def test_close_drains_runs(self):
+        block = threading.Event()
+        sessions = [SessionProxy("a", block)]
+        pool = SessionPool(sessions)
+        t = threading.Thread(target=pool.run, args=([], {}))
+        t.start()
+        while pool.in_flight() == 0:
+            pass
+        assert not pool.close(timeout=0.01)
+        with pytest.raises(PoolClosed):
+            pool.run([], {})
+        block.set()
+        t.join()
+        assert pool.in_flight() == 0
+
+        pool = SessionPool([SessionProxy("b", block)])
+        t = threading.Thread(target=pool.run, args=([], {}))
+        block.clear()
+        t.start()
+        while pool.in_flight() == 0:
+            pass
+        closer = threading.Timer(0.05, block.set)
+        closer.start()
+        assert pool.close(timeout=5)
+        t.join()
@@ -0,0 +1,108 @@
+"""Tests streaming request body ingestion.
+"""
+
+import io
+import os
+import sys
+
+import numpy as np
+from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import RequestEntityTooLarge
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import BadInput
+from tfserve import binary_handler
+from tfserve import streaming
+
+class ChunkedStream():
+    """Stream without readinto returning at most `chunk` bytes per read."""
+
+    def __init__(self, data, chunk=3):
+        self.stream = io.BytesIO(data)
+        self.chunk = chunk
+        self.reads = 0
+
+    def read(self, size):
+        self.reads += 1
+        return self.stream.read(min(size, self.chunk))
+
+class TestReadBody():
+
+    body = bytes(range(200))
+
+    def test_content_length(self):
+        buf = streaming.read_body(io.BytesIO(self.body), len(self.body), chunk_size=16)
+        assert buf == self.body
+
+    def test_unknown_length(self):
+        buf = streaming.read_body(ChunkedStream(self.body), chunk_size=16)
+        assert buf == self.body
+
+    def test_short_body(self):
+        buf = streaming.read_body(io.BytesIO(self.body), len(self.body) + 10)
+        assert buf == self.body
+
+    def test_max_bytes(self):
+        stream = ChunkedStream(self.body)
+        with pytest.raises(RequestEntityTooLarge):
+            streaming.read_body(stream, len(self.body), max_bytes=100)
+        assert stream.reads == 0
+
+        with pytest.raises(RequestEntityTooLarge):
+            streaming.read_body(ChunkedStream(self.body, chunk=64), max_bytes=100)
+
+        buf = streaming.read_body(io.BytesIO(self.body), max_bytes=len(self.body))
+        assert buf == self.body
+
+    def test_untrusted_sizes(self):
+        class HugeFrameParser():
+            def feed(self, _data):
+                return 2 ** 40
+
+        with pytest.raises(BadRequest):
+            streaming.read_body(ChunkedStream(self.body), parser=HugeFrameParser())
+
+        buf = streaming.read_body(io.BytesIO(self.body), 2 ** 40)
+        assert buf == self.body
+
+class TestFrameParser():
+
+    tensors = {
+        'x:0': np.arange(12, dtype=np.float32).reshape(3, 4),
+        'y:0': np.ones(5, dtype=np.int64),
+    }
+
+    parser = staticmethod(
+        binary_handler.create_handler(inputs=['x:0'], outputs=['out:0']).stream_parser)
+
+    def test_incremental(self):
+        frame = bytes(binary_handler.pack_tensors(self.tensors))
+        parser = self.parser()
+        buf = streaming.read_body(ChunkedStream(frame, chunk=7), parser=parser)
+        assert parser.specs is not None
+        tensors = parser.close(buf)
+        for name, value in self.tensors.items():
+            assert np.array_equal(tensors[name], value)
+
+    def test_early_rejection(self):
+        frame = bytes(binary_handler.pack_tensors({'y:0': self.tensors['y:0']}))
+        header_size = len(frame) - self.tensors['y:0'].nbytes
+        stream = ChunkedStream(frame, chunk=header_size)
+        with pytest.raises(BadInput):
+            streaming.read_body(stream, parser=self.parser())
+        assert stream.reads == 1
+
+        with pytest.raises(BadInput):
+            streaming.read_body(io.BytesIO(b'foobar' * 10), parser=self.parser())
+
+    def test_size_mismatch(self):
+        frame = bytes(binary_handler.pack_tensors(self.tensors))
+        with pytest.raises(BadRequest):
+            streaming.read_body(io.BytesIO(frame[:-4]), parser=self.parser())
+        with pytest.raises(BadRequest):
+            streaming.read_body(io.BytesIO(frame + b'1234'), parser=self.parser())
+        with pytest.raises(RequestEntityTooLarge):
+            streaming.read_body(io.BytesIO(frame), parser=self.parser(), max_bytes=len(frame) - 1)
@@ -0,0 +1,49 @@
+"""Tests tensorflow tracing.
+"""
+
+import os
+import sys
+
+from werkzeug.datastructures import Headers
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import tracing
+from tfserve.tracing import Tracer
+
+class RequestProxy():
+    """Proxy for a Werkzeug request object."""
+
+    def __init__(self, headers=None):
+        self.headers = Headers(headers or {})
+
+class TestTracer():
+
+    def test_should_trace(self, tmpdir):
+        assert not Tracer(str(tmpdir)).should_trace(RequestProxy({tracing.TRACE_HEADER: '1'}))
+        tracer = Tracer(str(tmpdir), trace_header=True)
+        assert not tracer.should_trace(RequestProxy())
+        assert tracer.should_trace(RequestProxy({tracing.TRACE_HEADER: '1'}))
+        assert not tracer.should_trace(RequestProxy({tracing.TRACE_HEADER: '0'}))
+        assert Tracer(str(tmpdir), sample_rate=1).should_trace(RequestProxy())
+
+    def test_rotation(self, tmpdir):
+        trace_dir = str(tmpdir.join('traces'))
+        tracer = Tracer(trace_dir, max_traces=3)
+        paths = [tracer.save('{"traceEvents": [%i]}' % i) for i in range(5)]
+        assert sorted(os.listdir(trace_dir)) == sorted(os.path.basename(p) for p in paths[2:])
+        with open(paths[-1]) as f:
+            assert f.read() == '{"traceEvents": [4]}'
+
+        tracer = Tracer(trace_dir, max_traces=3)
+        path = tracer.save('{}')
+        assert len(os.listdir(trace_dir)) == 3
+        assert os.path.exists(path)
+
+    def test_invalid(self, tmpdir):
+        with pytest.raises(ValueError):
+            Tracer(str(tmpdir), sample_rate=2)
+        with pytest.raises(ValueError):
+            Tracer(str(tmpdir), max_traces=0)
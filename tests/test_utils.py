@@ -1,5 +1,7 @@
 import os
 import sys
+
+import numpy as np
 import pytest
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
@@ -50,3 +52,68 @@ class TestUtils():
         assert utils.smart_tensor_name("carlitos:0") == "carlitos:0"
         assert utils.smart_tensor_name("carlitos:1") == "carlitos:1"
         assert utils.smart_tensor_name("carlitos:tevez") == "carlitos:tevez:0"
+
+    def test_check_feed_shape(self):
+        utils.check_feed_shape("x:0", np.zeros((3, 5)), [None, 5])
+        utils.check_feed_shape("x:0", np.zeros((3, 5)), None)
+        utils.check_feed_shape("x:0", np.zeros(()), [])
+
+        with pytest.raises(ValueError) as e:
+            utils.check_feed_shape("x:0", np.zeros((1, 4)), [None, 5])
+        assert str(e.value) == "Cannot feed value of shape (1, 4) for Tensor 'x:0', which has shape '(?, 5)'"
+
+        with pytest.raises(ValueError) as e:
+            utils.check_feed_shape("x:0", np.zeros((1,)), [None, 5])
+
+        with pytest.raises(ValueError) as e:
+            utils.check_feed_shape("x:0", np.zeros((1, 5)), [None])
+        assert str(e.value).endswith("which has shape '(?,)'")
+
+    def test_feed_plan(self):
+        specs = {"x:0": (np.dtype(np.float32), [None, 2]), "y:0": (np.dtype(np.int64), [None])}
+        plan = utils.feed_plan(["x", "y:0"], ["out"], specs)
+        assert plan.in_t == ("x:0", "y:0")
+        assert plan.out_t == ("out:0",)
+        assert plan.inputs == frozenset(["x:0", "y:0"])
+        assert dict(plan.aliases) == {"x": "x:0", "x:0": "x:0", "y": "y:0", "y:0": "y:0"}
+
+        feed = plan.prepare({"x": [1.0, 2.0], "y:0": 3}, "bad feed", add_batch_dim=True)
+        assert feed["x:0"].dtype == np.float32 and feed["x:0"].shape == (1, 2)
+        assert feed["y:0"].dtype == np.int64 and feed["y:0"].shape == (1,)
+
+        value = np.zeros((4, 2), dtype=np.float32)
+        feed = plan.prepare({"x:0": value, "y": np.arange(4)}, "bad feed")
+        assert feed["x:0"] is value
+
+        for feed_dict in [{"x:0": value}, {"x:0": value, "y": np.arange(4), "z": 1}]:
+            with pytest.raises(ValueError) as e:
+                plan.prepare(feed_dict, "bad feed")
+            assert str(e.value) == "bad feed"
+
+        with pytest.raises(ValueError) as e:
+            plan.prepare({"x:0": [["a", "b"]], "y": [1]}, "bad feed")
+        assert str(e.value).startswith("Cannot convert input x:0 to float32")
+
+        with pytest.raises(ValueError) as e:
+            plan.prepare({"x:0": [[1.0, 2.0]], "y": [2 ** 63]}, "bad feed")
+        assert str(e.value).startswith("Cannot convert input y:0 to int64")
+
+        with pytest.raises(ValueError) as e:
+            plan.prepare({"x:0": [1.0, 2.0, 3.0], "y": 1}, "bad feed", add_batch_dim=True)
+        assert str(e.value).startswith("Cannot feed value of shape (1, 3) for Tensor 'x:0'")
+
+    def test_feed_plan_conversions(self):
+        plan = utils.feed_plan(["x:0"], ["out:0"], {"x:0": (np.dtype(np.float32), [None, 2])})
+        conversions = []
+        on_convert = lambda name, kind: conversions.append((name, kind))
+
+        value = np.zeros((3, 2), dtype=np.float32)
+        assert plan.prepare({"x:0": value}, "bad feed", on_convert=on_convert)["x:0"] is value
+        assert plan.prepare({"x:0": [[1, 2]]}, "bad feed", on_convert=on_convert)["x:0"].dtype == np.float32
+        assert conversions == []
+
+        feed = plan.prepare({"x:0": np.zeros((3, 2))}, "bad feed", on_convert=on_convert)
+        assert feed["x:0"].dtype == np.float32
+        feed = plan.prepare({"x:0": np.zeros((2, 3), np.float32).T}, "bad feed", on_convert=on_convert)
+        assert feed["x:0"].flags.c_contiguous
+        assert conversions == [("x:0", "dtype"), ("x:0", "layout")]
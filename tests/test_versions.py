@@ -0,0 +1,200 @@
+"""Tests model versions with canary and shadow traffic.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+from werkzeug.test import Client
+from werkzeug.wrappers import Response
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import versions
+from tfserve.metrics import Metrics
+from tfserve.versions import Shadow
+from tfserve.versions import VersionManager
+
+class AppProxy():
+    """Proxy for a TFServeApp that adds `offset` to its input."""
+
+    def __init__(self, offset=0.0, ready=True, fail=False, max_request_bytes=None):
+        self.in_t = ['x:0']
+        self.out_t = ['out:0']
+        self.model_path = 'graph.pb'
+        self.max_request_bytes = max_request_bytes
+        self.offset = offset
+        self.ready = ready
+        self.fail = fail
+        self.shadow = None
+        self._metrics = Metrics()
+        self.inferred = threading.Event()
+
+    def warmup(self):
+        self.ready = True
+
+    def stats(self):
+        return {'offset': self.offset}
+
+    def _infer(self, feed_dict):
+        self.inferred.set()
+        if self.fail:
+            raise ValueError("invalid input")
+        return {'out:0': np.asarray(feed_dict['x:0']) + self.offset}
+
+    def _handle_reload(self, _req):
+        return Response()
+
+    def _handle_inference(self, req):
+        feed_dict = {'x:0': np.asarray(json.loads(req.get_data().decode()))}
+        out_map = self._infer(feed_dict)
+        if self.shadow is not None:
+            self.shadow.mirror(feed_dict, out_map, 0.001)
+        self._metrics.request_started()
+        self._metrics.request_finished(200, 0.001)
+        return Response(json.dumps(out_map['out:0'].tolist()))
+
+def _wait_mirrored(shadow, count, timeout=5):
+    timeout_at = time.time() + timeout
+    while time.time() < timeout_at:
+        stats = shadow.stats()
+        if stats['mirrored'] + stats['errors'] >= count:
+            return stats
+        time.sleep(0.01)
+    assert False
+
+class TestVersions():
+
+    def test_divergence(self):
+        a = {'out:0': np.array([1.0, 2.0, np.nan]), 'label:0': np.array([b'a'])}
+        assert versions.divergence(a, a) == 0.0
+        b = {'out:0': np.array([1.0, 2.5, np.nan], np.float32), 'label:0': np.array([b'a'])}
+        assert versions.divergence(a, b) == 0.5
+        for other in [
+                {'out:0': np.array([1.0, 2.0, 3.0]), 'label:0': np.array([b'a'])},
+                {'out:0': np.array([1.0, 2.0]), 'label:0': np.array([b'a'])},
+                {'out:0': np.array([1.0, 2.0, np.nan]), 'label:0': np.array([b'b'])},
+                {'out:0': np.array([1.0, 2.0, np.nan])},
+        ]:
+            assert versions.divergence(a, other) is None
+
+    def test_weights(self):
+        apps = {'stable': AppProxy(), 'canary': AppProxy(1.0)}
+        client = Client(VersionManager(apps, {'stable': 0.5, 'canary': 0.5})._init_app())
+        served = set()
+        for _ in range(100):
+            resp = client.post('/', data=b'1.0')
+            served.add(resp.headers[versions.VERSION_HEADER])
+        assert served == {'stable', 'canary'}
+
+        client = Client(VersionManager(apps, {'canary': 1, 'stable': 0})._init_app())
+        resp = client.post('/', data=b'1.0')
+        assert resp.headers[versions.VERSION_HEADER] == 'canary'
+        assert json.loads(resp.get_data()) == 2.0
+
+    def test_header(self):
+        apps = {'stable': AppProxy(), 'canary': AppProxy(1.0)}
+        client = Client(VersionManager(apps)._init_app())
+        resp = client.post('/', data=b'1.0')
+        assert resp.headers[versions.VERSION_HEADER] == 'stable'
+        resp = client.post('/', data=b'1.0', headers={versions.VERSION_HEADER: 'canary'})
+        assert resp.headers[versions.VERSION_HEADER] == 'canary'
+        assert json.loads(resp.get_data()) == 2.0
+        resp = client.post('/', data=b'1.0', headers={versions.VERSION_HEADER: 'other'})
+        assert resp.status_code == 404
+
+    def test_routes(self):
+        apps = {'stable': AppProxy(), 'canary': AppProxy(1.0, ready=False)}
+        manager = VersionManager(apps, {'stable': 0.9, 'canary': 0.1})
+        client = Client(manager._init_app())
+        assert client.get('/ping').status_code == 503
+        manager.warmup()
+        assert client.get('/ping').status_code == 200
+
+        listed = json.loads(client.get('/versions').get_data())
+        assert listed['canary'] == {
+            'model_path': 'graph.pb', 'weight': 0.1, 'shadow': False, 'ready': True}
+        assert client.post('/versions/canary/reload').status_code == 200
+        assert json.loads(client.get('/stats').get_data()) == {
+            'versions': {'stable': {'offset': 0.0}, 'canary': {'offset': 1.0}}}
+
+        client.post('/', data=b'1.0', headers={versions.VERSION_HEADER: 'canary'})
+        metrics = client.get('/metrics').get_data().decode()
+        assert 'tfserve_requests_total{code="200",version="canary"} 1' in metrics
+
+    def test_shadow(self):
+        apps = {'stable': AppProxy(), 'shadow': AppProxy(0.5)}
+        manager = VersionManager(apps, shadow='shadow', shadow_rate=1.0)
+        assert apps['stable'].shadow is manager.shadow
+        assert apps['shadow'].shadow is None
+        client = Client(manager._init_app())
+        for _ in range(3):
+            resp = client.post('/', data=b'[1.0, 2.0]')
+            assert resp.headers[versions.VERSION_HEADER] == 'stable'
+            assert json.loads(resp.get_data()) == [1.0, 2.0]
+        stats = _wait_mirrored(manager.shadow, 3)
+        assert stats['mirrored'] == 3
+        assert stats['diverged'] == 3
+        assert stats['divergence']['max'] == 0.5
+        assert stats['latency_ms']['served']['p50'] == 1.0
+        assert json.loads(client.get('/stats').get_data())['shadow']['mirrored'] == 3
+
+    def test_shadow_errors(self):
+        candidate = AppProxy(fail=True)
+        shadow = Shadow(candidate, 1.0)
+        shadow.mirror({'x:0': np.zeros(2)}, {'out:0': np.zeros(2)}, 0.001)
+        stats = _wait_mirrored(shadow, 1)
+        assert stats['errors'] == 1
+        assert stats['latency_ms']['shadow'] == {'p50': None, 'p99': None}
+
+    def test_shadow_sampling(self):
+        candidate = AppProxy()
+        shadow = Shadow(candidate, 0.0)
+        shadow.mirror({'x:0': np.zeros(2)}, {'out:0': np.zeros(2)}, 0.001)
+        time.sleep(0.05)
+        assert not candidate.inferred.is_set()
+
+    def test_shadow_dropped(self):
+        candidate = AppProxy()
+        release = threading.Event()
+        infer = candidate._infer
+        candidate._infer = lambda feed_dict: release.wait() and infer(feed_dict)
+        shadow = Shadow(candidate, 1.0, max_pending=1)
+        for _ in range(4):
+            shadow.mirror({'x:0': np.zeros(2)}, {'out:0': np.zeros(2)}, 0.001)
+        assert shadow.stats()['dropped'] >= 2
+        release.set()
+        stats = _wait_mirrored(shadow, 4 - shadow.stats()['dropped'])
+        assert stats['mismatches'] == 0
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            VersionManager({})
+        with pytest.raises(ValueError):
+            VersionManager({'a b': AppProxy()})
+        with pytest.raises(ValueError):
+            VersionManager({'a': AppProxy()}, {'b': 1})
+        with pytest.raises(ValueError):
+            VersionManager({'a': AppProxy()}, {'a': 0})
+        with pytest.raises(ValueError):
+            VersionManager({'a': AppProxy()}, shadow='b')
+        other = AppProxy()
+        other.out_t = ['other:0']
+        with pytest.raises(ValueError):
+            VersionManager({'a': AppProxy(), 'b': other})
+        with pytest.raises(ValueError):
+            Shadow(AppProxy(), 2.0)
+
+    def test_max_request_bytes(self):
+        versions = VersionManager({
+            'a': AppProxy(max_request_bytes=10),
+            'b': AppProxy(max_request_bytes=20),
+        })
+        assert versions._init_asgi_app().max_body_bytes == 20
+        assert VersionManager({'a': AppProxy(), 'b': AppProxy(max_request_bytes=20)}
+                              ).max_request_bytes is None
@@ -0,0 +1,53 @@
+"""Tests model warmup.
+"""
+
+import json
+import os
+import sys
+
+import numpy as np
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tfserve import warmup
+
+class TestWarmup():
+
+    specs = {
+        'x:0': (np.dtype(np.float32), [None, 5]),
+        'y:0': (np.dtype(np.int64), [None, None, 2]),
+    }
+
+    def test_default_batch_sizes(self):
+        assert warmup.default_batch_sizes() == [1]
+        assert warmup.default_batch_sizes(1) == [1]
+        assert warmup.default_batch_sizes(8) == [1, 2, 4, 8]
+        assert warmup.default_batch_sizes(12) == [1, 2, 4, 8, 12]
+
+    def test_synthetic_feeds(self):
+        feeds = warmup.synthetic_feeds(self.specs, [1, 4], dim_size=3)
+        assert len(feeds) == 2
+        assert feeds[0]['x:0'].shape == (1, 5)
+        assert feeds[1]['x:0'].shape == (4, 5)
+        assert feeds[1]['x:0'].dtype == np.float32
+        assert feeds[1]['y:0'].shape == (4, 3, 2)
+        assert feeds[1]['y:0'].dtype == np.int64
+
+        with pytest.raises(ValueError):
+            warmup.synthetic_feeds({'x:0': (np.dtype(np.float32), None)}, [1])
+
+    def test_recorded_feeds(self, tmpdir):
+        path = tmpdir.join('requests.jsonl')
+        path.write('{"x:0": [1, 2]}\n\n{"x:0": [3, 4]}\n')
+
+        def encode(body):
+            return {name: np.array(value) for name, value in json.loads(body.decode()).items()}
+
+        feeds = warmup.recorded_feeds(str(path), encode, [1, 3])
+        assert [f['x:0'].shape for f in feeds] == [(1, 2), (3, 2), (1, 2), (3, 2)]
+        np.testing.assert_array_equal(feeds[1]['x:0'], [[1, 2]] * 3)
+
+        feeds = warmup.recorded_feeds(str(path), encode, [1, 3], batch=True)
+        assert [f['x:0'].shape for f in feeds] == [(2,), (2,)]
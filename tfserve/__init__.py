@@ -22,4 +22,6 @@ _check_tensorflow()
 
 from tfserve.tfserve import TFServeApp
 from tfserve.tfserve import BadInput
+from tfserve.registry import ModelRegistry
+from tfserve.versions import VersionManager
 from tfserve.handler import EncodeDecodeHandler
@@ -0,0 +1,176 @@
+"""
+Request admission control.
+
+The werkzeug server starts a thread for every connection, so without a limit
+a traffic spike runs every request at once and all of them get slow. An
+AdmissionControl runs up to max_concurrency inference requests at once and
+queues up to max_queued more. Other requests are rejected right away with 429
+Too Many Requests.
+
+Requests take a slot once their body is read, so slow uploads don't hold
+slots while the model is idle, and only for the model run (with encode and
+decode), so response cache hits are never queued. Bodies read at once are
+bounded by the request size limit, not by admission control.
+
+Requests may have a deadline, from a TIMEOUT_HEADER header or a default
+timeout, counted from when the request arrives. A request whose deadline can't
+be met given the observed model run latency is rejected with 503 Service
+Unavailable, when it asks for a slot, while it is queued, or just before the
+model runs, so the server doesn't spend time on responses nobody waits for.
+"""
+
+import threading
+import time
+
+from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.exceptions import TooManyRequests
+
+# Request header with the seconds the client waits for the response.
+TIMEOUT_HEADER = "X-Request-Timeout"
+
+# Weight of the last model run in the run latency estimate.
+LATENCY_DECAY = 0.1
+
+
+class AdmissionControl():
+    """
+    Limits the inference requests running at once and drops the requests that
+    can't be served in time.
+
+    :param int max_concurrency: inference requests running at once.
+    :param int max_queued: requests waiting for one of the running requests to
+                           finish (default is max_concurrency). More requests
+                           are rejected with 429.
+    :param float timeout: deadline in seconds of requests without a
+                          TIMEOUT_HEADER header (default is no deadline).
+    """
+
+    def __init__(self, max_concurrency, max_queued=None, timeout=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be a positive integer")
+        if max_queued is None:
+            max_queued = max_concurrency
+        if max_queued < 0:
+            raise ValueError("max_queued must be a non negative integer")
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive")
+        self.max_concurrency = max_concurrency
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._running = 0
+        self._queued = 0
+        self._run_seconds = 0.0
+        self._counts = {"admitted": 0, "queue_full": 0, "deadline": 0, "expired": 0}
+        self._lock = threading.Lock()
+        self._slot_free = threading.Condition(self._lock)
+
+    def deadline(self, req):
+        """
+        Return the deadline of request `req` as a `time.monotonic` time, or
+        None if it has no deadline.
+
+        :raises BadRequest: if the TIMEOUT_HEADER header is not a positive number.
+        """
+        value = req.headers.get(TIMEOUT_HEADER)
+        if value is None:
+            timeout = self.timeout
+        else:
+            try:
+                timeout = float(value)
+            except ValueError:
+                timeout = 0
+            if not timeout > 0:
+                raise BadRequest("{} must be a positive number of seconds".format(TIMEOUT_HEADER))
+        if timeout is None:
+            return None
+        return time.monotonic() + timeout
+
+    def acquire(self, deadline=None):
+        """
+        Wait for a slot to run a request with `deadline` (as returned by
+        `deadline`). Each successful call must be followed by `release`.
+
+        :raises TooManyRequests: if the queue is full.
+        :raises ServiceUnavailable: if the deadline can't be met.
+        """
+        with self._lock:
+            self._check_locked(deadline, "deadline")
+            if self._running < self.max_concurrency and not self._queued:
+                self._running += 1
+                self._counts["admitted"] += 1
+                return
+            if self._queued >= self.max_queued:
+                self._counts["queue_full"] += 1
+                raise TooManyRequests("server is overloaded, retry later")
+            self._queued += 1
+            try:
+                while self._running >= self.max_concurrency:
+                    wait = None
+                    if deadline is not None:
+                        wait = deadline - self._run_seconds - time.monotonic()
+                        if wait <= 0:
+                            self._check_locked(deadline, "expired")
+                    self._slot_free.wait(wait)
+            except ServiceUnavailable:
+                # Pass on the free slot this request may have been woken for.
+                if self._running < self.max_concurrency:
+                    self._slot_free.notify()
+                raise
+            finally:
+                self._queued -= 1
+            self._running += 1
+            self._counts["admitted"] += 1
+
+    def release(self):
+        """
+        Free the slot of a finished request.
+        """
+        with self._lock:
+            self._running -= 1
+            self._slot_free.notify()
+
+    def check(self, deadline):
+        """
+        Check, just before running the model, that a request with `deadline`
+        can still be served in time.
+
+        :raises ServiceUnavailable: if the deadline can't be met.
+        """
+        if deadline is None:
+            return
+        with self._lock:
+            self._check_locked(deadline, "expired")
+
+    def observe(self, seconds):
+        """
+        Update the model run latency estimate with a run that took `seconds`.
+        """
+        with self._lock:
+            if self._run_seconds:
+                self._run_seconds += LATENCY_DECAY * (seconds - self._run_seconds)
+            else:
+                self._run_seconds = seconds
+
+    def stats(self):
+        """
+        Return the admission statistics as a JSON serializable dict.
+
+        `admitted` requests got a slot. `queue_full` were rejected because
+        the queue was full, `deadline` because their deadline couldn't be met
+        when they asked for a slot and `expired` because it couldn't be met anymore
+        while queued or right before the model run. `running` and `queued`
+        are the requests running and waiting now and `run_ms` the model run
+        latency estimate.
+        """
+        with self._lock:
+            stats = dict(self._counts)
+            stats["running"] = self._running
+            stats["queued"] = self._queued
+            stats["run_ms"] = round(self._run_seconds * 1e3, 3)
+        return stats
+
+    def _check_locked(self, deadline, reason):
+        if deadline is not None and time.monotonic() + self._run_seconds > deadline:
+            self._counts[reason] += 1
+            raise ServiceUnavailable("request deadline can't be met, retry later")
@@ -0,0 +1,194 @@
+"""
+ASGI support.
+
+Serves the TFServeApp WSGI handlers from an asyncio event loop: request bodies
+are read asynchronously and blocking handlers (the ones running the session)
+are sent to a bounded thread pool, so idle keep-alive connections cost no threads.
+"""
+
+import asyncio
+import io
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wrappers import Request
+
+DEFAULT_MAX_WORKERS = 16
+
+
+class ASGIApp():
+    """
+    ASGI application dispatching to WSGI request handlers.
+
+    :param routes: werkzeug.routing.Map used to match request paths.
+    :param wsgi_app: WSGI application run in the thread pool for blocking routes.
+    :param inline_endpoints: endpoints that are cheap enough to run in the event loop.
+                             They are called with a werkzeug Request and must return a Response.
+    :param int max_workers: size of the thread pool running blocking handlers.
+    :param shutdown: function without arguments that stops the server, made available to
+                     handlers as `werkzeug.server.shutdown`.
+    :param int max_body_bytes: requests with larger bodies are rejected with 413 as soon as
+                               their size is known (default is no limit).
+    """
+
+    def __init__(self, routes, wsgi_app, inline_endpoints=(), max_workers=None, shutdown=None,
+                 max_body_bytes=None):
+        self.routes = routes
+        self.wsgi_app = wsgi_app
+        self.inline_endpoints = set(inline_endpoints)
+        self.shutdown = shutdown
+        self.max_body_bytes = max_body_bytes
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or DEFAULT_MAX_WORKERS,
+            thread_name_prefix="tfserve-asgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            raise ValueError("unsupported ASGI scope type: {}".format(scope["type"]))
+
+        try:
+            body = await _read_body(scope, receive, self.max_body_bytes)
+        except HTTPException as e:
+            await _send_wsgi(send, e, _wsgi_environ(scope, b""))
+            return
+        environ = _wsgi_environ(scope, body)
+        if self.shutdown is not None:
+            environ['werkzeug.server.shutdown'] = self.shutdown
+
+        try:
+            handler, _kw = self.routes.bind_to_environ(environ).match()
+        except HTTPException as e:
+            await _send_wsgi(send, e, environ)
+            return
+
+        if handler in self.inline_endpoints:
+            await _send_wsgi(send, handler(Request(environ)), environ)
+            return
+
+        loop = asyncio.get_running_loop()
+        status, headers, resp_body = await loop.run_in_executor(
+            self.executor, _call_wsgi, self.wsgi_app, environ)
+        await _send(send, status, headers, resp_body)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+async def _read_body(scope, receive, max_bytes=None):
+    if max_bytes is not None:
+        for name, value in scope.get("headers", []):
+            if name.lower() == b"content-length" and value.isdigit() and int(value) > max_bytes:
+                raise RequestEntityTooLarge()
+    body = bytearray()
+    more_body = True
+    while more_body:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body += message.get("body", b"")
+        if max_bytes is not None and len(body) > max_bytes:
+            raise RequestEntityTooLarge()
+        more_body = message.get("more_body", False)
+    return bytes(body)
+
+
+def _wsgi_environ(scope, body):
+    server = scope.get("server") or ("localhost", 80)
+    environ = {
+        'REQUEST_METHOD': scope["method"],
+        'SCRIPT_NAME': scope.get("root_path", ""),
+        'PATH_INFO': scope["path"],
+        'QUERY_STRING': scope.get("query_string", b"").decode("latin-1"),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': "HTTP/%s" % scope.get("http_version", "1.1"),
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get("scheme", "http"),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    client = scope.get("client")
+    if client:
+        environ['REMOTE_ADDR'] = client[0]
+    for name, value in scope.get("headers", []):
+        name = name.decode("latin-1").upper().replace("-", "_")
+        value = value.decode("latin-1")
+        if name == "CONTENT_LENGTH":
+            continue
+        if name != "CONTENT_TYPE":
+            name = "HTTP_" + name
+        if name in environ:
+            value = environ[name] + "," + value
+        environ[name] = value
+    return environ
+
+
+def _call_wsgi(wsgi_app, environ):
+    """
+    Run a WSGI application to completion and return (status, headers, body).
+    """
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started["status"] = status
+        started["headers"] = headers
+
+    result = wsgi_app(environ, start_response)
+    try:
+        body = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return int(started["status"].split(" ", 1)[0]), started["headers"], body
+
+
+async def _send_wsgi(send, wsgi_app, environ):
+    await _send(send, *_call_wsgi(wsgi_app, environ))
+
+
+async def _send(send, status, headers, body):
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in headers
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def run(asgi_app_factory, host, port):
+    """
+    Run an ASGI application with uvicorn.
+
+    `asgi_app_factory` receives a shutdown function and returns the ASGI app.
+
+    :raises ImportError: if uvicorn is not installed.
+    """
+    import uvicorn
+
+    server = None
+
+    def shutdown():
+        server.should_exit = True
+
+    app = asgi_app_factory(shutdown)
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=int(port), lifespan="on"))
+    server.run()
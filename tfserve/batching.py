@@ -0,0 +1,306 @@
+"""
+Server-side dynamic batching of single inference requests.
+
+Concurrent requests are collected in a queue and their feeds are stacked
+along the batch dimension so that a single session run serves all of them.
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+import numpy as np
+
+
+class _Pending():
+    """
+    A feed waiting in the batching queue.
+    """
+
+    def __init__(self, feed_dict, padded_elements=0):
+        self.feed_dict = feed_dict
+        self.signature = _feed_signature(feed_dict)
+        self.padded_elements = padded_elements
+        self.enqueued_at = time.monotonic()
+        self.done = threading.Event()
+        self.outputs = None
+        self.error = None
+
+
+class _BucketStats():
+    """
+    Occupancy and padding counters for one bucket.
+    """
+
+    def __init__(self):
+        self.batches = 0
+        self.requests = 0
+        self.elements = 0
+        self.padded_elements = 0
+
+    def as_dict(self, max_batch_size):
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "occupancy": _ratio(self.requests, self.batches * max_batch_size),
+            "padding_waste": _ratio(self.padded_elements, self.elements),
+        }
+
+
+class Batcher():
+    """
+    Collects single-input feeds from concurrent requests and runs them as one batch.
+
+    Every feed passed to `run` must have a batch dimension of size 1. Queued feeds
+    are grouped in buckets by the non-batch shapes and dtypes of their tensors, and
+    only feeds in the same bucket are stacked together. A bucket is run as soon as
+    it holds `max_batch_size` feeds or when its oldest feed has waited
+    `max_queue_delay_us` microseconds, whatever happens first.
+
+    When `bucket_boundaries` is given, the dimension `bucket_axis` (not counting the
+    batch dimension) of every input is padded with `pad_value` up to the next
+    boundary, so that inputs of different lengths land in the same bucket. Inputs
+    longer than the last boundary are not padded. With `input_specs`, only inputs
+    whose dimension `bucket_axis` is unknown in the graph are padded, so inputs of
+    fixed size are fed as they are. The model is responsible for ignoring padded
+    values (for example by masking). Outputs are not trimmed: an output computed
+    along the padded dimension keeps the padding.
+
+    :param run_fn: function that receives a feed dict and returns the list of output values.
+    :param int max_batch_size: maximum number of feeds stacked in a single run.
+    :param int max_queue_delay_us: maximum time (in microseconds) a feed waits for
+                                   other feeds before its batch is run.
+    :param list[int] bucket_boundaries: sorted lengths that inputs are padded to.
+    :param int bucket_axis: input dimension (excluding the batch dimension) to pad.
+    :param dict input_specs: mapping from input name to its (dtype, shape) in the
+                             graph, as returned by `TFServeApp.input_specs`.
+                             Default is to pad every input.
+    :param pad_value: value used for padding.
+    :param int num_workers: number of batches run concurrently (for example,
+                            one per session of a `SessionPool`).
+    """
+
+    def __init__(self, run_fn, max_batch_size, max_queue_delay_us,
+                 bucket_boundaries=None, bucket_axis=0, pad_value=0, num_workers=1,
+                 input_specs=None):
+        if max_batch_size is None or max_batch_size < 1:
+            raise ValueError("max_batch_size must be a positive integer")
+        if max_queue_delay_us is None or max_queue_delay_us < 0:
+            raise ValueError("max_queue_delay_us must be a non negative integer")
+        if bucket_boundaries is not None and list(bucket_boundaries) != sorted(set(bucket_boundaries)):
+            raise ValueError("bucket_boundaries must be strictly increasing")
+        if bucket_axis < 0:
+            raise ValueError("bucket_axis must be a non negative integer")
+        if num_workers < 1:
+            raise ValueError("num_workers must be a positive integer")
+
+        self.run_fn = run_fn
+        self.max_batch_size = max_batch_size
+        self.max_queue_delay = max_queue_delay_us / 1e6
+        self.bucket_boundaries = list(bucket_boundaries) if bucket_boundaries else None
+        self.bucket_axis = bucket_axis
+        self.pad_value = pad_value
+        self._padded_inputs = None
+        if input_specs is not None:
+            self._padded_inputs = frozenset(
+                name for name, (_, shape) in input_specs.items()
+                if shape is None or len(shape) <= bucket_axis + 1 or shape[bucket_axis + 1] is None)
+
+        self._buckets = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self._stats = collections.defaultdict(_BucketStats)
+        self._stats_lock = threading.Lock()
+
+        self._workers = []
+        for i in range(num_workers):
+            worker = threading.Thread(target=self._loop, name="tfserve-batcher-%i" % i)
+            worker.daemon = True
+            worker.start()
+            self._workers.append(worker)
+
+    def run(self, feed_dict):
+        """
+        Queue `feed_dict` and block until its batch has been run.
+
+        Returns the list of output values for this feed only, each one keeping
+        a batch dimension of size 1. Errors raised while running the batch are
+        raised for every feed in it.
+        """
+        padded_elements = 0
+        if self.bucket_boundaries:
+            feed_dict, padded_elements = self._pad_feed(feed_dict)
+        item = _Pending(feed_dict, padded_elements)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("batcher is closed")
+            self._buckets.setdefault(item.signature, collections.deque()).append(item)
+            self._cond.notify()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.outputs
+
+    def stats(self):
+        """
+        Return per bucket counters as a JSON serializable dict.
+
+        For each bucket: number of batches and requests run, mean occupancy
+        (requests per batch over max_batch_size) and padding waste (fraction
+        of fed elements that were padding).
+        """
+        with self._stats_lock:
+            return {
+                _signature_name(signature): stats.as_dict(self.max_batch_size)
+                for signature, stats in self._stats.items()
+            }
+
+    def close(self):
+        """
+        Stop the batching threads. Feeds still in the queue are run before they exit.
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for worker in self._workers:
+            worker.join()
+
+    def _pad_feed(self, feed_dict):
+        axis = self.bucket_axis + 1
+        padded = {}
+        padded_elements = 0
+        for name, value in feed_dict.items():
+            value = np.asarray(value)
+            if value.ndim > axis and (self._padded_inputs is None or name in self._padded_inputs):
+                length = value.shape[axis]
+                i = bisect.bisect_left(self.bucket_boundaries, length)
+                if i < len(self.bucket_boundaries) and self.bucket_boundaries[i] > length:
+                    pad_width = [(0, 0)] * value.ndim
+                    pad_width[axis] = (0, self.bucket_boundaries[i] - length)
+                    before = value.size
+                    value = np.pad(value, pad_width, 'constant', constant_values=self.pad_value)
+                    padded_elements += value.size - before
+            padded[name] = value
+        return padded, padded_elements
+
+    def _loop(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            self._run_batch(batch)
+
+    def _next_batch(self):
+        """
+        Wait for a bucket to be ready and pop its next batch from the queue.
+        """
+        with self._cond:
+            while True:
+                if not self._buckets and self._closed:
+                    return None
+                signature, timeout = self._ready_bucket()
+                if signature is not None:
+                    break
+                self._cond.wait(timeout)
+
+            bucket = self._buckets[signature]
+            batch = [bucket.popleft() for _ in range(min(len(bucket), self.max_batch_size))]
+            if not bucket:
+                del self._buckets[signature]
+            return batch
+
+    def _ready_bucket(self):
+        """
+        Find the bucket that should run next.
+
+        Full buckets and buckets whose oldest feed reached its deadline are ready;
+        the one with the oldest feed wins. If none is ready, returns the time left
+        until the next deadline.
+        """
+        now = time.monotonic()
+        ready = None
+        ready_since = None
+        next_deadline = None
+        for signature, bucket in self._buckets.items():
+            head = bucket[0]
+            deadline = head.enqueued_at + self.max_queue_delay
+            if len(bucket) >= self.max_batch_size or deadline <= now or self._closed:
+                if ready is None or head.enqueued_at < ready_since:
+                    ready, ready_since = signature, head.enqueued_at
+            elif next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+        if ready is not None:
+            return ready, None
+        if next_deadline is None:
+            return None, None
+        return None, next_deadline - now
+
+    def _run_batch(self, batch):
+        self._record(batch)
+        try:
+            outputs = self.run_fn(_stack_feeds(batch))
+            per_item = _split_outputs(outputs, len(batch))
+        except Exception as e:  # pylint: disable=broad-except
+            for item in batch:
+                item.error = e
+                item.done.set()
+            return
+
+        for item, item_outputs in zip(batch, per_item):
+            item.outputs = item_outputs
+            item.done.set()
+
+    def _record(self, batch):
+        elements = sum(np.size(v) for item in batch for v in item.feed_dict.values())
+        with self._stats_lock:
+            stats = self._stats[batch[0].signature]
+            stats.batches += 1
+            stats.requests += len(batch)
+            stats.elements += elements
+            stats.padded_elements += sum(item.padded_elements for item in batch)
+
+
+def _feed_signature(feed_dict):
+    """
+    Key identifying feeds that can be stacked together.
+    """
+    return tuple(sorted(
+        (name, np.shape(value)[1:], np.asarray(value).dtype.str)
+        for name, value in feed_dict.items()))
+
+
+def _signature_name(signature):
+    return ",".join(
+        "{}{}{}".format(name, list(shape), np.dtype(dtype).name)
+        for name, shape, dtype in signature)
+
+
+def _ratio(a, b):
+    return float(a) / b if b else 0.0
+
+
+def _stack_feeds(batch):
+    if len(batch) == 1:
+        return batch[0].feed_dict
+    return {
+        name: np.concatenate([item.feed_dict[name] for item in batch], axis=0)
+        for name in batch[0].feed_dict
+    }
+
+
+def _split_outputs(outputs, batch_size):
+    """
+    Split each batched output value back into one value per feed.
+    """
+    for value in outputs:
+        if batch_size > 1 and np.shape(value)[:1] != (batch_size,):
+            raise ValueError(
+                "Output of shape {} can not be split into a batch of {}; "
+                "dynamic batching requires outputs with a batch dimension"
+                .format(np.shape(value), batch_size))
+    return [
+        [value[i:i + 1] if batch_size > 1 else value for value in outputs]
+        for i in range(batch_size)
+    ]
@@ -0,0 +1,401 @@
+"""
+TFServe benchmark tool.
+
+Sends inference requests to a running tfserve server, or to an in-process
+TFServeApp, and reports throughput and latency percentiles.
+"""
+
+import argparse
+import http.client
+import itertools
+import json
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from tfserve import binary_handler
+from tfserve.warmup import generate_inputs
+from tfserve.warmup import read_requests
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS = 1000
+DEFAULT_PAYLOADS = 16
+DEFAULT_WARMUP = 10
+
+PERCENTILES = (50, 90, 99, 99.9)
+
+# Handlers request bodies can be generated for, and their content type.
+GENERATED_HANDLERS = {
+    'json': 'application/json',
+    'fastjson': 'application/json',
+    'binary': binary_handler.MEDIA_TYPE,
+}
+
+USAGE = "tfserve-bench (--url URL | -m PATH) [options]"
+
+DESCRIPTION = """
+Benchmark a tfserve server (--url) or a model served in process (-m).
+
+Request bodies are read from --replay, a file with one JSON request body
+per line, or generated from the input placeholders dtypes and shapes with
+random values (requires -m and -i, also with --url). Requests are sent
+from --concurrency threads, either back to back (closed loop) or at a
+fixed --rate (open loop). Latency is measured from the time each request
+is scheduled, so in open loop it includes queueing in the client.
+"""
+
+
+class BenchResult():
+    """
+    Latencies, in seconds, of successful requests, error count and elapsed time.
+    """
+
+    def __init__(self, latencies, errors, elapsed):
+        self.latencies = latencies
+        self.errors = errors
+        self.elapsed = elapsed
+
+    def summary(self):
+        """
+        Return throughput and latency percentiles, in milliseconds, as a
+        JSON serializable dict.
+        """
+        n = len(self.latencies)
+        summary = {
+            'requests': n + self.errors,
+            'errors': self.errors,
+            'elapsed_s': round(self.elapsed, 6),
+            'throughput_rps': round(n / self.elapsed, 3) if self.elapsed > 0 else 0.0,
+        }
+        if n:
+            ms = np.asarray(self.latencies) * 1e3
+            summary['latency_ms'] = dict(
+                [('p%g' % p, round(float(v), 3))
+                 for p, v in zip(PERCENTILES, np.percentile(ms, PERCENTILES))],
+                mean=round(float(ms.mean()), 3),
+                max=round(float(ms.max()), 3))
+        return summary
+
+
+def run_closed_loop(send, bodies, concurrency, requests=None, duration=None):
+    """
+    Send requests back to back from `concurrency` threads.
+
+    `send` is called with a request body and raises on errors. Bodies are
+    cycled. Stops after `requests` requests or `duration` seconds.
+    """
+    schedule = _Schedule(bodies, requests, duration)
+
+    def worker(latencies):
+        while True:
+            body = schedule.next()
+            if body is None:
+                return
+            start = time.perf_counter()
+            if _send(send, body):
+                latencies.append(time.perf_counter() - start)
+            else:
+                schedule.error()
+
+    return _run_workers(worker, concurrency, schedule)
+
+
+def run_open_loop(send, bodies, rate, concurrency, requests=None, duration=None):
+    """
+    Send `rate` requests per second, whether previous requests finished or
+    not, from up to `concurrency` threads.
+
+    Latency is measured from the time each request is scheduled. Other
+    arguments as in `run_closed_loop`.
+    """
+    schedule = _Schedule(bodies, requests, duration)
+    interval = 1.0 / rate
+    lock = threading.Lock()
+    slots = itertools.count()
+
+    def worker(latencies):
+        while True:
+            body = schedule.next()
+            if body is None:
+                return
+            with lock:
+                scheduled = schedule.start + next(slots) * interval
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            if _send(send, body):
+                latencies.append(time.perf_counter() - scheduled)
+            else:
+                schedule.error()
+
+    return _run_workers(worker, concurrency, schedule)
+
+
+class _Schedule():
+
+    def __init__(self, bodies, requests, duration):
+        if requests is None and duration is None:
+            raise ValueError("one of requests or duration is required")
+        if not bodies:
+            raise ValueError("no request bodies")
+        self.bodies = itertools.cycle(bodies)
+        self.remaining = requests
+        self.start = time.perf_counter()
+        self.end = self.start + duration if duration is not None else None
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def next(self):
+        with self._lock:
+            if self.remaining is not None:
+                if self.remaining <= 0:
+                    return None
+                self.remaining -= 1
+            if self.end is not None and time.perf_counter() >= self.end:
+                return None
+            return next(self.bodies)
+
+    def error(self):
+        with self._lock:
+            self.errors += 1
+
+
+def _send(send, body):
+    try:
+        send(body)
+    except Exception:  # pylint: disable=broad-except
+        return False
+    return True
+
+
+def _run_workers(worker, concurrency, schedule):
+    per_thread = [[] for _ in range(concurrency)]
+    threads = [threading.Thread(target=worker, args=(latencies,)) for latencies in per_thread]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - schedule.start
+    return BenchResult(
+        [latency for latencies in per_thread for latency in latencies],
+        schedule.errors, elapsed)
+
+
+def request_body(inputs, handler):
+    """
+    Return the request body of an input `dict` for a built-in `handler`.
+    """
+    if handler == 'binary':
+        return bytes(binary_handler.pack_tensors(inputs))
+    if handler in GENERATED_HANDLERS:
+        return json.dumps({name: value.tolist() for name, value in inputs.items()}).encode()
+    raise ValueError("can't generate requests for handler {}, use --replay".format(handler))
+
+
+def local_sender(app):
+    """
+    Return a `send` function running requests on an in-process TFServeApp.
+    """
+    return app._make_inference_impl
+
+
+def http_sender(url, content_type, timeout=None):
+    """
+    Return a `send` function POSTing requests to `url`, with one keep-alive
+    connection per thread.
+
+    Responses other than 2xx raise `IOError`.
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https'):
+        raise ValueError("unsupported URL {}".format(url))
+    connection_class = (
+        http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    headers = {'Content-Type': content_type}
+    local = threading.local()
+
+    def send(body):
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = connection_class(parts.netloc, timeout=timeout)
+        try:
+            conn.request('POST', path, body, headers)
+            resp = conn.getresponse()
+            resp.read()
+        except Exception:
+            conn.close()
+            local.conn = None
+            raise
+        if not 200 <= resp.status < 300:
+            raise IOError("HTTP {} {}".format(resp.status, resp.reason))
+
+    return send
+
+
+def main():
+    """TFServe benchmark main function.
+
+    """
+    args = _init_args()
+    app = None
+    specs = None
+    if args.model:
+        if not args.inputs or not args.outputs:
+            raise SystemExit("tfserve-bench: -m requires -i and -o")
+        app = _init_app(args)
+        specs = app.input_specs()
+
+    if args.replay:
+        try:
+            bodies = read_requests(args.replay)
+        except (IOError, ValueError) as e:
+            raise SystemExit("tfserve-bench: %s" % e)
+    elif specs is not None:
+        try:
+            inputs = generate_inputs(
+                specs, args.payloads, args.batch_size if args.batch else None, args.dim_size)
+        except ValueError as e:
+            raise SystemExit("tfserve-bench: %s, use --replay" % e)
+        bodies = [request_body(values, args.handler) for values in inputs]
+    else:
+        raise SystemExit("tfserve-bench: --replay or -m is required to build requests")
+
+    if args.url:
+        content_type = args.content_type or GENERATED_HANDLERS.get(args.handler, 'application/json')
+        send = http_sender(args.url, content_type, args.timeout)
+    elif app is not None:
+        send = local_sender(app)
+    else:
+        raise SystemExit("tfserve-bench: one of --url or -m is required")
+
+    if args.warmup:
+        run_closed_loop(send, bodies, 1, requests=args.warmup)
+
+    requests = args.requests if args.duration is None else None
+    if args.rate:
+        result = run_open_loop(
+            send, bodies, args.rate, args.concurrency, requests, args.duration)
+    else:
+        result = run_closed_loop(send, bodies, args.concurrency, requests, args.duration)
+
+    summary = result.summary()
+    summary['config'] = {
+        'target': args.url or args.model,
+        'mode': 'open' if args.rate else 'closed',
+        'rate': args.rate,
+        'concurrency': args.concurrency,
+        'handler': args.handler,
+        'payloads': args.replay or 'generated',
+        'batch_size': args.batch_size if args.batch else None,
+    }
+    _print_summary(summary)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+            f.write('\n')
+    if summary['errors'] and args.fail_on_error:
+        sys.exit(1)
+
+
+def _init_args():
+    p = argparse.ArgumentParser(
+        prog="tfserve-bench",
+        usage=USAGE,
+        description=DESCRIPTION,
+        formatter_class=argparse.RawTextHelpFormatter)
+    p.add_argument(
+        '--url',
+        help="URL of a running tfserve server")
+    p.add_argument(
+        '-m', '--model', metavar='PATH',
+        help=(
+            "path to pb file or directory containing checkpoint;\n"
+            "served in process unless --url is given"))
+    p.add_argument(
+        '-i', '--inputs',
+        help="a comma separated list of input tensors")
+    p.add_argument(
+        '-o', '--outputs',
+        help="a comma separated list of output tensors")
+    p.add_argument(
+        '--handler', default='json',
+        help="encode/decode handler (json)")
+    p.add_argument(
+        '-b', '--batch', action='store_true',
+        help="send batches of --batch-size inputs")
+    p.add_argument(
+        '--batch-size', metavar='N', type=int, default=1,
+        help="inputs per request with --batch (1)")
+    p.add_argument(
+        '--content-type',
+        help="Content-Type of requests sent to --url")
+    p.add_argument(
+        '--replay', metavar='FILE',
+        help="send the JSON request bodies in FILE, one per line")
+    p.add_argument(
+        '--payloads', metavar='N', type=int, default=DEFAULT_PAYLOADS,
+        help="number of generated request bodies (%i)" % DEFAULT_PAYLOADS)
+    p.add_argument(
+        '--dim-size', metavar='N', type=int, default=1,
+        help="size of unknown input dimensions (1)")
+    p.add_argument(
+        '-c', '--concurrency', metavar='N', type=int, default=DEFAULT_CONCURRENCY,
+        help="number of client threads (%i)" % DEFAULT_CONCURRENCY)
+    p.add_argument(
+        '-r', '--rate', metavar='RPS', type=float,
+        help=(
+            "send requests at RPS requests per second (open\n"
+            "loop); default is back to back (closed loop)"))
+    p.add_argument(
+        '-n', '--requests', metavar='N', type=int, default=DEFAULT_REQUESTS,
+        help="number of requests (%i)" % DEFAULT_REQUESTS)
+    p.add_argument(
+        '-d', '--duration', metavar='SECONDS', type=float,
+        help="send requests for SECONDS instead of --requests")
+    p.add_argument(
+        '--warmup', metavar='N', type=int, default=DEFAULT_WARMUP,
+        help="requests sent before measuring (%i)" % DEFAULT_WARMUP)
+    p.add_argument(
+        '--timeout', metavar='SECONDS', type=float,
+        help="request timeout with --url")
+    p.add_argument(
+        '--output', metavar='FILE',
+        help="write results as JSON to FILE")
+    p.add_argument(
+        '--fail-on-error', action='store_true',
+        help="exit with status 1 if any request failed")
+    return p.parse_args()
+
+
+def _init_app(args):
+    from tfserve import main as tfserve_main
+    from tfserve.tfserve import TFServeApp
+
+    inputs = tfserve_main._split_tensors(args.inputs)
+    outputs = tfserve_main._split_tensors(args.outputs)
+    handler_args = argparse.Namespace(
+        handler=args.handler, batch=args.batch, json_precision=None)
+    handler = tfserve_main._init_handler(inputs, outputs, handler_args)
+    app = TFServeApp(
+        args.model, inputs, outputs, handler.encode, handler.decode, args.batch)
+    set_input_specs = getattr(handler, 'set_input_specs', None)
+    if set_input_specs:
+        set_input_specs(app.input_specs())
+    return app
+
+
+def _print_summary(summary):
+    sys.stdout.write(
+        "%(requests)i requests, %(errors)i errors in %(elapsed_s).3f s: "
+        "%(throughput_rps).1f req/s\n" % summary)
+    latency = summary.get('latency_ms')
+    if latency:
+        sys.stdout.write("latency ms: %s\n" % "  ".join(
+            "%s %.3f" % (name, latency[name])
+            for name in ['p%g' % p for p in PERCENTILES] + ['mean', 'max']))
@@ -0,0 +1,274 @@
+"""
+Binary tensor encode / decode support.
+
+Tensors are sent as a small JSON header followed by their raw little-endian
+buffers, which are wrapped as numpy arrays without copying them:
+
+    magic       4 bytes  b"TFSB"
+    header_len  4 bytes  little-endian uint32
+    header      header_len bytes of UTF-8 JSON:
+                {"tensors": [{"name": ..., "dtype": "<f4", "shape": [...],
+                              "offset": ..., "nbytes": ...}, ...]}
+    padding     up to the next multiple of ALIGNMENT bytes
+    data        tensor buffers, each one starting at `offset` bytes from
+                the start of the data section (a multiple of ALIGNMENT)
+"""
+
+import json
+import struct
+from urllib import request
+
+import numpy as np
+from werkzeug.wrappers import Response
+
+from tfserve.tfserve import BadInput
+from tfserve.handler import EncodeDecodeHandler
+
+MAGIC = b"TFSB"
+ALIGNMENT = 64
+MEDIA_TYPE = "application/x-tfserve-tensors"
+
+_PREFIX = struct.Struct("<4sI")
+
+
+class BinaryHandler(EncodeDecodeHandler):
+    """
+    Binary tensor handler for encode and decode.
+    """
+
+    def __init__(self, inputs, outputs, batch=False):
+        self.input_tensors = inputs
+        self.output_tensors = outputs
+        self.batch_mode = batch
+
+    def get_description(self):
+        return "binary tensor handler"
+
+    def encode(self, request_bytes):
+        """
+        Encode request bytes as model inputs.
+
+        `request_bytes` must be a binary tensor frame (see module docs)
+        containing values for each input tensor. Input arrays share memory
+        with `request_bytes`.
+
+        """
+        if not request_bytes:
+            raise BadInput("empty request")
+        try:
+            inputs = unpack_tensors(request_bytes)
+        except ValueError as e:
+            raise BadInput(str(e))
+        missing_inputs = [
+            name for name in self.input_tensors
+            if name not in inputs]
+        if missing_inputs:
+            raise BadInput(
+                "missing inputs: %s"
+                % ','.join(missing_inputs))
+        return inputs
+
+    def stream_parser(self):
+        """
+        Return an incremental parser of binary tensor frames.
+
+        The frame header is parsed, and inputs checked, as soon as it
+        arrives, before the tensor data is read.
+
+        """
+        return FrameParser(self.input_tensors)
+
+    @staticmethod
+    def decode(outputs):
+        """
+        Decode model outputs to a binary tensor frame response.
+
+        """
+        return Response(pack_tensors(outputs), content_type=MEDIA_TYPE)
+
+
+class FrameParser():
+    """
+    Incremental binary tensor frame parser (see `tfserve.streaming`).
+
+    :param inputs: names of the tensors the frame must contain.
+    """
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.specs = None
+        self.data_start = None
+
+    def feed(self, data):
+        """
+        Parse the frame header once `data` contains it.
+
+        Returns the frame size when the header is known.
+        """
+        if self.specs is None:
+            if len(data) >= _PREFIX.size and bytes(data[:len(MAGIC)]) != MAGIC:
+                raise BadInput("invalid binary tensor frame")
+            if len(data) < _PREFIX.size or len(data) < _PREFIX.size + _PREFIX.unpack_from(data)[1]:
+                return None
+            try:
+                self.specs, self.data_start = read_header(data)
+            except ValueError as e:
+                raise BadInput(str(e))
+            names = set(spec["name"] for spec in self.specs)
+            missing_inputs = [name for name in self.inputs if name not in names]
+            if missing_inputs:
+                raise BadInput(
+                    "missing inputs: %s"
+                    % ','.join(missing_inputs))
+        return _frame_size(self.specs, self.data_start)
+
+    def close(self, frame):
+        """
+        Return the tensors of the complete `frame`, sharing its memory.
+        """
+        if self.specs is None:
+            raise BadInput("empty request" if not frame else "truncated binary tensor frame")
+        try:
+            return _tensors(frame, self.specs, self.data_start)
+        except ValueError as e:
+            raise BadInput(str(e))
+
+
+def pack_tensors(tensors):
+    """
+    Pack a `dict` mapping names to numpy values as a binary tensor frame.
+
+    Returns a `bytearray` (values are copied into it only once).
+
+    :raises ValueError: if a value can't be represented as a raw buffer
+                        (for example, strings or Python objects).
+    """
+    arrays = []
+    specs = []
+    offset = 0
+    end = 0
+    for name, value in tensors.items():
+        arr = np.asarray(value)
+        if arr.dtype.hasobject or arr.dtype.kind in "SUV":
+            raise ValueError("unsupported dtype for tensor {}: {}".format(name, arr.dtype))
+        arr = arr.astype(arr.dtype.newbyteorder("<"), order="C", copy=False)
+        specs.append({
+            "name": name,
+            "dtype": arr.dtype.str,
+            "shape": list(arr.shape),
+            "offset": offset,
+            "nbytes": arr.nbytes,
+        })
+        arrays.append(arr)
+        end = offset + arr.nbytes
+        offset = _align(end)
+
+    header = json.dumps({"tensors": specs}).encode("utf-8")
+    data_start = _align(_PREFIX.size + len(header))
+    frame = bytearray(data_start + end)
+    _PREFIX.pack_into(frame, 0, MAGIC, len(header))
+    frame[_PREFIX.size:_PREFIX.size + len(header)] = header
+    for spec, arr in zip(specs, arrays):
+        view = np.frombuffer(
+            frame, dtype=arr.dtype, count=arr.size, offset=data_start + spec["offset"])
+        view[...] = arr.reshape(-1)
+    return frame
+
+
+def unpack_tensors(frame):
+    """
+    Unpack a binary tensor frame to a `dict` mapping names to numpy values.
+
+    Values are read-only arrays sharing memory with `frame`.
+
+    :raises ValueError: if `frame` is not a valid binary tensor frame.
+    """
+    specs, data_start = read_header(frame)
+    return _tensors(frame, specs, data_start)
+
+
+def _tensors(frame, specs, data_start):
+    tensors = {}
+    for spec in specs:
+        start = data_start + spec["offset"]
+        if start + spec["nbytes"] > len(frame):
+            raise ValueError("truncated data for tensor {}".format(spec["name"]))
+        arr = np.frombuffer(frame, dtype=spec["dtype"], count=spec["count"], offset=start)
+        # Request bodies are bytearrays: keep the inputs read-only anyway.
+        arr.flags.writeable = False
+        tensors[spec["name"]] = arr.reshape(tuple(spec["shape"]))
+    return tensors
+
+
+def read_header(frame):
+    """
+    Parse the header of a binary tensor frame.
+
+    `frame` needs to contain at least the header bytes. Returns the list of
+    tensor specs (with an additional `count` of elements) and the offset of
+    the data section.
+
+    :raises ValueError: if the header is invalid.
+    """
+    if len(frame) < _PREFIX.size:
+        raise ValueError("truncated binary tensor frame")
+    magic, header_len = _PREFIX.unpack_from(frame, 0)
+    if magic != MAGIC:
+        raise ValueError("invalid binary tensor frame")
+    header_end = _PREFIX.size + header_len
+    if len(frame) < header_end:
+        raise ValueError("truncated binary tensor frame")
+    try:
+        header = json.loads(bytes(frame[_PREFIX.size:header_end]).decode("utf-8"))
+        specs = header["tensors"]
+        for spec in specs:
+            dtype = np.dtype(spec["dtype"])
+            if dtype.hasobject:
+                raise ValueError("unsupported dtype {}".format(dtype))
+            shape = spec["shape"]
+            if not isinstance(shape, list) or not all(
+                    isinstance(dim, int) and dim >= 0 for dim in shape):
+                raise ValueError("invalid shape for tensor {}".format(spec["name"]))
+            count = 1
+            for dim in shape:
+                count *= dim
+            if count * dtype.itemsize != spec["nbytes"]:
+                raise ValueError("size mismatch for tensor {}".format(spec["name"]))
+            if not isinstance(spec["offset"], int) or spec["offset"] < 0:
+                raise ValueError("invalid offset for tensor {}".format(spec["name"]))
+            spec["count"] = count
+    except (UnicodeDecodeError, KeyError, TypeError) as e:
+        raise ValueError("invalid binary tensor header: {}".format(e))
+    return specs, _align(header_end)
+
+
+def post_tensors(url, tensors, timeout=None):
+    """
+    Client helper: POST `tensors` to a tfserve server using the binary handler.
+
+    Returns a `dict` mapping output names to numpy values.
+
+    Example:
+
+        outputs = post_tensors("http://localhost:5000/", {"x:0": np.ones(5, np.float32)})
+    """
+    req = request.Request(
+        url, pack_tensors(tensors),
+        headers={"Content-Type": MEDIA_TYPE, "Accept": MEDIA_TYPE})
+    with request.urlopen(req, timeout=timeout) as resp:
+        return unpack_tensors(resp.read())
+
+
+def _frame_size(specs, data_start):
+    return data_start + max([spec["offset"] + spec["nbytes"] for spec in specs] or [0])
+
+
+def _align(n):
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def create_handler(**kw):
+    """
+    Create a BinaryHandler instance.
+    """
+    return BinaryHandler(**kw)
@@ -0,0 +1,151 @@
+"""
+Optimized JSON encode / decode support.
+
+Accepts and returns the same JSON as the JSON handler, but:
+
+  * Input values are converted to numpy arrays of the input placeholder
+    dtype as soon as the request is parsed, so they are fed to the model
+    without any further conversion.
+
+  * Numeric outputs are formatted in a single pass with a fixed number of
+    significant digits instead of converting them to Python lists and
+    serializing them with `json.dumps`.
+
+Parsing itself is left to `json.loads`: its C scanner reads numbers faster
+than numpy's text parsers (see benchmarks/bench_json.py).
+"""
+
+import functools
+import json
+
+import numpy as np
+from werkzeug.wrappers import Response
+
+from tfserve import graph_utils
+from tfserve.json_handler import JSONHandler
+from tfserve.tfserve import BadInput
+
+# Significant digits that preserve float values when parsed back.
+ROUND_TRIP_PRECISION = {
+    np.dtype(np.float16): 5,
+    np.dtype(np.float32): 9,
+    np.dtype(np.float64): 17,
+}
+
+_CONVERTIBLE_DTYPES = frozenset(np.dtype(t) for t in (
+    np.float16, np.float32, np.float64, np.int8, np.int16, np.int32, np.int64,
+    np.uint8, np.uint16, np.uint32, np.uint64))
+
+
+class FastJSONHandler(JSONHandler):
+    """
+    JSON handler with typed inputs and vectorized output formatting.
+
+    :param int precision: significant digits of float outputs. Default is the
+                          number of digits needed to round-trip the output dtype.
+    """
+
+    def __init__(self, inputs, outputs, batch=False, precision=None):
+        super(FastJSONHandler, self).__init__(inputs, outputs, batch)
+        if precision is not None and precision < 1:
+            raise ValueError("precision must be a positive integer")
+        self.precision = precision
+        self.input_specs = {}
+
+    def get_description(self):
+        return "fast JSON handler"
+
+    def set_input_specs(self, specs):
+        self.input_specs = {
+            graph_utils.smart_tensor_name(name): spec
+            for name, spec in specs.items()
+        }
+
+    def encode(self, request_bytes):
+        """
+        Encode request bytes as model inputs.
+
+        Same input as the JSON handler. Values of known inputs are returned
+        as numpy arrays of the placeholder dtype. Values that can't be
+        converted are left as is, so the error is reported when feeding them.
+
+        """
+        inputs = self._decode_request(request_bytes)
+        self._validate_inputs(inputs)
+        for name, value in inputs.items():
+            spec = self.input_specs.get(graph_utils.smart_tensor_name(name))
+            if spec is not None and spec[0] in _CONVERTIBLE_DTYPES:
+                arr = _typed_array(name, value, spec[0])
+                if arr is not None:
+                    inputs[name] = arr
+        return inputs
+
+    def decode(self, outputs):
+        """
+        Decode model outputs to a JSON response.
+
+        """
+        body = "{%s}" % ",".join(
+            "%s:%s" % (json.dumps(name), self._format_value(value))
+            for name, value in outputs.items())
+        return Response(body, content_type='application/json')
+
+    def _format_value(self, value):
+        arr = np.asarray(value)
+        if arr.dtype.kind == "f" and np.isfinite(arr).all():
+            precision = self.precision or ROUND_TRIP_PRECISION.get(arr.dtype, 17)
+            return _format_array(arr, "%%.%ig" % precision)
+        if arr.dtype.kind in "iu":
+            return _format_array(arr, "%d")
+        return json.dumps(arr.tolist())
+
+
+def _typed_array(name, value, dtype):
+    """
+    Return `value` as a numpy array of `dtype`, or None if it is not made of
+    numbers (like nested lists of different lengths or strings).
+
+    :raises BadInput: if a value is out of the range of `dtype`, or not an
+                      integer for an integer `dtype`.
+    """
+    try:
+        if dtype.kind == "f":
+            return np.array(value, dtype=dtype)
+        arr = np.array(value)
+        if arr.dtype.kind not in "biuf":
+            # Strings, or integers too large for int64 (OverflowError).
+            return np.array(value, dtype=dtype)
+    except OverflowError:
+        raise BadInput("input {} is out of the range of {}".format(name, dtype))
+    except (ValueError, TypeError):
+        return None
+    if arr.dtype.kind == "f" and not (np.isfinite(arr) & (arr == np.trunc(arr))).all():
+        raise BadInput("input {} must be integers of {}".format(name, dtype))
+    info = np.iinfo(dtype)
+    if arr.size and (arr.min() < info.min or arr.max() > info.max):
+        raise BadInput("input {} is out of the range of {}".format(name, dtype))
+    return arr.astype(dtype)
+
+
+def _format_array(arr, fmt):
+    if arr.ndim == 0:
+        return fmt % arr.item()
+    return _template(arr.shape, fmt) % tuple(arr.ravel().tolist())
+
+
+@functools.lru_cache(maxsize=64)
+def _template(shape, fmt):
+    """
+    Format string of a JSON array of `shape` with `fmt` for every element.
+    """
+    inner = "[" + ",".join([fmt] * shape[-1]) + "]"
+    for dim in reversed(shape[:-1]):
+        inner = "[" + ",".join([inner] * dim) + "]"
+    return inner
+
+
+def create_handler(**kw):
+    """
+    Create a FastJSONHandler instance.
+    """
+    return FastJSONHandler(**kw)
@@ -3,7 +3,13 @@ Auxiliary methods that operate on tensorflow graphs.
 This are private and should not be used by users.
 """
 
+import collections
 import re
+import types
+
+import numpy as np
+
+_TENSOR_INDEX_RE = re.compile(r':\d+$')
 
 
 def check_placeholders(graph, tensors):
@@ -46,13 +52,41 @@ def check_input(provided, required, msg):
     if provided is None or required is None:
         raise ValueError("None of the parameters can be None")
 
-    for x in provided:
-        if x not in required:
-            raise ValueError(msg)
+    if set(provided) != set(required):
+        raise ValueError(msg)
 
-    for x in required:
-        if x not in provided:
-            raise ValueError(msg)
+
+def tensor_spec(graph, name):
+    """
+    Return (dtype, shape) of a graph tensor as numpy dtype and list of dimensions.
+
+    Unknown dimensions are None. shape is None if the tensor rank is unknown.
+    """
+    t = graph.get_tensor_by_name(smart_tensor_name(name))
+    shape = t.shape.as_list() if t.shape.ndims is not None else None
+    return np.dtype(t.dtype.as_numpy_dtype), shape
+
+
+def check_feed_shape(name, value, shape):
+    """
+    Check that a feed value fits placeholder `name` of `shape` (as returned
+    by `tensor_spec`), as `Session.run` does.
+    If not, raises ValueError.
+    """
+    if shape is None:
+        return
+    if len(value.shape) != len(shape) or any(
+            d is not None and d != v for d, v in zip(shape, value.shape)):
+        raise ValueError(
+            "Cannot feed value of shape {} for Tensor '{}', which has shape '{}'".format(
+                value.shape, name, _shape_str(shape)))
+
+
+def _shape_str(shape):
+    dims = ["?" if d is None else str(d) for d in shape]
+    if len(dims) == 1:
+        return "({},)".format(dims[0])
+    return "({})".format(", ".join(dims))
 
 
 def smart_tensor_name(t):
@@ -62,7 +96,88 @@ def smart_tensor_name(t):
     operation names. If user provided operations (common error in tensorflow),
     the method will assing :0 to each of them to get the tensor name.
     """
-    m = re.search(r':\d+$', t)
+    m = _TENSOR_INDEX_RE.search(t)
     if m is None:
         return "{}:0".format(t)
     return t
+
+
+class FeedPlan(collections.namedtuple("FeedPlan", ["in_t", "out_t", "inputs", "aliases", "specs"])):
+    """
+    Immutable plan to check and normalize the feed dicts of a model, built once
+    with `feed_plan` so that requests only do dict lookups.
+
+    in_t and out_t are tuples of tensor names in feed and fetch order, inputs
+    the frozenset of in_t, aliases maps every accepted feed key (tensor or op
+    name) to its in_t name and specs each in_t name to its (dtype, shape) as
+    returned by `tensor_spec`.
+    """
+
+    __slots__ = ()
+
+    def prepare(self, feed_dict, msg, add_batch_dim=False, on_convert=None):
+        """
+        Return `feed_dict` keyed by in_t names, with values as C-contiguous
+        arrays of the placeholders dtypes. If `add_batch_dim` is True, a batch
+        dimension of size 1 is added to each value.
+
+        Arrays that already have the dtype and layout are used without
+        copying them. Other arrays are copied once, and `on_convert` (if
+        given) is called with the input name and the kind of conversion:
+        "dtype", or "layout" for non contiguous or unaligned arrays. Values
+        that are not arrays (like lists decoded from JSON) are not reported.
+
+        :raises ValueError: with msg if the keys are not all and only in_t, or
+                            if a value can't be converted to the dtype or
+                            doesn't fit the shape of its placeholder.
+        """
+        feed = {}
+        for key, value in feed_dict.items():
+            name = self.aliases.get(key)
+            if name is None:
+                raise ValueError(msg)
+            dtype, shape = self.specs[name]
+            if not isinstance(value, np.ndarray):
+                value = _convert(name, value, dtype)
+            elif value.dtype != dtype:
+                value = _convert(name, value, dtype)
+                if on_convert is not None:
+                    on_convert(name, "dtype")
+            elif not (value.flags.c_contiguous and value.flags.aligned):
+                value = np.array(value, order='C')
+                if on_convert is not None:
+                    on_convert(name, "layout")
+            if add_batch_dim:
+                value = value[np.newaxis]
+            check_feed_shape(name, value, shape)
+            feed[name] = value
+        if len(feed) != len(self.inputs):
+            raise ValueError(msg)
+        return feed
+
+
+def _convert(name, value, dtype):
+    try:
+        return np.array(value, dtype, order='C')
+    except (TypeError, ValueError, OverflowError) as e:
+        raise ValueError("Cannot convert input {} to {}: {}".format(name, dtype, e))
+
+
+def feed_plan(in_t, out_t, specs):
+    """
+    Return the FeedPlan of a model with inputs `in_t`, outputs `out_t` and
+    input `specs` mapping each in_t name to its (dtype, shape).
+    """
+    in_t = tuple(smart_tensor_name(t) for t in in_t)
+    aliases = {}
+    for name in in_t:
+        aliases[name] = name
+        op_name = name.rsplit(":", 1)[0]
+        if smart_tensor_name(op_name) == name:
+            aliases[op_name] = name
+    return FeedPlan(
+        in_t,
+        tuple(smart_tensor_name(t) for t in out_t),
+        frozenset(in_t),
+        types.MappingProxyType(aliases),
+        types.MappingProxyType({name: specs[name] for name in in_t}))
@@ -29,3 +29,22 @@ class EncodeDecodeHandler():
         Decode model outputs to JSON serializable Python object.
         """
         raise NotImplementedError()
+
+    def set_input_specs(self, specs):
+        """
+        Receive the dtype and shape of each model input.
+
+        `specs` is the value returned by `TFServeApp.input_specs`. Handlers
+        may use it to build inputs of the right type. Default does nothing.
+        """
+
+    def stream_parser(self):
+        """
+        Return a new incremental parser for a request body, or None.
+
+        Parsers receive the request body while it is being read (see
+        `tfserve.streaming`), so handlers can validate and start decoding
+        it before all the bytes arrive. Default is None: bodies are read
+        completely and passed to `encode`.
+        """
+        return None
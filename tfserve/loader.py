@@ -1,15 +1,44 @@
 """
 Module that handles loading a tensorflow model in several different forms.
 """
+import glob
+import hashlib
+import json
 import os
 import tensorflow as tf
 
+from tfserve import mmap_graph
+from tfserve.optimize import node_names
+from tfserve.optimize import optimize_graph_def
 
-def load_model(model_path):
+# Name scope `.pb` graphs are imported to.
+PB_PREFIX = "import/"
+
+# Name of the process wide thread pools shared by sessions (see `session_config`).
+SHARED_POOL_PREFIX = "tfserve-shared-"
+
+
+def load_model(model_path, config=None, optimize_for=None, freeze_for=None, cache_dir=None,
+               mmap_dir=None):
     """
     Loads a tensorflow model return a tf.Session running on the loaded model (the graph).
 
     :param str model_path: It can be a `.pb` file or directory containing checkpoint files.
+    :param tf.ConfigProto config: Optional session configuration (see `session_config`).
+    :param tuple optimize_for: Optional (in_t, out_t) lists of tensor names in the loaded graph.
+                               If given, the graph is pruned to the subgraph computing out_t
+                               from in_t and optimized (see `tfserve.optimize`). Checkpoint
+                               variables are converted to constants.
+    :param list[str] freeze_for: Optional list of output tensor names. If given, checkpoint variables
+                                 are converted to constants and the graph pruned to these outputs
+                                 (implied by optimize_for).
+    :param str cache_dir: Optional directory where frozen checkpoint graphs are cached, keyed by the
+                          content of the checkpoint files, freeze_for and optimize_for. Later loads
+                          of the same checkpoint read the cached graph instead of restoring it.
+    :param str mmap_dir: Optional directory where graphs are converted to a memory-mapped layout (see
+                         `tfserve.mmap_graph`), keyed by the model files path, size and modification
+                         time, freeze_for and optimize_for. Large constants are then mapped from
+                         files instead of being copied to each session. Checkpoints must be frozen.
 
     :return: tf.Session running the model graph.
     """
@@ -20,39 +49,174 @@ def load_model(model_path):
         raise ValueError("model_path must exist")
 
     if os.path.isfile(model_path) and model_path.endswith(".pb"):
-        return _load_pb(model_path)
+        return _load_pb(model_path, config, optimize_for, mmap_dir)
 
     if os.path.isdir(model_path):
         for f in os.listdir(model_path):
             if f.endswith(".pb"):
-                return _load_pb(os.path.join(model_path, f))
+                return _load_pb(os.path.join(model_path, f), config, optimize_for, mmap_dir)
+
+        return _load_ckpt(model_path, config, optimize_for, freeze_for, cache_dir, mmap_dir)
+
 
-        return _load_ckpt(model_path)
+def session_config(intra_op_threads=None, inter_op_threads=None, shared_threads=None):
+    """
+    Builds a tf.ConfigProto with the given thread counts.
+
+    The returned config asks for per-session thread pools so that several
+    sessions in the same process don't share (and contend for) the global ones.
+
+    :param int intra_op_threads: threads used to parallelize a single op (None for TF default).
+    :param int inter_op_threads: threads used to run independent ops (None for TF default).
+    :param int shared_threads: if set, ops run in a process wide pool of shared_threads threads
+                               shared by all sessions created with the same value, instead of
+                               per-session pools (inter_op_threads is not used).
+
+    :return: tf.ConfigProto or None if no thread count is given.
+    """
+    if shared_threads:
+        return tf.ConfigProto(
+            intra_op_parallelism_threads=intra_op_threads or 0,
+            session_inter_op_thread_pool=[tf.ThreadPoolOptionProto(
+                num_threads=shared_threads,
+                global_name="{}{}".format(SHARED_POOL_PREFIX, shared_threads))])
+    if intra_op_threads is None and inter_op_threads is None:
+        return None
+    return tf.ConfigProto(
+        intra_op_parallelism_threads=intra_op_threads or 0,
+        inter_op_parallelism_threads=inter_op_threads or 0,
+        use_per_session_threads=True)
 
 
-def _load_pb(model_path):
+def _load_pb(model_path, config=None, optimize_for=None, mmap_dir=None):
     """
     Loads from a '.pb' model file.
     """
-    graph = tf.Graph()
-    sess = tf.Session(graph=graph)
-    with tf.gfile.FastGFile(model_path, 'rb') as f:
+    mmap_path = None
+    if mmap_dir:
+        mmap_path = _mmap_path(mmap_dir, [model_path], optimize_for)
+        if os.path.isdir(mmap_path):
+            return _import_graph_def(mmap_graph.load(mmap_path), config)
+
+    graph_def = _read_graph_def(model_path)
+    if optimize_for is not None:
+        graph_def = _optimize(graph_def, optimize_for, PB_PREFIX)
+    if mmap_path is not None:
+        graph_def = mmap_graph.convert(graph_def, mmap_path)
+    return _import_graph_def(graph_def, config)
+
+
+def _load_ckpt(model_dir, config=None, optimize_for=None, freeze_for=None, cache_dir=None,
+               mmap_dir=None):
+    """
+    Loads from a checkpoint directory.
+    """
+    ckpt_path = tf.train.latest_checkpoint(model_dir)
+    if optimize_for is not None:
+        freeze_for = optimize_for[1]
+    mmap_path = None
+    if mmap_dir:
+        if freeze_for is None:
+            raise ValueError("checkpoint models must be frozen to be memory-mapped")
+        mmap_path = _mmap_path(
+            mmap_dir, glob.glob("{}.*".format(ckpt_path)), [freeze_for, optimize_for])
+        if os.path.isdir(mmap_path):
+            return _import_graph_def(mmap_graph.load(mmap_path), config, name="")
+    cache_path = None
+    if freeze_for is not None and cache_dir:
+        cache_path = _frozen_cache_path(cache_dir, ckpt_path, freeze_for, optimize_for)
+
+    if cache_path is not None and os.path.exists(cache_path):
+        graph_def = _read_graph_def(cache_path)
+    else:
+        graph = tf.Graph()
+        sess = tf.Session(graph=graph, config=config)
+        with graph.as_default():
+            saver = tf.train.import_meta_graph('{}.meta'.format(ckpt_path))
+            saver.restore(sess, ckpt_path)
+        if freeze_for is None:
+            return sess
+
+        graph_def = tf.graph_util.convert_variables_to_constants(
+            sess, graph.as_graph_def(), node_names(freeze_for))
+        sess.close()
+        if optimize_for is not None:
+            graph_def = _optimize(graph_def, optimize_for)
+        if cache_path is not None:
+            _write_graph_def(cache_path, graph_def)
+    if mmap_path is not None:
+        graph_def = mmap_graph.convert(graph_def, mmap_path)
+    return _import_graph_def(graph_def, config, name="")
+
+
+def _read_graph_def(path):
+    with tf.gfile.FastGFile(path, 'rb') as f:
         graph_def = tf.GraphDef()
         graph_def.ParseFromString(f.read())
-        with sess.graph.as_default():
-            tf.import_graph_def(graph_def)
+    return graph_def
 
-    return sess
+
+def _write_graph_def(path, graph_def):
+    """
+    Write a graph atomically, so concurrent loads never read a partial file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(graph_def.SerializeToString())
+    os.replace(tmp_path, path)
 
 
-def _load_ckpt(model_dir):
+def _import_graph_def(graph_def, config=None, name=None):
     """
-    Loads from a checkpoint directory.
+    Return a session running `graph_def` imported to the `name` scope
+    ("import" by default).
     """
     graph = tf.Graph()
-    sess = tf.Session(graph=graph)
+    sess = tf.Session(graph=graph, config=config)
     with graph.as_default():
-        ckpt_path = tf.train.latest_checkpoint(model_dir)
-        saver = tf.train.import_meta_graph('{}.meta'.format(ckpt_path))
-        saver.restore(sess, ckpt_path)
-        return sess
+        tf.import_graph_def(graph_def, name=name)
+    return sess
+
+
+def _frozen_cache_path(cache_dir, ckpt_path, freeze_for, optimize_for):
+    """
+    Return the path of a frozen checkpoint graph in `cache_dir`, named after
+    a hash of the checkpoint files, the tensorflow version and the tensors
+    the graph is frozen and optimized for.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    params = [tf.__version__, list(freeze_for), optimize_for and [list(t) for t in optimize_for]]
+    _update_hash(h, json.dumps(params).encode("utf-8"))
+    for path in sorted(glob.glob("{}.*".format(ckpt_path))):
+        _update_hash(h, path[len(ckpt_path):].encode("utf-8"))
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return os.path.join(cache_dir, "frozen-{}.pb".format(h.hexdigest()))
+
+
+def _mmap_path(mmap_dir, paths, params):
+    """
+    Return the directory of a memory-mapped graph in `mmap_dir`, named after
+    a hash of the path, size and modification time of the model files (hashing
+    their content would read every page), the tensorflow version and `params`.
+    """
+    files = []
+    for path in sorted(paths):
+        st = os.stat(path)
+        files.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+    h = hashlib.blake2b(digest_size=16)
+    _update_hash(h, json.dumps(
+        [tf.__version__, mmap_graph.DEFAULT_MIN_BYTES, params, files]).encode("utf-8"))
+    return os.path.join(mmap_dir, "mmap-{}".format(h.hexdigest()))
+
+
+def _update_hash(h, data):
+    h.update(len(data).to_bytes(8, "little"))
+    h.update(data)
+
+
+def _optimize(graph_def, optimize_for, prefix=""):
+    in_t, out_t = optimize_for
+    return optimize_graph_def(graph_def, node_names(in_t, prefix), node_names(out_t, prefix))
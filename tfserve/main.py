@@ -10,11 +10,25 @@ import sys
 from werkzeug.exceptions import BadRequest
 
 from tfserve.tfserve import TFServeApp
+from tfserve.loader import session_config
+from tfserve.session_pool import DISPATCH_POLICIES
+from tfserve.result_cache import POLICIES as CACHE_POLICIES
+from tfserve.tracing import DEFAULT_MAX_TRACES
+from tfserve.tracing import TRACE_HEADER
+from tfserve.admission import TIMEOUT_HEADER
+from tfserve import asgi
 from tfserve import helper
+from tfserve import optimize
+from tfserve import prefork
+from tfserve import registry
+from tfserve import versions
 
 DEFAULT_HANDLER = 'json'
 DEFAULT_HOST = '0.0.0.0'
 DEFAULT_PORT = 5000
+DEFAULT_MAX_QUEUE_DELAY = 1000
+DEFAULT_CANARY_WEIGHT = 0.05
+SERVERS = ('werkzeug', 'asgi')
 
 DESCRIPTION = """
 
@@ -35,7 +49,9 @@ ABOUT HANDLERS
 
   The following handlers are currently supported by TFServe:
 
-    json  Requests handled as JSON model inputs.
+    json      Requests handled as JSON model inputs.
+    fastjson  Same as json, optimized for large numeric inputs and outputs.
+    binary    Requests handled as raw binary tensors.
 
   You may alternative specify a Python module name for
   --handler. See CUSTOM HANDLERS below for details.
@@ -48,6 +64,20 @@ ABOUT HANDLERS
   output tensors to output values generated by the model for the given the inputs.
   If batch mode is enabled, output values are returned in an array.
 
+  * FAST JSON HANDLER: Same requests and responses as the JSON handler.
+  Numeric arrays are parsed straight into arrays of the input
+  placeholder dtype and float outputs are formatted in a single pass
+  with --json-precision significant digits (default is the number of
+  digits needed to preserve the output values).
+
+  * BINARY HANDLER: Inputs are submitted to the root path '/' using
+  HTTP POST as a binary tensor frame: a short JSON header with the
+  name, dtype and shape of each tensor followed by the raw
+  little-endian tensor buffers (see `tfserve.binary_handler`). Inputs
+  are used without copying them and the header is checked while the
+  tensor data is still being received. Outputs are returned in the same
+  format. Use `tfserve.binary_handler.post_tensors` as a client.
+
   * CUSTOM HANDLERS: A Python module name may be specified with --handler. The module
   must contain a `create_handler(**kw)` function that returns an
   object that implements `tfserve.EncodeDecodeHandler`. Keywords
@@ -58,6 +88,234 @@ ABOUT HANDLERS
         batch    Boolean indicating whether handler should process
                  inputs as batches rather than as single inputs.
 
+  The handler may implement `set_input_specs(specs)` to receive the
+  dtype and shape of each input placeholder.
+
+
+NUMPY REQUESTS AND RESPONSES
+
+  With --npz, requests with 'Content-Type: application/x-npz' contain
+  an uncompressed .npz archive (np.savez) with one array per input
+  tensor and skip the handler encode. Arrays are used without copying
+  them. Responses are negotiated with the Accept header:
+  'application/x-npz' returns all outputs as a .npz archive and
+  'application/x-npy' the single output as a .npy file; otherwise the
+  handler decode is used. Other requests are handled as usual.
+
+
+DYNAMIC BATCHING
+
+  When batch mode is disabled, --max-batch-size queues concurrent
+  requests and runs them together in a single batch. A batch is run
+  when it is full or when its oldest request has waited
+  --max-queue-delay microseconds. Outputs are split back to each
+  request before they are decoded.
+
+  Requests are grouped in buckets by the shape of their inputs and
+  only requests in the same bucket are batched together. To batch
+  variable length inputs, use --bucket-boundaries to pad dimension
+  --bucket-axis of every input up to the next boundary. Only inputs
+  whose placeholder leaves that dimension unknown are padded, and
+  outputs are not trimmed: the model must ignore the padding. Bucket
+  occupancy and padding waste are reported at '/stats'.
+
+
+SESSION POOL
+
+  By default a single tensorflow session serves all requests. Use
+  --sessions to load N copies of the model graph, each one in its
+  own session with --intra-op-threads and --inter-op-threads
+  threads, and spread requests among them with --dispatch. Several
+  sessions with few threads each often make better use of many
+  cores than a single session with many threads.
+
+
+RESULT CACHE
+
+  With --cache-bytes, model outputs are cached by the content of the
+  inputs (their dtype, shape and bytes), so repeated inputs are
+  answered without running the model. Entries expire after
+  --cache-ttl seconds and, when the cache is full, the least recently
+  ('lru') or least frequently ('lfu') used entries are evicted
+  (--cache-policy). Hits and misses are reported at '/stats'.
+  Only use the cache with deterministic models.
+
+  With --response-cache-bytes, responses are also cached by the raw
+  request (path, content type and body), so byte-identical requests
+  skip the handler too. Responses include an ETag, and requests with
+  a matching If-None-Match header get '304 Not Modified'. Responses
+  larger than --response-cache-entry-bytes are not cached, so a few
+  large responses can't evict all the others.
+
+
+METRICS
+
+  Prometheus metrics are served at '/metrics': inference requests by
+  status code, requests in flight, request latency and the latency of
+  each request stage (body_read, encode, feed_prep, session_run,
+  decode and serialize). Histograms use fixed buckets and are cheap
+  to update. Use --no-metrics to disable them. With --workers, each
+  worker reports its own metrics.
+
+  Inputs that the handler doesn't return as contiguous arrays of the
+  placeholder dtype are converted and counted by input (also at
+  '/stats'), to find clients sending the wrong dtype.
+
+
+TRACING
+
+  With --trace-dir, a fraction --trace-rate of the requests run the
+  model with full tensorflow tracing (RunOptions FULL_TRACE). Each
+  trace is written to --trace-dir as a Chrome trace file, which can
+  be opened in chrome://tracing to find slow ops. Only the
+  --max-traces most recent traces are kept. Traced requests skip the
+  caches and dynamic batching.
+
+  With --trace-header, any request with a 'X-TFServe-Trace: 1' header
+  is traced too. Any client can then slow the server down with traced
+  runs, so use it for debugging on a trusted network only.
+
+
+GRAPH OPTIMIZATION
+
+  With --optimize, the model graph is pruned to the nodes needed to
+  compute --outputs from --inputs and simplified before it is served:
+  Identity, CheckNumerics and StopGradient nodes are removed, constant
+  subgraphs are folded and batch normalizations are folded into the
+  weights of the preceding convolution or matmul. Checkpoint
+  variables are converted to constants. Use --optimize-report to
+  compare the node count and first run latency of the original and
+  optimized graphs.
+
+  Restoring a large checkpoint on every start is slow. With
+  --freeze-cache DIR, checkpoint variables are converted to constants
+  for --outputs (and the graph optimized with --optimize) once, and
+  the frozen graph is written to DIR named after a hash of the
+  checkpoint files. Later starts, and each of --workers, load the
+  cached graph instead. A new checkpoint gets a new cache entry;
+  remove old entries from DIR when they are no longer needed.
+
+
+MEMORY-MAPPED MODELS
+
+  Loading a frozen model reads and parses the whole .pb and copies
+  its weights into every session, in every worker. With --mmap DIR,
+  the model is converted once to a layout in DIR where each large
+  constant is stored in its own file, read with an ImmutableConst op
+  that maps the file in memory. Sessions and --workers serving the
+  model then share the weights through the OS page cache, and only
+  the pages that are read are loaded. The converted model is reused
+  until the model file changes. Checkpoints are frozen for --outputs
+  first (see --freeze-cache).
+
+
+WARMUP
+
+  Tensorflow allocates memory and optimizes the graph during the
+  first runs of a model, so the first requests are much slower. With
+  --warmup, inputs with random values generated from the input
+  placeholders dtypes and shapes are run through every session for
+  each of --warmup-batch-sizes before the server starts listening.
+  Unknown dimensions other than the batch dimension have size 1; for
+  variable length inputs, use --warmup FILE to run recorded JSON
+  request bodies (one per line) instead. '/ping' returns 503 until
+  warmup is done.
+
+
+MODEL RELOAD
+
+  A POST to '/reload', or with --reload-interval a change of the model
+  files, loads the model again in the background while the current one
+  keeps serving requests. The new model is checked (its inputs must
+  keep their dtypes and shapes) and warmed up (with random inputs
+  unless --warmup is set, if they can be generated), then it replaces
+  the served model: new requests run on it, the caches are cleared and
+  the old sessions are closed once their requests finish. If the new
+  model is not valid, the served model is kept. Files are reloaded
+  once they are unchanged for a whole interval, so copy a new model in
+  place or rename it over the old one.
+
+  With --workers, POST requests to reload are rejected with 400, as
+  only the worker receiving them would reload: use --reload-interval,
+  with which every worker watches the model files.
+
+
+CANARY AND SHADOW VERSIONS
+
+  A new version of the model can be served beside the current one
+  (the 'stable' version) before it replaces it. With --canary PATH,
+  a fraction --canary-weight of the requests is served by the model
+  in PATH (the 'canary' version). With --shadow PATH, a fraction
+  --shadow-rate of the requests is also run on the model in PATH
+  (the 'shadow' version) in the background, without delaying or
+  changing the responses; its latency and the largest difference
+  between its outputs and the served ones are reported at '/stats'.
+
+  Requests with a 'X-TFServe-Version: NAME' header are served by
+  version NAME, and responses name the version that served them in
+  the same header. '/versions' lists the versions and a POST to
+  '/versions/<name>/reload' reloads a version. Versions use the same
+  model options and '/metrics' has a 'version' label.
+
+
+MULTIPLE MODELS
+
+  With --config FILE, the models described in a YAML (requires
+  PyYAML) or JSON file are served from one process, each one with
+  its own inputs, outputs and handler at '/models/<name>':
+
+    shared_threads: 8
+    models:
+      - name: mnist
+        model: ./mnist.pb
+        inputs: [import/x:0]
+        outputs: [import/softmax:0]
+        handler: json
+        max_batch_size: 32
+
+  Other model keys are TFServeApp keyword arguments (for example
+  sessions, cache_bytes or warmup); command line model options are
+  not used. Models share the server threads and, with
+  shared_threads, a pool of tensorflow threads. '/models' lists the
+  models, '/stats' reports each model, '/metrics' has a 'model' label
+  and a POST to '/models/<name>/reload' reloads a model.
+
+
+ADMISSION CONTROL
+
+  The werkzeug server starts a thread for every connection, so by
+  default every request runs at once and, under a traffic spike, all
+  of them get slow. With --max-concurrency N, at most N inference
+  requests run at once and up to --max-queued more wait for them;
+  other requests are rejected right away with '429 Too Many Requests'.
+  Requests take a slot once their body is read, and response cache
+  hits don't take one, so slow uploads don't block other requests (use
+  --max-request-bytes to bound the bodies read at once). Requests with
+  a 'X-Request-Timeout: SECONDS' header, or with --request-timeout,
+  have a deadline: when it can't be met given the observed model run
+  latency, when taking a slot, while queued or right before the model
+  runs, they get '503 Service Unavailable' instead of running for a
+  client that gave up. Admitted and rejected requests are reported at
+  '/stats'. With --workers, each worker has its own limits.
+
+
+MULTIPLE PROCESSES
+
+  Use --workers to serve from N processes. The model is validated
+  once, then each worker loads its own copy and accepts connections
+  on the same port, either from a shared listening socket or, with
+  --reuse-port, from its own SO_REUSEPORT socket. Crashed workers are
+  restarted. A POST to '/shutdown' stops all workers. Reload requests
+  are not supported (see MODEL RELOAD).
+
+
+ASGI SERVER
+
+  With --server asgi, requests are served from an asyncio event loop
+  by uvicorn (pip install uvicorn). Request bodies are read without
+  blocking and the model runs in a pool of --asgi-threads threads, so
+  thousands of idle keep-alive connections don't need a thread each.
+
 
 MODEL HELP
 
@@ -80,7 +338,12 @@ def main():
     maybe_help_args = _init_args(require_tensors=False)
     if maybe_help_args.help_model:
         _show_model_help_and_exit(maybe_help_args)
+    if maybe_help_args.config:
+        _serve_models(maybe_help_args)
+        return
     serve_args = _init_args(require_tensors=True)
+    if serve_args.optimize_report:
+        _show_optimize_report_and_exit(serve_args)
     _serve_model(serve_args)
 
 def _init_args(require_tensors):
@@ -90,7 +353,7 @@ def _init_args(require_tensors):
         formatter_class=argparse.RawTextHelpFormatter,
         add_help=False)
     p.add_argument(
-        '-m', '--model', metavar='PATH', required=True,
+        '-m', '--model', metavar='PATH', required=require_tensors,
         help="path to pb file or directory containing checkpoint")
     p.add_argument(
         '-i', '--inputs', required=require_tensors,
@@ -98,20 +361,201 @@ def _init_args(require_tensors):
     p.add_argument(
         '-o', '--outputs', required=require_tensors,
         help="a comma separated list of output tensors")
+    p.add_argument(
+        '--config', metavar='FILE',
+        help=(
+            "serve the models in a YAML or JSON config FILE\n"
+            "instead of -m, -i and -o"))
     p.add_argument(
         '-h', '--handler', default=DEFAULT_HANDLER,
         help="encode/decode handler (deault is '%s')" % DEFAULT_HANDLER)
+    p.add_argument(
+        '--json-precision', metavar='DIGITS', type=int,
+        help="significant digits of float outputs (fastjson handler)")
+    p.add_argument(
+        '--npz', action='store_true',
+        help=(
+            "also accept .npz request bodies and return .npz or\n"
+            ".npy responses based on the Accept header"))
+    p.add_argument(
+        '--max-request-bytes', metavar='N', type=int,
+        help=(
+            "reject requests with bodies larger than N bytes\n"
+            "with 413 (default is no limit)"))
     p.add_argument(
         '-b', '--batch', action='store_true',
         help=(
             "process multiple inputs (default is to process\n"
             "one input per request)"))
+    p.add_argument(
+        '--max-batch-size', metavar='N', type=int,
+        help=(
+            "run concurrent single input requests together in\n"
+            "batches of up to N inputs (default is to run each\n"
+            "request on its own)"))
+    p.add_argument(
+        '--max-queue-delay', metavar='MICROS', type=int,
+        default=DEFAULT_MAX_QUEUE_DELAY,
+        help=(
+            "maximum time in microseconds a request waits for\n"
+            "a batch to fill (%i)" % DEFAULT_MAX_QUEUE_DELAY))
+    p.add_argument(
+        '--bucket-boundaries', metavar='LENGTHS',
+        help=(
+            "a comma separated list of lengths that batched\n"
+            "inputs are padded to along --bucket-axis"))
+    p.add_argument(
+        '--bucket-axis', metavar='AXIS', type=int, default=0,
+        help="input dimension padded to --bucket-boundaries (0)")
+    p.add_argument(
+        '--sessions', metavar='N', type=int, default=1,
+        help=(
+            "number of sessions, each one with its own copy\n"
+            "of the model graph, serving requests in parallel (1)"))
+    p.add_argument(
+        '--intra-op-threads', metavar='N', type=int,
+        help="threads per session used to run a single op")
+    p.add_argument(
+        '--inter-op-threads', metavar='N', type=int,
+        help="threads per session used to run independent ops")
+    p.add_argument(
+        '--dispatch', choices=DISPATCH_POLICIES, default=DISPATCH_POLICIES[0],
+        help="how requests are spread among sessions (%s)" % DISPATCH_POLICIES[0])
+    p.add_argument(
+        '--cache-bytes', metavar='N', type=int,
+        help=(
+            "cache outputs of up to N bytes in total, keyed by\n"
+            "the content of the inputs (default is no cache)"))
+    p.add_argument(
+        '--cache-ttl', metavar='SECONDS', type=float,
+        help="seconds a cached output is valid for (no limit)")
+    p.add_argument(
+        '--cache-policy', choices=CACHE_POLICIES, default=CACHE_POLICIES[0],
+        help="cached outputs evicted first (%s)" % CACHE_POLICIES[0])
+    p.add_argument(
+        '--response-cache-bytes', metavar='N', type=int,
+        help=(
+            "cache responses of up to N bytes in total, keyed\n"
+            "by the request body (default is no cache)"))
+    p.add_argument(
+        '--response-cache-entry-bytes', metavar='N', type=int,
+        help=(
+            "do not cache responses larger than N bytes\n"
+            "(1/16 of --response-cache-bytes)"))
+    p.add_argument(
+        '--no-metrics', action='store_true',
+        help="disable Prometheus metrics at '/metrics'")
+    p.add_argument(
+        '--trace-dir', metavar='DIR',
+        help=(
+            "write tensorflow traces of sampled requests to DIR"))
+    p.add_argument(
+        '--trace-rate', metavar='RATE', type=float, default=0.0,
+        help="fraction of requests traced with --trace-dir (0)")
+    p.add_argument(
+        '--max-traces', metavar='N', type=int, default=DEFAULT_MAX_TRACES,
+        help="number of traces kept in --trace-dir (%i)" % DEFAULT_MAX_TRACES)
+    p.add_argument(
+        '--trace-header', action='store_true',
+        help=(
+            "also trace requests with a %s header\n"
+            "(debugging only, any client can use it)" % TRACE_HEADER))
+    p.add_argument(
+        '--optimize', action='store_true',
+        help=(
+            "prune the graph to the outputs and optimize it\n"
+            "before serving"))
+    p.add_argument(
+        '--optimize-report', action='store_true',
+        help=(
+            "show the graph node count and first run latency\n"
+            "with and without --optimize and exit"))
+    p.add_argument(
+        '--freeze-cache', metavar='DIR',
+        help=(
+            "freeze checkpoint models for --outputs and cache\n"
+            "the frozen graph in DIR"))
+    p.add_argument(
+        '--mmap', metavar='DIR',
+        help=(
+            "convert the model to a memory-mapped layout in\n"
+            "DIR and map its large constants from files"))
+    p.add_argument(
+        '--reload-interval', metavar='SECONDS', type=float,
+        help=(
+            "check the model files every SECONDS and reload\n"
+            "the model when they change"))
+    p.add_argument(
+        '--canary', metavar='PATH',
+        help=(
+            "also serve a fraction --canary-weight of the\n"
+            "requests with the model in PATH"))
+    p.add_argument(
+        '--canary-weight', metavar='WEIGHT', type=float,
+        default=DEFAULT_CANARY_WEIGHT,
+        help="fraction of requests served by --canary (%g)" % DEFAULT_CANARY_WEIGHT)
+    p.add_argument(
+        '--shadow', metavar='PATH',
+        help=(
+            "also run a fraction --shadow-rate of the requests\n"
+            "on the model in PATH in the background and\n"
+            "compare its outputs"))
+    p.add_argument(
+        '--shadow-rate', metavar='RATE', type=float,
+        default=versions.DEFAULT_SHADOW_RATE,
+        help="fraction of requests run on --shadow (%g)" % versions.DEFAULT_SHADOW_RATE)
+    p.add_argument(
+        '--warmup', metavar='FILE', nargs='?', const=True,
+        help=(
+            "run random inputs, or the JSON request bodies in\n"
+            "FILE (one per line), through the model before\n"
+            "serving"))
+    p.add_argument(
+        '--warmup-batch-sizes', metavar='SIZES',
+        help=(
+            "a comma separated list of batch sizes warmed up\n"
+            "(1 and powers of two up to --max-batch-size)"))
+    p.add_argument(
+        '--max-concurrency', metavar='N', type=int,
+        help=(
+            "run at most N inference requests at once (default\n"
+            "is no limit)"))
+    p.add_argument(
+        '--max-queued', metavar='N', type=int,
+        help=(
+            "requests waiting to run with --max-concurrency;\n"
+            "more get 429 (--max-concurrency)"))
+    p.add_argument(
+        '--request-timeout', metavar='SECONDS', type=float,
+        help=(
+            "deadline of requests without a %s\n"
+            "header, with --max-concurrency" % TIMEOUT_HEADER))
     p.add_argument(
         '-H', '--host', default=DEFAULT_HOST,
         help="host interface to bind to (%s)" % DEFAULT_HOST)
     p.add_argument(
         '-p', '--port', default=DEFAULT_PORT,
         help="port to listen on (%i)" % DEFAULT_PORT)
+    p.add_argument(
+        '--server', choices=SERVERS, default=SERVERS[0],
+        help=(
+            "HTTP server backend (%s); 'asgi' requires uvicorn"
+            % SERVERS[0]))
+    p.add_argument(
+        '--asgi-threads', metavar='N', type=int,
+        help=(
+            "threads running the model when using the 'asgi'\n"
+            "server (%i)" % asgi.DEFAULT_MAX_WORKERS))
+    p.add_argument(
+        '-w', '--workers', metavar='N', type=int, default=1,
+        help=(
+            "number of server processes (default is to serve\n"
+            "from a single process)"))
+    p.add_argument(
+        '--reuse-port', action='store_true',
+        help=(
+            "bind one SO_REUSEPORT socket per worker (default\n"
+            "is to share one socket among all workers)"))
     p.add_argument(
         '--help-model', action='store_true',
         help=(
@@ -123,29 +567,183 @@ def _init_args(require_tensors):
     return p.parse_args()
 
 def _show_model_help_and_exit(args):
+    if not args.model:
+        raise SystemExit("tfserve: --help-model requires -m PATH")
     helper.estimate_io_tensors(args.model)
     sys.exit(0)
 
+def _show_optimize_report_and_exit(args):
+    inputs = _split_tensors(args.inputs)
+    outputs = _split_tensors(args.outputs)
+    config = session_config(args.intra_op_threads, args.inter_op_threads)
+    result = optimize.report(args.model, inputs, outputs, config)
+    sys.stdout.write("%-16s %6s  %14s\n" % ('', 'nodes', 'first run (ms)'))
+    for key in ('before', 'after'):
+        sys.stdout.write("%-16s %6i  %14.3f\n" % (
+            key, result['nodes'][key], result['first_run_seconds'][key] * 1e3))
+    sys.exit(0)
+
 def _serve_model(args):
     inputs = _split_tensors(args.inputs)
     outputs = _split_tensors(args.outputs)
     handler = _init_handler(inputs, outputs, args)
+    sys.stdout.write("Using %s\n" % handler.get_description())
+    _serve(lambda: _init_app(inputs, outputs, handler, args), args)
+
+def _serve_models(args):
+    try:
+        config = registry.read_config(args.config)
+    except ImportError:
+        raise SystemExit(
+            "tfserve: PyYAML is required by YAML config files\n"
+            "Try installing it by running 'pip install pyyaml'.")
+    except (IOError, ValueError) as e:
+        raise SystemExit("tfserve: %s" % e)
+    for model in config['models']:
+        sys.stdout.write("Serving %s at /models/%s\n" % (model['model'], model['name']))
+    _serve(lambda: _init_registry(config, args), args)
+
+def _serve(app_factory, args):
+    if args.workers < 1:
+        raise SystemExit("tfserve: --workers must be a positive integer")
+    if args.reuse_port and args.workers == 1:
+        raise SystemExit("tfserve: --reuse-port requires --workers greater than 1")
+    if args.server == 'asgi':
+        if args.workers > 1:
+            raise SystemExit("tfserve: --workers is not supported with the 'asgi' server")
+        app = app_factory()
+        sys.stdout.write("Running at %s\n" % _serve_url(args))
+        try:
+            app.run_asgi(args.host, args.port, _middleware, args.asgi_threads)
+        except ImportError:
+            raise SystemExit(
+                "tfserve: uvicorn is required by the 'asgi' server\n"
+                "Try installing it by running 'pip install uvicorn'.")
+    elif args.workers > 1:
+        sys.stdout.write(
+            "Running at %s with %i workers\n" % (_serve_url(args), args.workers))
+        try:
+            prefork.serve(
+                app_factory,
+                args.host, args.port, args.workers, _middleware,
+                reuse_port=args.reuse_port)
+        except ValueError as e:
+            raise SystemExit("tfserve: %s" % e)
+    else:
+        app = app_factory()
+        sys.stdout.write("Running at %s\n" % _serve_url(args))
+        app.run(args.host, args.port, _middleware)
+    sys.stdout.write('\n')
+
+def _init_app(inputs, outputs, handler, args):
+    app = _init_version(args.model, inputs, outputs, handler, args)
+    if not args.canary and not args.shadow:
+        return app
+    if not 0 <= args.canary_weight <= 1:
+        raise SystemExit("tfserve: --canary-weight must be between 0 and 1")
+    apps = {'stable': app}
+    weights = {'stable': 1}
+    if args.canary:
+        apps['canary'] = _init_version(args.canary, inputs, outputs, handler, args)
+        weights = {'stable': 1 - args.canary_weight, 'canary': args.canary_weight}
+    if args.shadow:
+        apps['shadow'] = _init_version(args.shadow, inputs, outputs, handler, args)
+    try:
+        return versions.VersionManager(
+            apps, weights,
+            shadow='shadow' if args.shadow else None,
+            shadow_rate=args.shadow_rate)
+    except ValueError as e:
+        raise SystemExit("tfserve: %s" % e)
+
+def _init_version(model_path, inputs, outputs, handler, args):
     app = TFServeApp(
-        args.model,
+        model_path,
         inputs,
         outputs,
         handler.encode,
         handler.decode,
-        args.batch)
-    sys.stdout.write("Using %s\n" % handler.get_description())
-    sys.stdout.write("Running at %s\n" % _serve_url(args))
-    app.run(args.host, args.port, _middleware)
-    sys.stdout.write('\n')
+        args.batch,
+        max_batch_size=args.max_batch_size,
+        max_queue_delay_us=args.max_queue_delay,
+        bucket_boundaries=_split_ints(args.bucket_boundaries),
+        bucket_axis=args.bucket_axis,
+        sessions=args.sessions,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        dispatch=args.dispatch,
+        npz=args.npz,
+        max_request_bytes=args.max_request_bytes,
+        stream_parser=getattr(handler, 'stream_parser', None),
+        cache_bytes=args.cache_bytes,
+        cache_ttl=args.cache_ttl,
+        cache_policy=args.cache_policy,
+        response_cache_bytes=args.response_cache_bytes,
+        response_cache_entry_bytes=args.response_cache_entry_bytes,
+        metrics=not args.no_metrics,
+        trace_dir=args.trace_dir,
+        trace_rate=args.trace_rate,
+        max_traces=args.max_traces,
+        trace_header=args.trace_header,
+        warmup=args.warmup,
+        warmup_batch_sizes=_split_ints(args.warmup_batch_sizes),
+        optimize=args.optimize,
+        freeze_cache_dir=args.freeze_cache,
+        mmap_dir=args.mmap,
+        reload_interval=args.reload_interval,
+        max_concurrency=args.max_concurrency,
+        max_queued=args.max_queued,
+        request_timeout=args.request_timeout)
+    set_input_specs = getattr(handler, 'set_input_specs', None)
+    if set_input_specs:
+        set_input_specs(app.input_specs())
+    if args.warmup:
+        app.warmup()
+    return app
+
+def _init_registry(config, args):
+    apps = {}
+    for model in config['models']:
+        handler_args = argparse.Namespace(
+            handler=model.get('handler', DEFAULT_HANDLER),
+            batch=model.get('batch', False),
+            json_precision=model.get('json_precision'))
+        handler = _init_handler(model['inputs'], model['outputs'], handler_args)
+        options = registry.model_options(model)
+        options.setdefault('shared_threads', config.get('shared_threads'))
+        options.setdefault('stream_parser', getattr(handler, 'stream_parser', None))
+        try:
+            app = TFServeApp(
+                model['model'],
+                model['inputs'],
+                model['outputs'],
+                handler.encode,
+                handler.decode,
+                handler_args.batch,
+                name=model['name'],
+                **options)
+        except TypeError as e:
+            raise SystemExit("tfserve: model %s: %s" % (model['name'], e))
+        set_input_specs = getattr(handler, 'set_input_specs', None)
+        if set_input_specs:
+            set_input_specs(app.input_specs())
+        if not app.ready:
+            app.warmup()
+        apps[model['name']] = app
+    return registry.ModelRegistry(apps)
 
 def _split_tensors(tensors):
     return [s.strip() for s in tensors.split(',')]
 
+def _split_ints(values):
+    if not values:
+        return None
+    return [int(s) for s in values.split(',')]
+
 def _init_handler(inputs, outputs, args):
+    if args.json_precision is not None and args.handler != 'fastjson':
+        raise SystemExit(
+            "tfserve: --json-precision is only supported by the 'fastjson' handler")
     possible_handler_modules = [
         'tfserve.%s_handler' % args.handler,
         args.handler,
@@ -156,10 +754,10 @@ def _init_handler(inputs, outputs, args):
         except ImportError:
             pass
         else:
-            return handler_mod.create_handler(
-                inputs=inputs,
-                outputs=outputs,
-                batch=args.batch)
+            kw = dict(inputs=inputs, outputs=outputs, batch=args.batch)
+            if args.json_precision is not None:
+                kw['precision'] = args.json_precision
+            return handler_mod.create_handler(**kw)
     raise SystemExit(
         "tfserve: unsupported handler '%s'\n"
         "Try 'tfserve --help' for a list of supported handlers."
@@ -0,0 +1,171 @@
+"""
+Prometheus metrics.
+
+Request counters, an in-flight gauge and latency histograms for each stage
+of an inference request, rendered in the Prometheus text exposition format.
+Histograms have fixed buckets, so an observation is a bisect and two
+additions under a lock.
+"""
+
+import bisect
+import threading
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Stages of an inference request, in order.
+STAGES = ("body_read", "encode", "feed_prep", "session_run", "decode", "serialize")
+
+
+class Histogram():
+    """
+    Histogram with fixed bucket upper bounds.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        Return the cumulative count of each bucket (the last one is +Inf) and
+        the sum of observed values.
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        cumulative = []
+        n = 0
+        for count in counts:
+            n += count
+            cumulative.append(n)
+        return cumulative, total
+
+
+class Metrics():
+    """
+    Metrics of a TFServeApp.
+
+    :param dict labels: labels added to every series (for example the model name).
+    """
+
+    content_type = CONTENT_TYPE
+
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.stages = {stage: Histogram() for stage in STAGES}
+        self.latency = Histogram()
+        self._requests = {}
+        self._conversions = {}
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def request_started(self):
+        with self._lock:
+            self._in_flight += 1
+
+    def request_finished(self, code, seconds):
+        """
+        Count a finished request with HTTP status `code` that took `seconds`.
+        """
+        self.latency.observe(seconds)
+        with self._lock:
+            self._in_flight -= 1
+            self._requests[code] = self._requests.get(code, 0) + 1
+
+    def input_converted(self, name, kind):
+        """
+        Count an input `name` converted before running the model, because of
+        its dtype or its memory layout (`kind` "dtype" or "layout").
+        """
+        key = (name, kind)
+        with self._lock:
+            self._conversions[key] = self._conversions.get(key, 0) + 1
+
+    def observe(self, stage, seconds):
+        """
+        Observe the duration of a request `stage` (one of STAGES).
+        """
+        self.stages[stage].observe(seconds)
+
+    def render(self):
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        return "".join(render([self]))
+
+
+def render(metrics_list):
+    """
+    Render the series of several Metrics (with different labels) in the
+    Prometheus text exposition format. Returns a list of lines.
+    """
+    lines = []
+    _header(lines, "tfserve_requests_total", "counter", "Inference requests by HTTP status code.")
+    for metrics in metrics_list:
+        with metrics._lock:
+            requests = sorted(metrics._requests.items())
+        for code, count in requests:
+            lines.append("tfserve_requests_total%s %i\n" % (
+                _labels(metrics.labels, code=str(code)), count))
+    _header(lines, "tfserve_requests_in_flight", "gauge", "Inference requests being served.")
+    for metrics in metrics_list:
+        lines.append("tfserve_requests_in_flight%s %i\n" % (
+            _labels(metrics.labels), metrics._in_flight))
+    _header(lines, "tfserve_input_conversions_total", "counter",
+            "Inputs converted to the placeholder dtype or to a contiguous array.")
+    for metrics in metrics_list:
+        with metrics._lock:
+            conversions = sorted(metrics._conversions.items())
+        for (name, kind), count in conversions:
+            lines.append("tfserve_input_conversions_total%s %i\n" % (
+                _labels(metrics.labels, input=name, kind=kind), count))
+    _header(lines, "tfserve_request_duration_seconds", "histogram",
+            "Inference request latency.")
+    for metrics in metrics_list:
+        _histogram(lines, "tfserve_request_duration_seconds", metrics.latency, metrics.labels)
+    _header(lines, "tfserve_stage_duration_seconds", "histogram",
+            "Latency of each inference request stage.")
+    for metrics in metrics_list:
+        for stage in STAGES:
+            _histogram(lines, "tfserve_stage_duration_seconds", metrics.stages[stage],
+                       dict(metrics.labels, stage=stage))
+    return lines
+
+
+def _header(lines, name, kind, doc):
+    lines.append("# HELP %s %s\n" % (name, doc))
+    lines.append("# TYPE %s %s\n" % (name, kind))
+
+
+def _histogram(lines, name, histogram, labels):
+    counts, total = histogram.snapshot()
+    bounds = ["%g" % b for b in histogram.buckets] + ["+Inf"]
+    for bound, count in zip(bounds, counts):
+        lines.append("%s_bucket%s %i\n" % (name, _labels(labels, le=bound), count))
+    lines.append("%s_sum%s %.9g\n" % (name, _labels(labels), total))
+    lines.append("%s_count%s %i\n" % (name, _labels(labels), counts[-1]))
+
+
+def _labels(labels, **extra):
+    labels = dict(labels, **extra)
+    if not labels:
+        return ""
+    return "{%s}" % ",".join(
+        '%s="%s"' % (name, _escape(value)) for name, value in sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,75 @@
+"""
+Memory-mapped graphs.
+
+Large constants of a frozen graph are written to their own files and
+replaced by ImmutableConst ops, which map the files in memory instead of
+copying their values into the graph. Processes serving the same model share
+the pages through the OS page cache, and only the pages that are read are
+loaded.
+"""
+
+import os
+import shutil
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.framework import tensor_util
+
+# Constants smaller than this number of bytes are kept in the graph.
+DEFAULT_MIN_BYTES = 64 * 1024
+
+GRAPH_FILE = "graph.pb"
+
+_TENSOR_SUFFIX = ".bin"
+
+
+def convert(graph_def, path, min_bytes=DEFAULT_MIN_BYTES):
+    """
+    Write `graph_def` to directory `path` with its constants of at least
+    `min_bytes` bytes memory-mapped and return the graph as `load` does.
+
+    The directory is written atomically. If it already exists (another
+    process converted the same graph), it is used as it is.
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    os.makedirs(tmp_path)
+    converted = tf.GraphDef()
+    converted.CopyFrom(graph_def)
+    for i, node in enumerate(converted.node):
+        if node.op != "Const":
+            continue
+        value = tensor_util.MakeNdarray(node.attr["value"].tensor)
+        if value.dtype == np.object_ or value.nbytes < min_bytes:
+            continue
+        region = "{}{}".format(i, _TENSOR_SUFFIX)
+        with open(os.path.join(tmp_path, region), "wb") as f:
+            f.write(np.ascontiguousarray(value).tobytes())
+        del node.attr["value"]
+        node.op = "ImmutableConst"
+        node.attr["shape"].shape.CopyFrom(tf.TensorShape(value.shape).as_proto())
+        node.attr["memory_region_name"].s = region.encode("utf-8")
+    with open(os.path.join(tmp_path, GRAPH_FILE), "wb") as f:
+        f.write(converted.SerializeToString())
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        if not os.path.isdir(path):
+            raise
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return load(path)
+
+
+def load(path):
+    """
+    Return the graph in directory `path` written by `convert`, with its
+    ImmutableConst ops mapping the tensor files in `path`.
+    """
+    path = os.path.abspath(path)
+    graph_def = tf.GraphDef()
+    with open(os.path.join(path, GRAPH_FILE), "rb") as f:
+        graph_def.ParseFromString(f.read())
+    for node in graph_def.node:
+        if node.op == "ImmutableConst":
+            region = node.attr["memory_region_name"].s.decode("utf-8")
+            node.attr["memory_region_name"].s = os.path.join(path, region).encode("utf-8")
+    return graph_def
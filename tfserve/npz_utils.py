@@ -0,0 +1,194 @@
+"""
+Reading and writing numpy `.npy` / `.npz` request and response bodies.
+"""
+
+import io
+import struct
+import zipfile
+import zlib
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+NPY_MEDIA_TYPE = "application/x-npy"
+NPZ_MEDIA_TYPE = "application/x-npz"
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\x03\x04"
+
+_HEADER_READERS = {
+    (1, 0): npy_format.read_array_header_1_0,
+    (2, 0): npy_format.read_array_header_2_0,
+}
+
+
+def load_npz(buf):
+    """
+    Load a `.npz` archive held in memory as a `dict` mapping names to arrays.
+
+    Arrays stored without compression (the `np.savez` default) are read-only
+    views of `buf`; compressed ones are decompressed, once their declared shape
+    has been checked against the entry size. Arrays of Python objects are
+    rejected.
+
+    :raises ValueError: if `buf` is not a valid `.npz` archive.
+    """
+    try:
+        archive = zipfile.ZipFile(_BufferReader(buf))
+    except zipfile.BadZipFile as e:
+        raise ValueError("invalid npz archive: {}".format(e))
+
+    arrays = {}
+    with archive:
+        for info in archive.infolist():
+            name = info.filename
+            if name.endswith(".npy"):
+                name = name[:-4]
+            if info.compress_type == zipfile.ZIP_STORED:
+                arrays[name] = _stored_npy(buf, info)
+            else:
+                arrays[name] = _compressed_npy(archive, info)
+    return arrays
+
+
+def load_npy(buf):
+    """
+    Load a `.npy` file held in memory as a read-only view of `buf`.
+
+    :raises ValueError: if `buf` is not a valid `.npy` file.
+    """
+    return _npy_view(buf, 0, len(buf))
+
+
+def dump_npz(arrays):
+    """
+    Serialize a `dict` mapping names to arrays as an uncompressed `.npz` archive.
+    """
+    f = io.BytesIO()
+    np.savez(f, **{name: np.asarray(value) for name, value in arrays.items()})
+    return f.getvalue()
+
+
+def dump_npy(array):
+    """
+    Serialize an array as a `.npy` file.
+    """
+    f = io.BytesIO()
+    np.save(f, np.asarray(array), allow_pickle=False)
+    return f.getvalue()
+
+
+def _stored_npy(buf, info):
+    offset = info.header_offset
+    try:
+        fields = _LOCAL_HEADER.unpack_from(buf, offset)
+    except struct.error:
+        raise ValueError("invalid npz archive: truncated entry {}".format(info.filename))
+    if fields[0] != _LOCAL_HEADER_SIGNATURE:
+        raise ValueError("invalid npz archive: bad entry {}".format(info.filename))
+    name_len, extra_len = fields[-2:]
+    start = offset + _LOCAL_HEADER.size + name_len + extra_len
+    return _npy_view(buf, start, start + info.file_size)
+
+
+class _BufferReader(io.RawIOBase):
+    """
+    Seekable file over a buffer. Unlike `io.BytesIO`, it never copies a
+    `bytearray` (like the request bodies of `tfserve.streaming`).
+    """
+
+    def __init__(self, buf):
+        super(_BufferReader, self).__init__()
+        self._view = memoryview(buf).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        if offset < 0:
+            raise ValueError("negative seek position {}".format(offset))
+        self._pos = offset
+        return self._pos
+
+    def readinto(self, b):
+        data = self._view[self._pos:self._pos + len(b)]
+        n = len(data)
+        memoryview(b).cast('B')[:n] = data
+        self._pos += n
+        return n
+
+
+def _compressed_npy(archive, info):
+    try:
+        with archive.open(info) as f:
+            shape, fortran_order, dtype = _read_header(f)
+            nbytes = _count(shape) * dtype.itemsize
+            # The header is sent by the client: check it before reading so a
+            # small archive cannot make us allocate for a huge declared shape.
+            if nbytes != info.file_size - f.tell():
+                raise ValueError("invalid npy data: array size does not match entry {}"
+                                 .format(info.filename))
+            data = f.read(nbytes)
+    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+        raise ValueError("invalid npz archive: {}".format(e))
+    if len(data) != nbytes:
+        raise ValueError("invalid npy data: truncated array")
+    arr = np.frombuffer(data, dtype=dtype, count=_count(shape))
+    return arr.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def _npy_view(buf, start, end):
+    # Only the header is copied to parse it, the array data is not.
+    f = io.BytesIO(memoryview(buf)[start:min(end, start + _npy_header_size(buf, start))])
+    shape, fortran_order, dtype = _read_header(f)
+    count = _count(shape)
+    data_start = start + f.tell()
+    if data_start + count * dtype.itemsize > end:
+        raise ValueError("invalid npy data: truncated array")
+    arr = np.frombuffer(buf, dtype=dtype, count=count, offset=data_start)
+    arr.flags.writeable = False
+    return arr.reshape(shape, order='F' if fortran_order else 'C')
+
+
+def _read_header(f):
+    try:
+        version = npy_format.read_magic(f)
+        read_header = _HEADER_READERS.get(version)
+        if read_header is None:
+            raise ValueError("unsupported version {}.{}".format(*version))
+        shape, fortran_order, dtype = read_header(f)
+    except ValueError as e:
+        raise ValueError("invalid npy data: {}".format(e))
+    if dtype.hasobject:
+        raise ValueError("npy arrays of Python objects are not supported")
+    return shape, fortran_order, dtype
+
+
+def _count(shape):
+    count = 1
+    for dim in shape:
+        count *= dim
+    return count
+
+
+def _npy_header_size(buf, start):
+    """
+    Size of the `.npy` header at buf[start:], including magic and length fields.
+    """
+    prefix = bytes(memoryview(buf)[start:start + 12])
+    if len(prefix) < 12 or not prefix.startswith(npy_format.MAGIC_PREFIX):
+        return len(prefix)
+    if prefix[6] == 1:
+        return 10 + struct.unpack_from("<H", prefix, 8)[0]
+    return 12 + struct.unpack_from("<I", prefix, 8)[0]
@@ -0,0 +1,89 @@
+"""
+Load time graph optimization.
+
+Models are usually exported with nodes that serving doesn't need: training
+and debug ops, and subgraphs unrelated to the served outputs. The graph is
+pruned to the subgraph needed for the outputs, then simplified with
+tensorflow graph transforms before it is served.
+"""
+
+import time
+
+import tensorflow as tf
+from tensorflow.tools.graph_transforms import TransformGraph
+
+import tfserve.graph_utils as graph_utils
+from tfserve.warmup import synthetic_feeds
+
+# Graph transforms applied to the pruned graph, in order. Inputs and outputs
+# are never removed.
+TRANSFORMS = [
+    "remove_nodes(op=Identity, op=CheckNumerics, op=StopGradient)",
+    "fold_constants(ignore_errors=true)",
+    "fold_batch_norms",
+    "fold_old_batch_norms",
+]
+
+
+def optimize_graph_def(graph_def, inputs, outputs):
+    """
+    Return an optimized copy of `graph_def` serving `outputs` from `inputs`.
+
+    Only the nodes needed to compute the outputs (and the input nodes) are
+    kept. Identity, CheckNumerics and StopGradient nodes are removed,
+    constant subgraphs folded and batch normalizations folded into the
+    preceding convolution or matmul weights when possible.
+
+    :param tf.GraphDef graph_def: graph to optimize.
+    :param list[str] inputs: input node names.
+    :param list[str] outputs: output node names.
+
+    :raises ValueError: if an input or output node is not in the graph.
+    """
+    names = set(node.name for node in graph_def.node)
+    for name in inputs + outputs:
+        if name not in names:
+            raise ValueError("Non existent tensor in graph: {}".format(name))
+    graph_def = tf.graph_util.extract_sub_graph(graph_def, outputs + inputs)
+    return TransformGraph(graph_def, inputs, outputs, TRANSFORMS)
+
+
+def node_names(tensors, prefix=""):
+    """
+    Return the node names of a list of tensor names, removing `prefix` (the
+    name scope the graph is imported to).
+
+    :raises ValueError: if a tensor name doesn't start with `prefix`.
+    """
+    names = []
+    for t in tensors:
+        t = graph_utils.smart_tensor_name(t)
+        if not t.startswith(prefix):
+            raise ValueError("Non existent tensor in graph: {}".format(t))
+        names.append(t[len(prefix):].rsplit(":", 1)[0])
+    return names
+
+
+def report(model_path, in_t, out_t, config=None):
+    """
+    Load `model_path` with and without optimization and return the node count
+    of both graphs and the latency of their first run, with random inputs of
+    batch size 1, as a JSON serializable dict.
+    """
+    from tfserve.loader import load_model
+
+    in_t = [graph_utils.smart_tensor_name(t) for t in in_t]
+    out_t = [graph_utils.smart_tensor_name(t) for t in out_t]
+    result = {"nodes": {}, "first_run_seconds": {}}
+    for key, optimize_for in (("before", None), ("after", (in_t, out_t))):
+        sess = load_model(model_path, config, optimize_for=optimize_for)
+        try:
+            specs = {name: graph_utils.tensor_spec(sess.graph, name) for name in in_t}
+            feed_dict = synthetic_feeds(specs, [1])[0]
+            start = time.perf_counter()
+            sess.run(out_t, feed_dict=feed_dict)
+            result["first_run_seconds"][key] = round(time.perf_counter() - start, 6)
+            result["nodes"][key] = len(sess.graph_def.node)
+        finally:
+            sess.close()
+    return result
@@ -0,0 +1,190 @@
+"""
+Pre-fork multi-process serving.
+
+A supervisor process validates the model once, then forks worker processes
+that serve requests on the same port. Crashed workers are restarted and a
+`/shutdown` request received by any worker stops all of them. Reload
+requests are rejected, as they would only reload the worker receiving them.
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from werkzeug import serving
+
+RESTART_BACKOFF = 1.0
+
+# WSGI environ key with the number of workers, set in the requests they serve.
+WORKERS_ENVIRON_KEY = 'tfserve.workers'
+
+
+def serve(app_factory, host, port, workers, middleware=None, reuse_port=False):
+    """
+    Serve with `workers` processes and block until they are all stopped.
+
+    Each worker builds its own TFServeApp by calling `app_factory` (tensorflow
+    sessions can not be shared across a fork). Before forking the workers, the
+    factory is run once in a short lived process so that an invalid model is
+    reported once instead of crashing every worker.
+
+    By default the supervisor opens a single listening socket that is inherited
+    by all workers. If `reuse_port` is True, each worker binds its own socket
+    with SO_REUSEPORT and the kernel balances connections among them.
+
+    :param app_factory: function without arguments returning a TFServeApp.
+    :param str host: host interface to bind to.
+    :param int port: port to listen on.
+    :param int workers: number of worker processes.
+    :param middleware: see `TFServeApp.run`.
+    :param bool reuse_port: bind one SO_REUSEPORT socket per worker.
+
+    :raises ValueError: if the model can not be served.
+    """
+    if workers < 1:
+        raise ValueError("workers must be a positive integer")
+    if reuse_port and not hasattr(socket, "SO_REUSEPORT"):
+        raise ValueError("SO_REUSEPORT is not supported on this platform")
+
+    _validate(app_factory)
+
+    sock = None
+    if not reuse_port:
+        sock = _listen(host, port, reuse_port=False)
+
+    supervisor = _Supervisor(app_factory, host, port, workers, middleware, sock)
+    try:
+        supervisor.run()
+    finally:
+        if sock is not None:
+            sock.close()
+
+
+class _Supervisor():
+
+    def __init__(self, app_factory, host, port, workers, middleware, sock):
+        self.app_factory = app_factory
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.middleware = middleware
+        self.sock = sock
+        self.pid = os.getpid()
+        self._children = {}
+        self._stopping = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        for _ in range(self.workers):
+            self._spawn()
+        while self._children:
+            pid, status = os.wait()
+            started_at = self._children.pop(pid, None)
+            if started_at is None or self._stopping:
+                continue
+            sys.stderr.write(
+                "tfserve: worker %i exited with status %i, restarting\n"
+                % (pid, _exit_code(status)))
+            if time.monotonic() - started_at < RESTART_BACKOFF:
+                time.sleep(RESTART_BACKOFF)
+            if not self._stopping:
+                self._spawn()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:  # pylint: disable=broad-except
+                code = 1
+                traceback.print_exc()
+            finally:
+                os._exit(code)  # pylint: disable=protected-access
+        self._children[pid] = time.monotonic()
+
+    def _handle_stop(self, _signum, _frame):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def _run_worker(self):
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        app = self.app_factory()
+        wsgi_app = app._init_app(self.middleware)  # pylint: disable=protected-access
+        supervisor_pid = self.pid
+
+        def shutdown_all():
+            os.kill(supervisor_pid, signal.SIGTERM)
+
+        def worker_app(env, start_resp):
+            env['werkzeug.server.shutdown'] = shutdown_all
+            env[WORKERS_ENVIRON_KEY] = self.workers
+            return wsgi_app(env, start_resp)
+
+        sock = self.sock
+        if sock is None:
+            sock = _listen(self.host, self.port, reuse_port=True)
+        server = serving.make_server(
+            self.host, self.port, worker_app, threaded=True,
+            request_handler=serving.WSGIRequestHandler,
+            fd=sock.fileno())
+
+        def stop(_signum, _frame):
+            threading.Thread(target=server.shutdown).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        server.serve_forever()
+        server.server_close()
+
+
+def _validate(app_factory):
+    """
+    Build an app once in a child process to check that the model can be served.
+    """
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            app_factory()
+        except BaseException:  # pylint: disable=broad-except
+            code = 1
+            traceback.print_exc()
+        finally:
+            os._exit(code)  # pylint: disable=protected-access
+    _, status = os.waitpid(pid, 0)
+    if _exit_code(status) != 0:
+        raise ValueError("model validation failed, see errors above")
+
+
+def _listen(host, port, reuse_port):
+    sock = socket.socket(_address_family(host), socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, int(port)))
+    sock.listen(socket.SOMAXCONN)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _address_family(host):
+    if ":" in host:
+        return socket.AF_INET6
+    return socket.AF_INET
+
+
+def _exit_code(status):
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
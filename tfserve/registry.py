@@ -0,0 +1,143 @@
+"""
+Multi-model serving.
+
+A ModelRegistry serves several TFServeApp models from one process, each one
+at '/models/<name>', sharing the server threads (and optionally a tensorflow
+thread pool, see `TFServeApp` shared_threads). Models are usually described
+in a YAML or JSON config file:
+
+    shared_threads: 8
+    models:
+      - name: mnist
+        model: ./mnist.pb
+        inputs: [import/x:0]
+        outputs: [import/softmax:0]
+        handler: json
+        max_batch_size: 32
+      - name: resnet
+        model: ./resnet/
+        inputs: [input:0]
+        outputs: [output:0]
+        handler: binary
+        sessions: 2
+
+`name`, `model`, `inputs` and `outputs` are required. `handler`, `batch` and
+`json_precision` are used as the command line arguments with the same name,
+and other keys are passed to TFServeApp as keyword arguments (for example
+`warmup: true`).
+"""
+
+import json
+
+from werkzeug import routing
+from werkzeug.wrappers import Response
+
+from tfserve.tfserve import MultiModelApp
+
+# Model keys that are not TFServeApp keyword arguments.
+MODEL_KEYS = ("name", "model", "inputs", "outputs", "handler", "batch", "json_precision")
+
+CONFIG_KEYS = ("models", "shared_threads")
+
+
+def read_config(path):
+    """
+    Read a registry config file, YAML if its name ends with '.yaml' or
+    '.yml' (requires PyYAML) and JSON otherwise.
+
+    `inputs` and `outputs` of each model are returned as lists.
+
+    :raises ValueError: if the config is not valid.
+    :raises ImportError: if the file is YAML and PyYAML is not installed.
+    """
+    with open(path) as f:
+        text = f.read()
+    if path.endswith(('.yaml', '.yml')):
+        import yaml
+        try:
+            config = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise ValueError("{}: invalid YAML: {}".format(path, e))
+    else:
+        try:
+            config = json.loads(text)
+        except ValueError as e:
+            raise ValueError("{}: invalid JSON: {}".format(path, e))
+    return check_config(config)
+
+
+def check_config(config):
+    """
+    Check a registry config and return it with the `inputs` and `outputs`
+    of each model as lists.
+
+    :raises ValueError: if the config is not valid.
+    """
+    if not isinstance(config, dict) or not config.get("models"):
+        raise ValueError("config must have a non empty list of models")
+    for key in config:
+        if key not in CONFIG_KEYS:
+            raise ValueError("unknown config key: {}".format(key))
+    names = set()
+    for model in config["models"]:
+        if not isinstance(model, dict):
+            raise ValueError("models must be mappings")
+        for key in ("name", "model", "inputs", "outputs"):
+            if not model.get(key):
+                raise ValueError("model {} is missing {}".format(model.get("name", ""), key))
+        name = model["name"]
+        if not isinstance(name, str) or not MultiModelApp._NAME_RE.match(name):
+            raise ValueError("invalid model name: {}".format(name))
+        if name in names:
+            raise ValueError("duplicated model name: {}".format(name))
+        names.add(name)
+        for key in ("inputs", "outputs"):
+            if isinstance(model[key], str):
+                model[key] = [s.strip() for s in model[key].split(',')]
+    return config
+
+
+def model_options(model):
+    """
+    Return the TFServeApp keyword arguments of a model config.
+    """
+    return {key: value for key, value in model.items() if key not in MODEL_KEYS}
+
+
+class ModelRegistry(MultiModelApp):
+    """
+    Serves several TFServeApp models, each one at '/models/<name>'.
+
+    '/ping' is ready when all models are ready. '/stats' and '/metrics'
+    report every model, with a `model` label in metrics (models must be
+    created with a `name`). '/models' lists the models and a POST to
+    '/models/<name>/reload' reloads a model (see `TFServeApp.reload`).
+
+    :param dict apps: mapping from model name to TFServeApp.
+    """
+
+    def __init__(self, apps):
+        super(ModelRegistry, self).__init__(apps, "model")
+
+    def _routes(self):
+        rules = []
+        for name, app in self.apps.items():
+            rules.append(routing.Rule('/models/{}'.format(name), endpoint=app._handle_inference))
+            rules.append(routing.Rule('/models/{}/reload'.format(name), endpoint=app._handle_reload))
+        return routing.Map(rules + [
+            routing.Rule('/models', endpoint=self._handle_models),
+            routing.Rule('/ping', endpoint=self._handle_ping),
+            routing.Rule('/stats', endpoint=self._handle_stats),
+            routing.Rule('/metrics', endpoint=self._handle_metrics),
+            routing.Rule('/shutdown', endpoint=self._handle_shutdown),
+        ])
+
+    def _handle_models(self, _req):
+        """Handles models request.
+
+        """
+        models = {
+            name: {"inputs": app.in_t, "outputs": app.out_t, "ready": app.ready}
+            for name, app in self.apps.items()
+        }
+        return Response(json.dumps(models), content_type='application/json')
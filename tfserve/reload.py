@@ -0,0 +1,76 @@
+"""
+Model reloading.
+
+A ModelWatcher polls the model path of a TFServeApp and reloads the model
+when its files change (see `TFServeApp.reload`).
+"""
+
+import os
+import sys
+import threading
+import traceback
+
+
+class ModelWatcher():
+    """
+    Reloads the model of a TFServeApp when its files change.
+
+    The model is reloaded once its files are unchanged for a whole polling
+    interval, so a model that is still being copied is not loaded. Reload
+    errors are printed and the served model is kept.
+
+    :param app: TFServeApp to reload.
+    :param float interval: seconds between checks of the model files.
+    """
+
+    def __init__(self, app, interval):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.app = app
+        self.interval = interval
+        self._stop = threading.Event()
+        # Read before the thread starts, so changes made from now on are seen.
+        self._loaded = model_signature(app.model_path)
+        self._thread = threading.Thread(target=self._loop, name="tfserve-watcher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop watching the model files.
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def _loop(self):
+        loaded = last = self._loaded
+        while not self._stop.wait(self.interval):
+            current = model_signature(self.app.model_path)
+            if current == last and current != loaded:
+                try:
+                    self.app.reload()
+                except Exception:  # pylint: disable=broad-except
+                    sys.stderr.write("tfserve: model reload failed, keeping the served model\n")
+                    traceback.print_exc()
+                loaded = current
+            last = current
+
+
+def model_signature(model_path):
+    """
+    Return the name, size and modification time of the files of a model (a
+    `.pb` file or the files in a checkpoint directory), or None if the path
+    doesn't exist.
+    """
+    try:
+        if os.path.isdir(model_path):
+            paths = [os.path.join(model_path, name) for name in os.listdir(model_path)]
+        else:
+            paths = [model_path]
+        signature = []
+        for path in sorted(paths):
+            st = os.stat(path)
+            signature.append((path, st.st_size, st.st_mtime_ns))
+        return signature
+    except OSError:
+        return None
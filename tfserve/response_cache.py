@@ -0,0 +1,162 @@
+"""
+Response cache.
+
+Caches serialized responses keyed by a hash of the raw request, so
+byte-identical requests are answered without encoding, running the model
+or decoding. Responses carry an ETag for conditional requests.
+"""
+
+import collections
+import hashlib
+import threading
+import time
+
+# Approximate memory used by an entry besides its body.
+ENTRY_OVERHEAD = 256
+
+# Default ratio of the cache size an entry can use.
+DEFAULT_ENTRY_RATIO = 16
+
+
+class CachedResponse():
+    """
+    A serialized response.
+    """
+
+    __slots__ = ("body", "headers", "etag", "size", "expires")
+
+    def __init__(self, body, headers, etag, size, expires):
+        self.body = body
+        self.headers = headers
+        self.etag = etag
+        self.size = size
+        self.expires = expires
+
+
+class ResponseCache():
+    """
+    Thread safe LRU cache of response bodies bounded in bytes.
+
+    :param int max_bytes: memory used by cached responses, evicting least
+                          recently used entries when exceeded.
+    :param int max_entry_bytes: larger responses are not cached (default is
+                                max_bytes / DEFAULT_ENTRY_RATIO).
+    :param float ttl: seconds an entry is valid for (default is no expiration).
+    """
+
+    def __init__(self, max_bytes, max_entry_bytes=None, ttl=None):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be a positive integer")
+        if max_entry_bytes is not None and max_entry_bytes <= 0:
+            raise ValueError("max_entry_bytes must be a positive integer")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes or max_bytes // DEFAULT_ENTRY_RATIO, max_bytes)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._not_modified = 0
+        self._evictions = 0
+        self._too_large = 0
+
+    @staticmethod
+    def key(*parts):
+        """
+        Return the cache key of a request from its parts (route, relevant
+        headers and body), as `str` or bytes-like objects.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            if isinstance(part, str):
+                part = part.encode("utf-8")
+            h.update(len(part).to_bytes(8, "little"))
+            h.update(part)
+        return h.digest()
+
+    @staticmethod
+    def etag(body):
+        """
+        Return the entity tag of a response body.
+        """
+        return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+    def get(self, key):
+        """
+        Return the `CachedResponse` for `key` or None.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body, headers, etag=None):
+        """
+        Cache a response body and its headers (a list of (name, value)
+        tuples) for `key` and return its `CachedResponse`.
+
+        The response is returned but not cached if it is larger than `max_entry_bytes`.
+        """
+        body = bytes(body)
+        size = ENTRY_OVERHEAD + len(key) + len(body)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        entry = CachedResponse(body, headers, etag or self.etag(body), size, expires)
+        with self._lock:
+            if size > self.max_entry_bytes:
+                self._too_large += 1
+                return entry
+            if key in self._entries:
+                self._remove(key)
+            while self._bytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._evictions += 1
+            self._entries[key] = entry
+            self._bytes += size
+        return entry
+
+    def not_modified(self):
+        """
+        Count a conditional request answered with 304 Not Modified.
+        """
+        with self._lock:
+            self._not_modified += 1
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Return cache counters as a JSON serializable dict.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "max_entry_bytes": self.max_entry_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "not_modified": self._not_modified,
+                "evictions": self._evictions,
+                "too_large": self._too_large,
+            }
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key).size
@@ -0,0 +1,181 @@
+"""
+Inference result cache.
+
+Caches model outputs keyed by a hash of the model inputs, so repeated inputs
+are answered without running the session.
+"""
+
+import collections
+import hashlib
+import threading
+import time
+
+import numpy as np
+
+POLICIES = ("lru", "lfu")
+
+# Approximate memory used by an entry besides its output arrays.
+ENTRY_OVERHEAD = 256
+
+
+class _Entry():
+
+    __slots__ = ("outputs", "size", "expires", "hits")
+
+    def __init__(self, outputs, size, expires):
+        self.outputs = outputs
+        self.size = size
+        self.expires = expires
+        self.hits = 0
+
+
+class ResultCache():
+    """
+    Thread safe cache of model outputs bounded in bytes.
+
+    :param int max_bytes: memory used by cached outputs, evicting entries when exceeded.
+    :param float ttl: seconds an entry is valid for (default is no expiration).
+    :param str policy: entry evicted first: "lru" (least recently used) or
+                       "lfu" (least frequently used, least recently used among ties).
+    """
+
+    def __init__(self, max_bytes, ttl=None, policy="lru"):
+        if max_bytes <= 0:
+            raise ValueError("max_bytes must be a positive integer")
+        if ttl is not None and ttl <= 0:
+            raise ValueError("ttl must be positive")
+        if policy not in POLICIES:
+            raise ValueError("unknown cache policy {}, expected one of {}".format(
+                policy, ", ".join(POLICIES)))
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.policy = policy
+        self._lock = threading.Lock()
+        # LRU: a single bucket. LFU: one bucket per hit count. Buckets are
+        # ordered from least to most recently used.
+        self._buckets = collections.defaultdict(collections.OrderedDict)
+        self._entries = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    @staticmethod
+    def key(feed_dict):
+        """
+        Return the cache key of `feed_dict`: a digest of the name, dtype,
+        shape and bytes of each value.
+        """
+        h = hashlib.blake2b(digest_size=16)
+        for name in sorted(feed_dict):
+            value = np.ascontiguousarray(feed_dict[name])
+            h.update(name.encode("utf-8"))
+            h.update(value.dtype.str.encode("ascii"))
+            h.update(repr(value.shape).encode("ascii"))
+            if value.dtype.hasobject:
+                h.update(repr(value.tolist()).encode("utf-8"))
+            else:
+                h.update(value.data)
+        return h.digest()
+
+    def get(self, key):
+        """
+        Return a copy of the outputs `dict` cached for `key` or None.
+
+        Output values are the cached arrays themselves, so they are read-only.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires is not None and entry.expires <= time.monotonic():
+                self._remove(key)
+                self._expirations += 1
+                entry = None
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._touch(key, entry)
+            return dict(entry.outputs)
+
+    def put(self, key, outputs):
+        """
+        Cache a `dict` of output values for `key`.
+
+        Outputs larger than `max_bytes` are not cached. Output values are
+        copied to read-only arrays, so neither the caller nor later hits can
+        change the cached values.
+        """
+        outputs = {name: _frozen(value) for name, value in outputs.items()}
+        size = ENTRY_OVERHEAD + len(key) + sum(value.nbytes for value in outputs.values())
+        if size > self.max_bytes:
+            return
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            while self._bytes + size > self.max_bytes:
+                self._evict()
+            entry = _Entry(outputs, size, expires)
+            self._entries[key] = entry
+            self._buckets[0][key] = entry
+            self._bytes += size
+
+    def clear(self):
+        """
+        Remove all entries.
+        """
+        with self._lock:
+            self._buckets.clear()
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Return cache counters as a JSON serializable dict.
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "policy": self.policy,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else 0.0,
+                "evictions": self._evictions,
+                "expirations": self._expirations,
+            }
+
+    def _touch(self, key, entry):
+        if self.policy == "lru":
+            self._buckets[0].move_to_end(key)
+            return
+        bucket = self._buckets[entry.hits]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[entry.hits]
+        entry.hits += 1
+        self._buckets[entry.hits][key] = entry
+
+    def _evict(self):
+        # Expired entries are removed when looked up, or evicted like any other.
+        key = next(iter(self._buckets[min(self._buckets)]))
+        self._remove(key)
+        self._evictions += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        hits = 0 if self.policy == "lru" else entry.hits
+        bucket = self._buckets[hits]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[hits]
+        self._bytes -= entry.size
+
+
+def _frozen(value):
+    value = np.array(value)
+    value.setflags(write=False)
+    return value
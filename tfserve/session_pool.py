@@ -0,0 +1,117 @@
+"""
+Pool of tensorflow sessions running replicas of the same model graph.
+"""
+
+import threading
+
+DISPATCH_POLICIES = ("round-robin", "least-loaded")
+
+
+class PoolClosed(Exception):
+    """
+    Raised by `SessionPool.run` when the pool is closed (for example,
+    replaced by a reloaded model).
+    """
+
+
+class SessionPool():
+    """
+    Dispatches session runs among several sessions.
+
+    Each session holds its own replica of the model graph (see `loader.load_model`),
+    so runs on different sessions do not contend with each other. Runs are dispatched
+    round-robin or to the session with the fewest runs in flight.
+
+    :param list sessions: tf.Session objects running the same model.
+    :param str dispatch: one of DISPATCH_POLICIES.
+    """
+
+    def __init__(self, sessions, dispatch="round-robin"):
+        if not sessions:
+            raise ValueError("sessions must not be empty")
+        if dispatch not in DISPATCH_POLICIES:
+            raise ValueError("dispatch must be one of: {}".format(", ".join(DISPATCH_POLICIES)))
+
+        self.sessions = list(sessions)
+        self.dispatch = dispatch
+
+        self._in_flight = [0] * len(self.sessions)
+        self._next = 0
+        self._closed = False
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+
+    def run(self, fetches, feed_dict, options=None, run_metadata=None):
+        """
+        Run `fetches` on one of the pool sessions. Same semantics as `tf.Session.run`.
+
+        :raises PoolClosed: if the pool is closed.
+        """
+        i = self._acquire()
+        try:
+            return self.sessions[i].run(
+                fetches, feed_dict=feed_dict, options=options, run_metadata=run_metadata)
+        finally:
+            self._release(i)
+
+    def make_callable(self, fetches, feed_list):
+        """
+        Return a function running `fetches` on one of the pool sessions, called
+        with the values of the `feed_list` tensors as positional arguments (see
+        `tf.Session.make_callable`). Fetch and feed names are resolved once for
+        each session instead of on every run.
+
+        The function raises `PoolClosed` if the pool is closed. Its `callables`
+        attribute has the callable of each session, in `sessions` order (for
+        example, to warm up every session through the callable requests use).
+        """
+        callables = [sess.make_callable(fetches, feed_list) for sess in self.sessions]
+
+        def run(*feed_values):
+            i = self._acquire()
+            try:
+                return callables[i](*feed_values)
+            finally:
+                self._release(i)
+
+        run.callables = callables
+        return run
+
+    def in_flight(self):
+        """
+        Return the total number of runs in flight.
+        """
+        with self._lock:
+            return sum(self._in_flight)
+
+    def close(self, timeout=None):
+        """
+        Close all sessions in the pool. New runs raise `PoolClosed` and runs in
+        flight are waited for, up to `timeout` seconds (default is no limit).
+
+        Returns False if runs were still in flight after `timeout`.
+        """
+        with self._lock:
+            self._closed = True
+            drained = self._drained.wait_for(lambda: not any(self._in_flight), timeout)
+        for sess in self.sessions:
+            sess.close()
+        return drained
+
+    def _acquire(self):
+        with self._lock:
+            if self._closed:
+                raise PoolClosed()
+            if self.dispatch == "least-loaded":
+                i = min(range(len(self.sessions)), key=self._in_flight.__getitem__)
+            else:
+                i = self._next
+                self._next = (i + 1) % len(self.sessions)
+            self._in_flight[i] += 1
+            return i
+
+    def _release(self, i):
+        with self._lock:
+            self._in_flight[i] -= 1
+            if self._closed and not any(self._in_flight):
+                self._drained.notify_all()
@@ -0,0 +1,88 @@
+"""
+Streaming request body ingestion.
+
+Request bodies are read in chunks into a buffer preallocated from the
+Content-Length header, so a request never holds more than one copy of its
+body, and bodies larger than a configured limit are rejected before they are
+read. Sizes sent by clients are not trusted beyond MAX_PREALLOCATE_BYTES: past
+it, the buffer only grows as bytes arrive.
+
+Handlers may also parse bodies while they are being read by providing an
+incremental parser (see `EncodeDecodeHandler.stream_parser`): an object with
+two methods,
+
+    feed(data)   Called after each chunk with a memoryview of all the body
+                 bytes read so far. Returns the total body size once it is
+                 known from the bytes read (or None), and may raise
+                 `tfserve.BadInput` to reject the request early. The
+                 memoryview must not be kept after returning.
+
+    close(body)  Called with the complete body. Returns the model inputs,
+                 like the handler encode function.
+"""
+
+from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import RequestEntityTooLarge
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Largest buffer allocated before the body bytes arrive.
+MAX_PREALLOCATE_BYTES = 64 * 1024 * 1024
+
+
+def read_body(stream, content_length=None, max_bytes=None, parser=None,
+              chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Read a request body from `stream` in chunks of up to `chunk_size` bytes.
+
+    Returns a `bytearray` with the body. If `content_length` is given, the
+    buffer is allocated once with that size (up to MAX_PREALLOCATE_BYTES);
+    otherwise it is grown as chunks arrive. The body size known by `parser`
+    is only checked, never allocated ahead.
+
+    :raises RequestEntityTooLarge: if the body is larger than `max_bytes`.
+    :raises BadRequest: if the body size is not the size expected by `parser`.
+    :raises BadInput: if `parser` rejects the body.
+    """
+    _check_size(content_length, max_bytes)
+    buf = bytearray(min(content_length or 0, MAX_PREALLOCATE_BYTES))
+    size = 0
+    expected = None
+    readinto = getattr(stream, 'readinto', None)
+    while content_length is None or size < content_length:
+        want = chunk_size
+        if content_length is not None:
+            want = min(want, content_length - size)
+        elif max_bytes is not None:
+            want = min(want, max_bytes + 1 - size)
+        if size + want > len(buf):
+            buf.extend(bytes(size + want - len(buf)))
+        if readinto is not None:
+            n = readinto(memoryview(buf)[size:size + want])
+        else:
+            chunk = stream.read(want)
+            n = len(chunk)
+            buf[size:size + n] = chunk
+        if not n:
+            break
+        size += n
+        _check_size(size, max_bytes)
+        if parser is not None:
+            size_hint = parser.feed(memoryview(buf)[:size])
+            if size_hint is not None and expected is None:
+                expected = size_hint
+                _check_size(expected, max_bytes)
+                if content_length is not None and expected != content_length:
+                    raise BadRequest(
+                        "body size %i does not match Content-Length %i" % (expected, content_length))
+    if size < len(buf):
+        del buf[size:]
+    if expected is not None and size != expected:
+        raise BadRequest("expected a body of %i bytes, got %i" % (expected, size))
+    return buf
+
+
+def _check_size(size, max_bytes):
+    if size is not None and max_bytes is not None and size > max_bytes:
+        raise RequestEntityTooLarge(
+            "request body is larger than %i bytes" % max_bytes)
@@ -1,4 +1,9 @@
+import collections
 import json
+import re
+import sys
+import threading
+import time
 
 import numpy as np
 from apistar import http, App, Route
@@ -6,14 +11,45 @@ from apistar import http, App, Route
 from werkzeug import routing
 from werkzeug import serving
 from werkzeug.exceptions import BadRequest
+from werkzeug.exceptions import Conflict
 from werkzeug.exceptions import HTTPException
+from werkzeug.exceptions import InternalServerError
 from werkzeug.exceptions import MethodNotAllowed
+from werkzeug.exceptions import NotAcceptable
+from werkzeug.exceptions import NotFound
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+from werkzeug.http import parse_etags
+from werkzeug.http import parse_options_header
 from werkzeug.wrappers import Request, Response
 
+from tfserve import asgi
+from tfserve import npz_utils
+from tfserve import prefork
+from tfserve import streaming
+from tfserve.admission import AdmissionControl
+from tfserve.batching import Batcher
+from tfserve.metrics import Metrics
+from tfserve.metrics import render as render_metrics
 from tfserve.loader import load_model
+from tfserve.loader import session_config
+from tfserve.response_cache import ResponseCache
+from tfserve.reload import ModelWatcher
+from tfserve.result_cache import ResultCache
+from tfserve.session_pool import PoolClosed
+from tfserve.session_pool import SessionPool
+from tfserve.tracing import DEFAULT_MAX_TRACES
+from tfserve.tracing import Tracer
+from tfserve.warmup import default_batch_sizes
+from tfserve.warmup import recorded_feeds
+from tfserve.warmup import synthetic_feeds
 import tfserve.graph_utils as graph_utils
 
 
+# Response types negotiated with the Accept header when npz support is enabled.
+RESPONSE_TYPES = ['application/json', npz_utils.NPZ_MEDIA_TYPE, npz_utils.NPY_MEDIA_TYPE]
+
+
 class BadInput(Exception):
     """
     Raised by decode when input is invalid.
@@ -24,7 +60,183 @@ class BadInput(Exception):
         self.description = description
 
 
-class TFServeApp():
+class BaseApp():
+    """
+    Base class of the applications served by tfserve. Subclasses return
+    their routes from `_routes` and implement the `_handle_ping` and
+    `_handle_metrics` endpoints; this class serves them with werkzeug
+    (`run`) or an ASGI server (`run_asgi`).
+    """
+
+    ready = True
+    max_request_bytes = None
+
+    def warmup(self):
+        """
+        Prepare the application to serve requests. Called by `run` and
+        `run_asgi` if it is not `ready`.
+        """
+
+    def run(self, host, port, middleware=None):
+        """Werkzeug run implementation.
+
+        `middleware` may be provided as a function to handle
+        requests. It must accept the arguments `(handler, req)` where
+        `handler` is the TFServeApp request handler and `req` is the
+        request.
+
+        """
+        if not self.ready:
+            self.warmup()
+        app = self._init_app(middleware)
+        server = serving.make_server(
+            host, port, app, threaded=True,
+            request_handler=serving.WSGIRequestHandler)
+        server.serve_forever()
+
+    def run_asgi(self, host, port, middleware=None, max_workers=None):
+        """Run under an asyncio event loop with uvicorn.
+
+        Requires `uvicorn` to be installed. See `_init_asgi_app` for
+        `middleware` and `max_workers`.
+
+        """
+        if not self.ready:
+            self.warmup()
+        asgi.run(
+            lambda shutdown: self._init_asgi_app(middleware, max_workers, shutdown),
+            host, port)
+
+    def _routes(self):
+        raise NotImplementedError()
+
+    def _init_asgi_app(self, middleware=None, max_workers=None, shutdown=None):
+        """Initialize an ASGI application with the same routes as `_init_app`.
+
+        Request bodies are read in the event loop. Handlers that run the
+        model are sent to a thread pool of `max_workers` threads.
+
+        `middleware` is used as in `_init_app`. `shutdown` may be provided
+        as a function that stops the server on POST to '/shutdown'.
+
+        """
+        return asgi.ASGIApp(
+            self._routes(),
+            self._init_app(middleware),
+            inline_endpoints=[self._handle_ping, self._handle_metrics],
+            max_workers=max_workers,
+            shutdown=shutdown,
+            max_body_bytes=self.max_request_bytes)
+
+    def _init_app(self, middleware=None):
+        """Initialize a WSGI application for handling POST to '/'.
+
+        `middleware` may be provided as WSGI middleware.
+
+        """
+        routes = self._routes()
+        def app(env, start_resp):
+            """WSGI application to handle server requests.
+
+            """
+            urls = routes.bind_to_environ(env)
+            try:
+                handler, _kw = urls.match()
+                req = Request(env)
+                if middleware:
+                    return middleware(handler, req)(env, start_resp)
+                return handler(req)(env, start_resp)
+            except HTTPException as e:
+                return e(env, start_resp)
+        return app
+
+    @staticmethod
+    def _handle_shutdown(req):
+        """Handles shutown request.
+
+        """
+        if req.method != 'POST':
+            raise MethodNotAllowed(valid_methods=['POST'])
+        shutdown = req.environ.get('werkzeug.server.shutdown')
+        if not shutdown:
+            raise BadRequest("server does not support shutdown")
+        shutdown()
+        return Response()
+
+
+class MultiModelApp(BaseApp):
+    """
+    Base class of the applications that serve several TFServeApps by name
+    (see `tfserve.registry` and `tfserve.versions`).
+
+    '/ping' is ready when all the apps are ready and '/stats' and '/metrics'
+    report every app. Request bodies are limited to the largest
+    `max_request_bytes` of the apps (no limit if one of them has none);
+    each app still checks its own limit.
+
+    :param dict apps: mapping from name to TFServeApp.
+    :param str kind: what the apps are, used in error messages.
+    """
+
+    _NAME_RE = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+    def __init__(self, apps, kind):
+        if not apps:
+            raise ValueError("at least one {} is required".format(kind))
+        for name in apps:
+            if not self._NAME_RE.match(name):
+                raise ValueError("invalid {} name: {}".format(kind, name))
+        self.apps = collections.OrderedDict(apps)
+        limits = [app.max_request_bytes for app in self.apps.values()]
+        self.max_request_bytes = None if None in limits else max(limits)
+
+    @property
+    def ready(self):
+        return all(app.ready for app in self.apps.values())
+
+    def warmup(self):
+        """
+        Warm up the apps that are not ready.
+        """
+        for app in self.apps.values():
+            if not app.ready:
+                app.warmup()
+
+    def stats(self):
+        """
+        Return the serving statistics of each app (see `TFServeApp.stats`)
+        by name.
+        """
+        return {name: app.stats() for name, app in self.apps.items()}
+
+    def _handle_ping(self, _req):
+        """Handles ping request.
+
+        Returns 503 until all apps are warmed up.
+
+        """
+        if not self.ready:
+            return Response("warming up", status=503)
+        return Response()
+
+    def _handle_stats(self, _req):
+        """Handles stats request.
+
+        """
+        return Response(json.dumps(self.stats()), content_type='application/json')
+
+    def _handle_metrics(self, _req):
+        """Handles Prometheus metrics request.
+
+        """
+        metrics_list = [app._metrics for app in self.apps.values() if app._metrics is not None]
+        if not metrics_list:
+            raise NotFound()
+        return Response("".join(render_metrics(metrics_list)),
+                        content_type=metrics_list[0].content_type)
+
+
+class TFServeApp(BaseApp):
     """
     This class will handle all server functionality for one-to-one models.
     A TFServeApp object is able to run a web server to serve the model and
@@ -50,7 +262,17 @@ class TFServeApp():
     run the model, giving it's output to the decode function that will prepare the reponse data.
     """
 
-    def __init__(self, model_path, in_t, out_t, encode, decode, batch=False):
+    def __init__(self, model_path, in_t, out_t, encode, decode, batch=False,
+                 max_batch_size=None, max_queue_delay_us=1000,
+                 bucket_boundaries=None, bucket_axis=0,
+                 sessions=1, intra_op_threads=None, inter_op_threads=None,
+                 dispatch="round-robin", npz=False, max_request_bytes=None,
+                 stream_parser=None, cache_bytes=None, cache_ttl=None, cache_policy="lru",
+                 response_cache_bytes=None, response_cache_entry_bytes=None, metrics=True,
+                 trace_dir=None, trace_rate=0.0, max_traces=DEFAULT_MAX_TRACES, trace_header=False,
+                 warmup=None, warmup_batch_sizes=None, optimize=False, freeze_cache_dir=None,
+                 mmap_dir=None, name=None, shared_threads=None, reload_interval=None,
+                 max_concurrency=None, max_queued=None, request_timeout=None):
         """
         When constructing, the method checks that all in_t tensors are valid
         placeholders and all out_t tensors are valid tensors that exist in
@@ -66,36 +288,336 @@ class TFServeApp():
         :param str model_path: It can be a `.pb` file or directory containing checkpoint files.
         :param list[str] in_t: List of placeholder tensor names. Something like: ["input/image:0"]
         :param list[str] out_t: List of output tensor names. Something like: ["output/Softmax:0"]
-        :param encode: python function that receives the request body data and returns a `dict` mapping
-                        in_t to numpy values.
+        :param encode: python function that receives the request body data (a `bytearray`, not `bytes`) and
+                        returns a `dict` mapping in_t to numpy values.
         :param decode: python function that receives a `dict` mapping out_t to numpy values and returns
                         the response data (for example, a `dict` object that will be transformed to JSON).
                         The return object of this method will be the response to the request.
                         Read it's docs for more information on how to return certain objects (for example, images).
+                        If a `werkzeug.wrappers.Response` is returned, it is sent as is (useful for binary responses).
         :param list[str] out_t: List of output tensor names. Something like: ["output/Softmax:0"]
         :param boolean batch: If False, batch dimension (required by tensorflow) will be automatically
                                handled (that is, you don't need to handle it yourself in the encode/decode functions).
                                This option is ideal when dealing with single inferences.
                                If True, you can run multiple inferences at the same time by dealing
                                with the batch dimension yourself in the encode/decode functions.
+        :param int max_batch_size: If set, concurrent single inference requests (batch=False) are queued and
+                                   run together in batches of up to this size. Outputs are split back to each
+                                   request before decoding. Requires a model whose outputs keep the batch dimension.
+        :param int max_queue_delay_us: Maximum time (in microseconds) a request waits in the batching queue
+                                       for other requests to join its batch. Only used with max_batch_size.
+        :param list[int] bucket_boundaries: If set, the `bucket_axis` dimension of every encoded input is
+                                            zero-padded up to the next boundary before batching, so that
+                                            variable length inputs can share a batch. Only inputs whose
+                                            placeholder has an unknown `bucket_axis` dimension are padded.
+                                            The model must tolerate the padding, and outputs are not trimmed
+                                            back to the input length. Only used with max_batch_size.
+        :param int bucket_axis: Input dimension (not counting the batch dimension) padded to bucket_boundaries.
+        :param int sessions: Number of sessions, each one with its own replica of the graph, that serve
+                             requests in parallel.
+        :param int intra_op_threads: Threads per session used to parallelize a single op (TF default if None).
+        :param int inter_op_threads: Threads per session used to run independent ops (TF default if None).
+        :param str dispatch: How runs are spread among sessions: "round-robin" or "least-loaded".
+        :param boolean npz: If True, requests with Content-Type `application/x-npz` are read as a `.npz`
+                            archive with one array per input tensor (skipping encode), and responses are
+                            negotiated with the Accept header: `application/x-npz` returns all outputs as
+                            a `.npz` archive and `application/x-npy` the single output as a `.npy` file
+                            (skipping decode). Other requests and responses still use encode and decode.
+        :param int max_request_bytes: Requests with larger bodies are rejected with 413 before they are read
+                                      (default is no limit).
+        :param stream_parser: Function returning an incremental parser for each request body, used instead
+                              of encode (see `tfserve.streaming`). Usually the handler `stream_parser` method.
+        :param int cache_bytes: If set, outputs are cached in up to cache_bytes bytes, keyed by the
+                                content of the inputs. Requests with cached inputs skip the session
+                                and only run decode. Hits and misses are reported at '/stats'.
+        :param float cache_ttl: Seconds a cached output is valid for (default is no expiration).
+        :param str cache_policy: Cached outputs evicted first: "lru" or "lfu".
+        :param int response_cache_bytes: If set, successful responses are cached in up to response_cache_bytes
+                                         bytes, keyed by the raw request (route, content type and body).
+                                         Identical requests skip encode, the session and decode. Responses
+                                         have an ETag and requests with a matching If-None-Match get 304.
+                                         The cache expires with cache_ttl.
+        :param int response_cache_entry_bytes: Larger responses are not cached (default is 1/16 of
+                                               response_cache_bytes).
+        :param boolean metrics: If True, request counters and per-stage latency histograms are
+                                served at '/metrics' in the Prometheus text format.
+        :param str trace_dir: If set, a fraction trace_rate of the requests, and with trace_header
+                              requests with a `X-TFServe-Trace: 1` header, run the session with full
+                              tracing and their Chrome traces are written to trace_dir. Traced
+                              requests skip the caches and dynamic batching.
+        :param float trace_rate: Fraction of requests traced, between 0 and 1.
+        :param int max_traces: Number of traces kept in trace_dir, removing the oldest ones.
+        :param boolean trace_header: If True, clients can trace a request with the `X-TFServe-Trace`
+                                     header. Only for debugging on a trusted network.
+        :param warmup: If True, `warmup` runs random inputs generated from the placeholders dtypes
+                       and shapes through every session. If a path, it runs the recorded request
+                       bodies in the file (one JSON body per line) encoded with encode. Until
+                       `warmup` is called, '/ping' returns 503. `run` and `run_asgi` call it
+                       before listening.
+        :param list[int] warmup_batch_sizes: Batch sizes warmed up (default is 1 and, with
+                                             max_batch_size, the powers of two up to
+                                             max_batch_size). Not used with recorded requests
+                                             in batch mode.
+        :param boolean optimize: If True, the graph is pruned to the subgraph computing out_t from in_t
+                                 and optimized before it is served (see `tfserve.optimize`).
+        :param str freeze_cache_dir: If set and model_path is a checkpoint, its variables are converted to
+                                     constants for out_t and the frozen graph is cached in freeze_cache_dir,
+                                     keyed by the content of the checkpoint files. Later loads of the same
+                                     checkpoint read the cached graph instead of restoring the checkpoint.
+        :param str mmap_dir: If set, the graph is converted once to a memory-mapped layout in mmap_dir
+                             (see `tfserve.mmap_graph`): large constants are mapped from files instead of
+                             being copied to each session, so sessions and processes serving the model
+                             share them through the OS page cache. Checkpoints are frozen for out_t.
+        :param str name: Model name, added as a `model` label to metrics (see `tfserve.registry`).
+        :param int shared_threads: If set, sessions run ops in a process wide pool of shared_threads
+                                   threads, shared with every other session (and model) created with
+                                   the same value, instead of their own pools. inter_op_threads is
+                                   not used.
+        :param float reload_interval: If set, the model files are checked every reload_interval seconds
+                                      and the model is reloaded when they change (see `reload`).
+        :param int max_concurrency: If set, at most max_concurrency inference requests run at once and
+                                    up to max_queued more wait for them (see `tfserve.admission`).
+                                    Request bodies are read and the response cache is checked before
+                                    requests take a slot (use max_request_bytes to bound the bodies
+                                    read at once). Other requests get 429, and requests with a deadline
+                                    (`X-Request-Timeout` header, in seconds) that can't be met given
+                                    the observed session run latency get 503, also while queued and
+                                    right before the session runs.
+        :param int max_queued: Requests waiting to run with max_concurrency (default is max_concurrency).
+        :param float request_timeout: Deadline in seconds of requests without a `X-Request-Timeout`
+                                      header, with max_concurrency (default is no deadline).
 
         :raises ValueError: if in_t are not all placeholder or out_t contains non-existent graph tensors
         """
-        self.sess = load_model(model_path)
-        self.graph = self.sess.graph
-
+        if sessions < 1:
+            raise ValueError("sessions must be a positive integer")
         self.in_t = [graph_utils.smart_tensor_name(x) for x in in_t]
         self.out_t = [graph_utils.smart_tensor_name(x) for x in out_t]
 
-        graph_utils.check_tensors(self.graph, self.in_t)
-        graph_utils.check_tensors(self.graph, self.out_t)
+        self.model_path = model_path
+        self._sessions = sessions
+        self._dispatch = dispatch
+        self._load_args = (
+            session_config(intra_op_threads, inter_op_threads, shared_threads),
+            (self.in_t, self.out_t) if optimize else None,
+            self.out_t if freeze_cache_dir or mmap_dir else None,
+            freeze_cache_dir,
+            mmap_dir)
+        self._pool = self._load_pool(model_path)
+        self.sess = self._pool.sessions[0]
+        self.graph = self.sess.graph
 
-        graph_utils.check_placeholders(self.graph, self.in_t)
+        self._check_graph(self.graph)
+        self._plan = graph_utils.feed_plan(self.in_t, self.out_t, self.input_specs())
+        self._conversions = {}
+        self._conversions_lock = threading.Lock()
+        self._call = self._pool.make_callable(self.out_t, self.in_t)
 
         self.encode = encode
         self.decode = decode
 
         self.batch = batch
+        self.npz = npz
+        self.max_request_bytes = max_request_bytes
+        self.stream_parser = stream_parser
+
+        self._cache = None
+        if cache_bytes:
+            self._cache = ResultCache(cache_bytes, cache_ttl, cache_policy)
+        self.name = name
+        self._metrics = None
+        if metrics:
+            self._metrics = Metrics({"model": name} if name else None)
+
+        self._tracer = None
+        if trace_dir:
+            self._tracer = Tracer(trace_dir, trace_rate, max_traces, trace_header)
+
+        self._response_cache = None
+        if response_cache_bytes:
+            self._response_cache = ResponseCache(
+                response_cache_bytes, response_cache_entry_bytes, cache_ttl)
+
+        self._warmup = warmup
+        self._warmup_batch_sizes = warmup_batch_sizes or default_batch_sizes(max_batch_size)
+        self._warmup_stats = None
+        self.ready = not warmup
+
+        self._generation = 0
+        # Reentrant: _handle_reload holds it while calling reload.
+        self._reload_lock = threading.RLock()
+        self._reload_stats = None
+
+        # A `tfserve.versions.Shadow` mirroring inferences to a candidate
+        # version, set by `tfserve.versions.VersionManager`.
+        self.shadow = None
+
+        self._batcher = None
+        if max_batch_size:
+            if batch:
+                raise ValueError("max_batch_size can not be used in batch mode")
+            self._batcher = Batcher(
+                self._run_session, max_batch_size, max_queue_delay_us,
+                bucket_boundaries=bucket_boundaries, bucket_axis=bucket_axis,
+                num_workers=sessions, input_specs=self._plan.specs)
+
+        self._admission = None
+        if max_concurrency:
+            self._admission = AdmissionControl(max_concurrency, max_queued, request_timeout)
+
+        self._watcher = None
+        if reload_interval:
+            self._watcher = ModelWatcher(self, reload_interval)
+
+    def _load_pool(self, model_path):
+        return SessionPool(
+            [load_model(model_path, *self._load_args) for _ in range(self._sessions)],
+            self._dispatch)
+
+    def _check_graph(self, graph):
+        graph_utils.check_tensors(graph, self.in_t)
+        graph_utils.check_tensors(graph, self.out_t)
+
+        graph_utils.check_placeholders(graph, self.in_t)
+
+    def input_specs(self):
+        """
+        Return a `dict` mapping each in_t name to its (dtype, shape) in the graph.
+
+        dtype is a numpy dtype. shape is a list where unknown dimensions (like the
+        batch dimension) are None, or None if the placeholder rank is unknown.
+        """
+        return {name: graph_utils.tensor_spec(self.graph, name) for name in self.in_t}
+
+    def warmup(self):
+        """
+        Run the warmup inputs through every session, then report the app as
+        ready at '/ping'.
+
+        Returns the warmup statistics, also reported at '/stats'.
+
+        :raises ValueError: if the warmup inputs are not valid.
+        """
+        self._warmup_stats = self._warmup_pool(self._call, self._warmup_feeds(self._warmup))
+        self.ready = True
+        return self._warmup_stats
+
+    def _warmup_feeds(self, warmup):
+        """
+        Return the warmup feeds of the warmup constructor argument `warmup`.
+
+        :raises ValueError: if the warmup inputs can't be read or generated.
+        """
+        if warmup is True:
+            return synthetic_feeds(self.input_specs(), self._warmup_batch_sizes)
+        if warmup:
+            return recorded_feeds(
+                warmup, self.encode, self._warmup_batch_sizes, self.batch)
+        return []
+
+    def _reload_feeds(self, model_path):
+        """
+        Return the warmup feeds of a reloaded model: random inputs if warmup
+        is not set, or no feeds if random inputs can't be generated (for
+        example, for string inputs or inputs of unknown rank).
+        """
+        if self._warmup:
+            return self._warmup_feeds(self._warmup)
+        try:
+            return self._warmup_feeds(True)
+        except ValueError as e:
+            sys.stderr.write("tfserve: reloading %s without warmup: %s\n" % (model_path, e))
+            return []
+
+    def _warmup_pool(self, call, feeds):
+        """
+        Run warmup `feeds` through the callable of every session of `call`,
+        as returned by `SessionPool.make_callable` for out_t and in_t, and
+        return the warmup statistics.
+
+        Sessions are warmed up through the callables requests run on, so the
+        first request does not pay for the callable setup either.
+        """
+        start = time.perf_counter()
+        first_run = None
+        for feed_dict in feeds:
+            feed_dict = self._plan.prepare(
+                feed_dict, "Warmup inputs must include all and only input tensors")
+            feed_values = [feed_dict[name] for name in self._plan.in_t]
+            for sess_call in call.callables:
+                run_start = time.perf_counter()
+                sess_call(*feed_values)
+                if first_run is None:
+                    first_run = time.perf_counter() - run_start
+        return {
+            "runs": len(feeds) * len(call.callables),
+            "seconds": round(time.perf_counter() - start, 6),
+            "first_run_seconds": round(first_run, 6) if first_run is not None else None,
+        }
+
+    def reload(self, model_path=None):
+        """
+        Load the model again, from `model_path` if given, and serve it without
+        dropping requests.
+
+        The new model is loaded and checked like in the constructor, its
+        inputs must have the same dtypes and shapes, and it is warmed up (with
+        random inputs if warmup is not set and they can be generated) while
+        the served model keeps serving requests. Then new requests are sent to the new model, the
+        caches are cleared, and the old sessions are closed once their runs
+        in flight finish.
+
+        Returns the reload statistics, also reported at '/stats'.
+
+        :raises ValueError: if the new model is not valid. The served model is kept.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            model_path = model_path or self.model_path
+            try:
+                pool = self._load_pool(model_path)
+                try:
+                    graph = pool.sessions[0].graph
+                    self._check_graph(graph)
+                    specs = {name: graph_utils.tensor_spec(graph, name) for name in self.in_t}
+                    if specs != self.input_specs():
+                        raise ValueError("Reloaded model inputs must have the same dtypes and shapes")
+                    call = pool.make_callable(self.out_t, self.in_t)
+                    warmup_stats = self._warmup_pool(call, self._reload_feeds(model_path))
+                except Exception:
+                    pool.close()
+                    raise
+            except Exception:
+                self._reload_stats = self._next_reload_stats(failures=1)
+                raise
+
+            old_pool = self._pool
+            self._pool = pool
+            self._call = call
+            self.sess = pool.sessions[0]
+            self.graph = graph
+            self.model_path = model_path
+            self._generation += 1
+            if self._cache is not None:
+                self._cache.clear()
+            if self._response_cache is not None:
+                self._response_cache.clear()
+            drain = threading.Thread(target=old_pool.close, name="tfserve-drain")
+            drain.daemon = True
+            drain.start()
+
+            self._reload_stats = self._next_reload_stats(
+                reloads=1, model_path=model_path, warmup=warmup_stats,
+                seconds=round(time.perf_counter() - start, 6))
+            return self._reload_stats
+
+    def _next_reload_stats(self, reloads=0, failures=0, **last):
+        stats = dict(self._reload_stats or {"reloads": 0, "failures": 0})
+        stats["reloads"] += reloads
+        stats["failures"] += failures
+        if last:
+            stats["last"] = last
+        return stats
 
     def _make_inference(self, request: http.Request):
         """
@@ -114,98 +636,345 @@ class TFServeApp():
         """
         Implementation of _make_inference to decouple data interface from HTTP server interface.
 
-        req_bytes must be the unencoded HTTP request body as bytes.
+        req_bytes must be the unencoded HTTP request body as a bytes-like object.
 
         Returns a Python dict that can be encoded as a JSON HTTP response.
         """
-        feed_dict = self.encode(req_bytes)
-        if not self.batch:
-            feed_dict = {k: np.expand_dims(v, axis=0) for k, v in feed_dict.items()}
+        return self.decode(self._infer(self.encode(req_bytes)))
 
-        feed_dict = {graph_utils.smart_tensor_name(k): v for k, v in feed_dict.items()}
+    def _infer(self, feed_dict, trace=False, deadline=None):
+        """
+        Run the model on a feed dict as returned by the encode function.
 
-        graph_utils.check_input(feed_dict.keys(), self.in_t, "Encode function must generate all and only input tensors")
+        If `trace` is True, the session run is traced and skips the result
+        cache, the batcher and the shadow version. If `deadline` is set (see
+        `AdmissionControl.deadline`), the request is dropped before the
+        session runs if the deadline can't be met anymore.
 
-        out_map = {}
-        ret = self.sess.run(self.out_t, feed_dict=feed_dict)
-        for i, e in enumerate(self.out_t):
-            out_map[e] = ret[i] if self.batch else np.squeeze(ret[i])
+        Inputs are normalized and checked with the request plan built at init
+        (see `graph_utils.FeedPlan`) before the session runs. Arrays that
+        are not C-contiguous arrays of the placeholder dtype are converted and
+        counted at '/stats' and '/metrics'.
 
-        return self.decode(out_map)
-
-    def run(self, host, port, middleware=None):
-        """Werkzeug run implementation.
-
-        `middleware` may be provided as a function to handle
-        requests. It must accept the arguments `(handler, req)` where
-        `handler` is the TFServeApp request handler and `req` is the
-        request.
+        Returns a `dict` mapping out_t to output values, as expected by the
+        decode function.
 
+        :raises BadInput: if the inputs are not all and only in_t, or don't
+                          fit the dtypes and shapes of the placeholders.
+        :raises ServiceUnavailable: if the deadline can't be met.
         """
-        app = self._init_app(middleware)
-        server = serving.make_server(
-            host, port, app, threaded=True,
-            request_handler=serving.WSGIRequestHandler)
-        server.serve_forever()
-
-    def _init_app(self, middleware=None):
-        """Initialize a WSGI application for handling POST to '/'.
+        start = infer_start = time.perf_counter()
+        request_feed = feed_dict
+        try:
+            feed_dict = self._plan.prepare(
+                feed_dict, "Encode function must generate all and only input tensors",
+                add_batch_dim=not self.batch, on_convert=self._input_converted)
+        except ValueError as e:
+            raise BadInput(str(e))
+
+        use_cache = self._cache is not None and not trace
+        if use_cache:
+            cache_key = self._cache.key(feed_dict)
+            out_map = self._cache.get(cache_key)
+            if out_map is not None:
+                self._observe("feed_prep", start)
+                return out_map
+
+        if self._admission is not None:
+            self._admission.check(deadline)
+        start = self._observe("feed_prep", start)
+        generation = self._generation
+        out_map = {}
+        if self._batcher is not None and not trace:
+            ret = self._batcher.run(feed_dict)
+        else:
+            ret = self._run_session(feed_dict, trace)
+        now = self._observe("session_run", start)
+        if self._admission is not None and not trace:
+            self._admission.observe(now - start)
+        for name, value in zip(self._plan.out_t, ret):
+            out_map[name] = value if self.batch else np.squeeze(value)
+
+        if use_cache and generation == self._generation:
+            self._cache.put(cache_key, out_map)
+        if self.shadow is not None and not trace:
+            self.shadow.mirror(request_feed, out_map, time.perf_counter() - infer_start)
+        return out_map
+
+    def _input_converted(self, name, kind):
+        with self._conversions_lock:
+            counts = self._conversions.setdefault(name, {"dtype": 0, "layout": 0})
+            counts[kind] += 1
+        if self._metrics is not None:
+            self._metrics.input_converted(name, kind)
+
+    def _run_session(self, feed_dict, trace=False):
+        """
+        Run the session on a feed dict already keyed by in_t names.
 
-        `middleware` may be provided as WSGI middleware.
+        Runs use a callable made once for in_t and out_t (see
+        `SessionPool.make_callable`), fed with the inputs in in_t order. If
+        `trace` is True, the run is traced with `Session.run` and its trace
+        written by the tracer.
 
+        Returns the list of values for out_t.
         """
-        routes = routing.Map([
+        if trace:
+            return self._run_traced(feed_dict)
+        feed_values = [feed_dict[name] for name in self._plan.in_t]
+        while True:
+            try:
+                return self._call(*feed_values)
+            except PoolClosed:
+                # The model was reloaded, run on the new sessions.
+                continue
+
+    def _run_traced(self, feed_dict):
+        options, run_metadata = self._tracer.run_options()
+        while True:
+            try:
+                ret = self._pool.run(
+                    self.out_t, feed_dict=feed_dict, options=options, run_metadata=run_metadata)
+                break
+            except PoolClosed:
+                continue
+        self._tracer.write(run_metadata)
+        return ret
+
+    def _routes(self):
+        return routing.Map([
             routing.Rule('/', endpoint=self._handle_inference),
             routing.Rule('/ping', endpoint=self._handle_ping),
+            routing.Rule('/stats', endpoint=self._handle_stats),
+            routing.Rule('/metrics', endpoint=self._handle_metrics),
+            routing.Rule('/reload', endpoint=self._handle_reload),
             routing.Rule('/shutdown', endpoint=self._handle_shutdown),
         ])
-        def app(env, start_resp):
-            """WSGI application to handle server requests.
-
-            """
-            urls = routes.bind_to_environ(env)
-            try:
-                handler, _kw = urls.match()
-                req = Request(env)
-                if middleware:
-                    return middleware(handler, req)(env, start_resp)
-                return handler(req)(env, start_resp)
-            except HTTPException as e:
-                return e(env, start_resp)
-        return app
 
     def _handle_inference(self, req):
         """Handle inference request.
 
         """
+        if self._metrics is None:
+            return self._inference(req)
+        self._metrics.request_started()
+        start = time.perf_counter()
+        code = 500
+        try:
+            resp = self._inference(req)
+            code = resp.status_code
+            return resp
+        except HTTPException as e:
+            code = e.code
+            raise
+        except ValueError:
+            code = 400
+            raise
+        finally:
+            self._metrics.request_finished(code, time.perf_counter() - start)
+
+    def _inference(self, req):
         if req.method != 'POST':
             raise MethodNotAllowed(valid_methods=['POST'])
-        req_bytes = req.stream.read()
+        deadline = None
+        if self._admission is not None:
+            deadline = self._admission.deadline(req)
+        resp_type = None
+        if self.npz:
+            resp_type = _accept(req).best_match(RESPONSE_TYPES)
+            if resp_type is None:
+                raise NotAcceptable()
+            if resp_type == npz_utils.NPY_MEDIA_TYPE and len(self.out_t) != 1:
+                raise NotAcceptable("{} responses require a single output".format(resp_type))
+        npz_request = self.npz and _mimetype(req) == npz_utils.NPZ_MEDIA_TYPE
+        parser = None
+        if self.stream_parser is not None and not npz_request:
+            parser = self.stream_parser()
+        start = time.perf_counter()
         try:
-            resp_val = self._make_inference_impl(req_bytes)
+            req_bytes = streaming.read_body(
+                req.stream, req.content_length, self.max_request_bytes, parser)
         except BadInput as e:
             raise BadRequest(e.description)
-        return Response(json.dumps(resp_val), content_type='application/json')
+        self._observe("body_read", start)
+
+        trace = self._tracer is not None and self._tracer.should_trace(req)
+        if self._response_cache is None or trace:
+            return self._admitted_response(
+                req_bytes, parser, npz_request, resp_type, trace, deadline)
+        cache_key = self._response_cache.key(
+            req.path, _mimetype(req), resp_type or '', req_bytes)
+        entry = self._response_cache.get(cache_key)
+        if entry is None:
+            generation = self._generation
+            resp = self._admitted_response(
+                req_bytes, parser, npz_request, resp_type, deadline=deadline)
+            if resp.status_code != 200 or resp.is_streamed or generation != self._generation:
+                return resp
+            headers = [
+                (name, value) for name, value in resp.headers.to_wsgi_list()
+                if name.lower() not in ('content-length', 'etag')]
+            entry = self._response_cache.put(cache_key, resp.get_data(), headers)
+        return self._cached_response(req, entry)
+
+    def _admitted_response(self, req_bytes, parser, npz_request, resp_type, trace=False,
+                           deadline=None):
+        """
+        Run `_inference_response` once admission control (if enabled) admits
+        the request. Requests only hold a slot while they are encoded, run
+        and decoded: reading the body and response cache hits don't count.
+        """
+        if self._admission is None:
+            return self._inference_response(
+                req_bytes, parser, npz_request, resp_type, trace, deadline)
+        self._admission.acquire(deadline)
+        try:
+            return self._inference_response(
+                req_bytes, parser, npz_request, resp_type, trace, deadline)
+        finally:
+            self._admission.release()
+
+    def _inference_response(self, req_bytes, parser, npz_request, resp_type, trace=False,
+                            deadline=None):
+        """
+        Run inference on a request body and return the response.
+        """
+        start = time.perf_counter()
+        try:
+            if npz_request:
+                try:
+                    feed_dict = npz_utils.load_npz(req_bytes)
+                except ValueError as e:
+                    raise BadInput(str(e))
+            elif parser is not None:
+                feed_dict = parser.close(req_bytes)
+            else:
+                feed_dict = self.encode(req_bytes)
+            self._observe("encode", start)
+            out_map = self._infer(feed_dict, trace, deadline)
+            start = time.perf_counter()
+            if resp_type == npz_utils.NPZ_MEDIA_TYPE:
+                resp_val = Response(npz_utils.dump_npz(out_map), content_type=resp_type)
+            elif resp_type == npz_utils.NPY_MEDIA_TYPE:
+                resp_val = Response(npz_utils.dump_npy(out_map[self.out_t[0]]), content_type=resp_type)
+            else:
+                resp_val = self.decode(out_map)
+        except BadInput as e:
+            raise BadRequest(e.description)
+        start = self._observe("decode", start)
+        resp = self._make_response(resp_val)
+        self._observe("serialize", start)
+        return resp
+
+    def _observe(self, stage, start):
+        """
+        Record the time elapsed since `start` for `stage` and return the current time.
+        """
+        now = time.perf_counter()
+        if self._metrics is not None:
+            self._metrics.observe(stage, now - start)
+        return now
+
+    def _cached_response(self, req, entry):
+        """
+        Return a response from the response cache, or 304 Not Modified if the
+        request If-None-Match header matches its ETag.
+        """
+        if entry.etag in parse_etags(req.headers.get('If-None-Match')):
+            self._response_cache.not_modified()
+            resp = Response(status=304)
+            del resp.headers['Content-Type']
+        else:
+            resp = Response(entry.body, headers=entry.headers)
+        resp.set_etag(entry.etag)
+        return resp
 
     @staticmethod
-    def _handle_ping(_req):
+    def _make_response(resp_val):
+        if isinstance(resp_val, Response):
+            return resp_val
+        return Response(json.dumps(resp_val), content_type='application/json')
+
+    def _handle_ping(self, _req):
         """Handles ping request.
 
+        Returns 503 until the model is warmed up.
+
         """
+        if not self.ready:
+            return Response("warming up", status=503)
         return Response()
 
-    @staticmethod
-    def _handle_shutdown(req):
-        """Handles shutown request.
+    def _handle_stats(self, _req):
+        """Handles stats request.
+
+        """
+        return Response(json.dumps(self.stats()), content_type='application/json')
+
+    def _handle_metrics(self, _req):
+        """Handles Prometheus metrics request.
+
+        """
+        if self._metrics is None:
+            raise NotFound()
+        return Response(self._metrics.render(), content_type=self._metrics.content_type)
+
+    def _handle_reload(self, req):
+        """Handles model reload request.
+
+        Returns 409 if the model is already being reloaded and 500 if the
+        new model is not valid (the served model is kept). Returns 400 when
+        served by several prefork workers, since only the worker handling
+        the request would reload.
 
         """
         if req.method != 'POST':
             raise MethodNotAllowed(valid_methods=['POST'])
-        shutdown = req.environ.get('werkzeug.server.shutdown')
-        if not shutdown:
-            raise BadRequest("server does not support shutdown")
-        shutdown()
-        return Response()
+        if req.environ.get(prefork.WORKERS_ENVIRON_KEY, 1) > 1:
+            raise BadRequest("reload is not supported with several workers, use --reload-interval")
+        if not self._reload_lock.acquire(blocking=False):
+            raise Conflict("model is already being reloaded")
+        try:
+            stats = self.reload()
+        except Exception as e:  # pylint: disable=broad-except
+            raise InternalServerError("model reload failed: {}".format(e))
+        finally:
+            self._reload_lock.release()
+        return Response(json.dumps(stats), content_type='application/json')
+
+    def stats(self):
+        """
+        Return serving statistics as a JSON serializable dict.
+
+        `batching` maps each batching bucket to its occupancy and padding waste
+        (only when dynamic batching is enabled). `cache` has the result cache
+        hits, misses and size (only when the cache is enabled), and
+        `response_cache` the same for the response cache. `warmup` has the
+        number of warmup runs and their duration (only after a warmup), and
+        `reload` the number of model reloads and failures and the last
+        reload (only after a reload). `admission` has the admitted and
+        rejected requests (only with admission control). `input_conversions` maps each input to
+        the number of arrays converted to its placeholder dtype (`dtype`) or
+        copied to a C-contiguous array (`layout`), only after conversions.
+        """
+        stats = {}
+        if self._batcher is not None:
+            stats["batching"] = self._batcher.stats()
+        if self._cache is not None:
+            stats["cache"] = self._cache.stats()
+        if self._response_cache is not None:
+            stats["response_cache"] = self._response_cache.stats()
+        if self._warmup_stats is not None:
+            stats["warmup"] = self._warmup_stats
+        if self._reload_stats is not None:
+            stats["reload"] = self._reload_stats
+        if self._admission is not None:
+            stats["admission"] = self._admission.stats()
+        with self._conversions_lock:
+            if self._conversions:
+                stats["input_conversions"] = {
+                    name: dict(counts) for name, counts in self._conversions.items()}
+        return stats
 
     def run_apistar(self, *args, **kwargs):
         """
@@ -225,3 +994,10 @@ class TFServeApp():
         app = App(routes=routes)
         app.serve(*args, **kwargs)
 
+
+def _mimetype(req):
+    return parse_options_header(req.headers.get('Content-Type', ''))[0]
+
+
+def _accept(req):
+    return parse_accept_header(req.headers.get('Accept') or '*/*', MIMEAccept)
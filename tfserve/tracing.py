@@ -0,0 +1,112 @@
+"""
+On demand tensorflow traces.
+
+Sampled requests, and if enabled requests with a TRACE_HEADER header, run
+the session with full tracing. Their step stats are written as Chrome trace
+files (open them in chrome://tracing) to a directory that keeps the most
+recent traces only.
+
+Full tracing slows the traced run down and each trace is a file on disk, so
+the header is disabled by default: enable it only for debugging, when the
+server can only be reached by trusted clients.
+"""
+
+import datetime
+import itertools
+import os
+import random
+import threading
+
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+TRACE_HEADER = "X-TFServe-Trace"
+
+DEFAULT_MAX_TRACES = 100
+
+_TRACE_PREFIX = "trace-"
+_TRACE_SUFFIX = ".json"
+
+
+class Tracer():
+    """
+    Decides which requests are traced and writes their traces.
+
+    :param str trace_dir: directory where traces are written (created if needed).
+    :param float sample_rate: fraction of requests traced, between 0 and 1.
+    :param int max_traces: number of traces kept, removing the oldest ones. Each
+                           process serving the model keeps its own traces.
+    :param bool trace_header: trace requests with a TRACE_HEADER header. Any
+                              client can then force traced runs.
+    """
+
+    def __init__(self, trace_dir, sample_rate=0.0, max_traces=DEFAULT_MAX_TRACES,
+                 trace_header=False):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        if max_traces < 1:
+            raise ValueError("max_traces must be a positive integer")
+        self.trace_dir = trace_dir
+        self.sample_rate = sample_rate
+        self.max_traces = max_traces
+        self.trace_header = trace_header
+        self._lock = threading.Lock()
+        self._counter = itertools.count()
+        self._traces = None
+        os.makedirs(trace_dir, exist_ok=True)
+
+    def should_trace(self, req):
+        """
+        Return True if request `req` must be traced.
+        """
+        value = req.headers.get(TRACE_HEADER) if self.trace_header else None
+        if value is not None:
+            return value.strip().lower() not in ("", "0", "false", "no")
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    @staticmethod
+    def run_options():
+        """
+        Return the `tf.RunOptions` and `tf.RunMetadata` of a traced session run.
+        """
+        return tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE), tf.RunMetadata()
+
+    def write(self, run_metadata):
+        """
+        Write the trace of a session run as a Chrome trace file.
+
+        Returns the path of the trace file.
+        """
+        trace = timeline.Timeline(run_metadata.step_stats).generate_chrome_trace_format()
+        return self.save(trace)
+
+    def save(self, trace):
+        """
+        Save a Chrome trace (a JSON string) and remove the oldest traces if
+        there are more than `max_traces`.
+
+        Returns the path of the trace file.
+        """
+        name = "%s%s-%i-%i%s" % (
+            _TRACE_PREFIX, datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f"),
+            os.getpid(), next(self._counter), _TRACE_SUFFIX)
+        path = os.path.join(self.trace_dir, name)
+        with open(path, "w") as f:
+            f.write(trace)
+        with self._lock:
+            if self._traces is None:
+                self._traces = sorted(p for p in self._existing_traces() if p != path)
+            self._traces.append(path)
+            while len(self._traces) > self.max_traces:
+                try:
+                    os.remove(self._traces.pop(0))
+                except OSError:
+                    pass
+        return path
+
+    def _existing_traces(self):
+        return [
+            os.path.join(self.trace_dir, name)
+            for name in os.listdir(self.trace_dir)
+            if name.startswith(_TRACE_PREFIX) and name.endswith(_TRACE_SUFFIX)
+        ]
@@ -0,0 +1,292 @@
+"""
+Model versions.
+
+A VersionManager serves several versions of the same model (TFServeApps with
+the same inputs and outputs) at '/', so a new version can be rolled out
+gradually. Requests are split between the versions by weight, or sent to
+the version named in their `X-TFServe-Version` header (canary requests).
+
+A shadow version doesn't answer requests: a sampled fraction of the requests
+served by the other versions is run on it in the background, off the
+response path, and its latency and the difference between its outputs and
+the served ones are reported at '/stats'. This measures a new version under
+real load before it serves any request.
+"""
+
+import collections
+import itertools
+import json
+import queue
+import random
+import threading
+import time
+
+import numpy as np
+from werkzeug import routing
+from werkzeug.exceptions import NotFound
+from werkzeug.wrappers import Response
+
+from tfserve.tfserve import MultiModelApp
+
+# Request header naming the version that serves a request, also set in responses.
+VERSION_HEADER = 'X-TFServe-Version'
+
+DEFAULT_SHADOW_RATE = 0.1
+
+# Mirrored requests waiting for the shadow version. More are dropped, so a
+# slow shadow version never delays the served versions.
+DEFAULT_MAX_PENDING = 64
+
+# Number of recent shadow runs the latency and divergence percentiles are
+# computed from.
+DEFAULT_WINDOW = 1000
+
+
+class Shadow():
+    """
+    Runs a sampled fraction of the inferences of other versions on a
+    candidate version in a background thread, and compares the latency and
+    outputs of both.
+
+    Versions call `mirror` with their inputs and outputs (see
+    `TFServeApp.shadow`).
+
+    :param candidate: TFServeApp of the candidate version.
+    :param float rate: fraction of the inferences mirrored, between 0 and 1.
+    :param float tolerance: outputs with a larger absolute difference are
+                            counted as diverged.
+    :param int max_pending: mirrored inferences waiting for the candidate;
+                            more are dropped.
+    :param int window: number of recent runs percentiles are computed from.
+    """
+
+    def __init__(self, candidate, rate=DEFAULT_SHADOW_RATE, tolerance=1e-6,
+                 max_pending=DEFAULT_MAX_PENDING, window=DEFAULT_WINDOW):
+        if not 0 <= rate <= 1:
+            raise ValueError("rate must be between 0 and 1")
+        self.candidate = candidate
+        self.rate = rate
+        self.tolerance = tolerance
+        self._queue = queue.Queue(max_pending)
+        self._lock = threading.Lock()
+        self._counts = {"mirrored": 0, "dropped": 0, "errors": 0, "mismatches": 0, "diverged": 0}
+        self._served_seconds = collections.deque(maxlen=window)
+        self._shadow_seconds = collections.deque(maxlen=window)
+        self._divergence = collections.deque(maxlen=window)
+        self._max_divergence = 0.0
+        self._thread = threading.Thread(target=self._loop, name="tfserve-shadow")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def mirror(self, feed_dict, out_map, seconds):
+        """
+        Maybe run `feed_dict` (as passed to `TFServeApp._infer`) on the
+        candidate, and compare its outputs with `out_map`, computed by the
+        served version in `seconds`. Returns without waiting for the run.
+        """
+        if self.rate < 1 and random.random() >= self.rate:
+            return
+        try:
+            self._queue.put_nowait((feed_dict, out_map, seconds))
+        except queue.Full:
+            with self._lock:
+                self._counts["dropped"] += 1
+
+    def _loop(self):
+        while True:
+            feed_dict, out_map, seconds = self._queue.get()
+            start = time.perf_counter()
+            try:
+                shadow_map = self.candidate._infer(feed_dict)
+            except Exception:  # pylint: disable=broad-except
+                with self._lock:
+                    self._counts["errors"] += 1
+                continue
+            shadow_seconds = time.perf_counter() - start
+            diff = divergence(out_map, shadow_map)
+            with self._lock:
+                self._counts["mirrored"] += 1
+                self._served_seconds.append(seconds)
+                self._shadow_seconds.append(shadow_seconds)
+                if diff is None:
+                    self._counts["mismatches"] += 1
+                    continue
+                self._divergence.append(diff)
+                self._max_divergence = max(self._max_divergence, diff)
+                if diff > self.tolerance:
+                    self._counts["diverged"] += 1
+
+    def stats(self):
+        """
+        Return the shadow statistics as a JSON serializable dict.
+
+        `mirrored` runs finished on the candidate, `dropped` because too many
+        were pending and `errors` that failed. `latency_ms` has the latency
+        percentiles of the same inferences on the served versions and on the
+        candidate. `divergence` has the percentiles of the largest absolute
+        difference between the outputs of each run, `diverged` the runs with
+        a difference larger than the tolerance and `mismatches` the runs with
+        outputs of different shapes or values that are not numbers.
+        """
+        with self._lock:
+            stats = dict(self._counts, rate=self.rate)
+            stats["latency_ms"] = {
+                "served": _percentiles(self._served_seconds, 1e3),
+                "shadow": _percentiles(self._shadow_seconds, 1e3),
+            }
+            stats["divergence"] = dict(
+                _percentiles(self._divergence), max=self._max_divergence)
+        return stats
+
+
+def divergence(expected, actual):
+    """
+    Return the largest absolute difference between the values of two dicts
+    of outputs, or None if they can't be compared: an output is missing or
+    has a different shape, or non numeric values are different.
+    """
+    result = 0.0
+    for name, value in expected.items():
+        if name not in actual:
+            return None
+        value = np.asarray(value)
+        other = np.asarray(actual[name])
+        if value.shape != other.shape:
+            return None
+        if value.dtype.kind not in 'biuf' or other.dtype.kind not in 'biuf':
+            if not np.array_equal(value, other):
+                return None
+            continue
+        value = value.astype(np.float64)
+        other = other.astype(np.float64)
+        nan = np.isnan(value)
+        if not np.array_equal(nan, np.isnan(other)):
+            return None
+        diff = np.abs(value - other)[~nan]
+        if diff.size:
+            result = max(result, float(np.max(diff)))
+    return result
+
+
+def _percentiles(values, scale=1.0):
+    if not values:
+        return {"p50": None, "p99": None}
+    p50, p99 = np.percentile(np.asarray(values) * scale, [50, 99])
+    return {"p50": round(float(p50), 6), "p99": round(float(p99), 6)}
+
+
+class VersionManager(MultiModelApp):
+    """
+    Serves several versions of a model at '/'.
+
+    A request is served by the version named in its X-TFServe-Version header
+    or else by a version chosen at random in proportion to its weight. The
+    response has the name of the version that served it in the same header.
+
+    '/versions' lists the versions and their weights and a POST to
+    '/versions/<name>/reload' reloads a version (see `TFServeApp.reload`).
+    '/stats' and '/metrics' report every version, with a `version` label in
+    metrics, and '/stats' the shadow version.
+
+    :param dict versions: mapping from version name to TFServeApp. Versions must
+                          have the same inputs and outputs.
+    :param dict weights: mapping from version name to its share of the requests.
+                         Other versions only serve requests with the header.
+                         Default is all requests to the first version.
+    :param str shadow: name of a version that runs a fraction shadow_rate of the
+                       requests served by the other versions (see `Shadow`).
+    :param float shadow_rate: fraction of the requests mirrored to shadow.
+    """
+
+    def __init__(self, versions, weights=None, shadow=None, shadow_rate=DEFAULT_SHADOW_RATE):
+        super(VersionManager, self).__init__(versions, "version")
+        self.versions = self.apps
+        first = next(iter(self.versions.values()))
+        for app in self.versions.values():
+            if app.in_t != first.in_t or app.out_t != first.out_t:
+                raise ValueError("versions must have the same inputs and outputs")
+        if weights is None:
+            weights = {next(iter(self.versions)): 1}
+        for name, weight in weights.items():
+            if name not in self.versions:
+                raise ValueError("unknown version: {}".format(name))
+            if weight < 0:
+                raise ValueError("version weights must not be negative")
+        if sum(weights.values()) <= 0:
+            raise ValueError("at least one version weight must be positive")
+        self.weights = dict(weights)
+        self._names = list(self.weights)
+        self._cum_weights = list(itertools.accumulate(self.weights[name] for name in self._names))
+
+        self.shadow = None
+        if shadow is not None:
+            if shadow not in self.versions:
+                raise ValueError("unknown version: {}".format(shadow))
+            self.shadow = Shadow(self.versions[shadow], shadow_rate)
+        for name, app in self.versions.items():
+            if name != shadow:
+                app.shadow = self.shadow
+            if app._metrics is not None:
+                app._metrics.labels["version"] = name
+
+    def choose(self, req):
+        """
+        Return the name of the version that serves request `req`.
+
+        :raises NotFound: if the request header names an unknown version.
+        """
+        name = req.headers.get(VERSION_HEADER)
+        if name is None:
+            return random.choices(self._names, cum_weights=self._cum_weights)[0]
+        if name not in self.versions:
+            raise NotFound("unknown model version: {}".format(name))
+        return name
+
+    def _routes(self):
+        rules = [
+            routing.Rule('/versions/{}/reload'.format(name), endpoint=app._handle_reload)
+            for name, app in self.versions.items()
+        ]
+        return routing.Map(rules + [
+            routing.Rule('/', endpoint=self._handle_inference),
+            routing.Rule('/versions', endpoint=self._handle_versions),
+            routing.Rule('/ping', endpoint=self._handle_ping),
+            routing.Rule('/stats', endpoint=self._handle_stats),
+            routing.Rule('/metrics', endpoint=self._handle_metrics),
+            routing.Rule('/shutdown', endpoint=self._handle_shutdown),
+        ])
+
+    def _handle_inference(self, req):
+        """Handle inference request with the version chosen for it.
+
+        """
+        name = self.choose(req)
+        resp = self.versions[name]._handle_inference(req)
+        resp.headers[VERSION_HEADER] = name
+        return resp
+
+    def _handle_versions(self, _req):
+        """Handles versions request.
+
+        """
+        versions = {
+            name: {
+                "model_path": app.model_path,
+                "weight": self.weights.get(name, 0),
+                "shadow": self.shadow is not None and app is self.shadow.candidate,
+                "ready": app.ready,
+            }
+            for name, app in self.versions.items()
+        }
+        return Response(json.dumps(versions), content_type='application/json')
+
+    def stats(self):
+        """
+        Return the serving statistics of each version (see `TFServeApp.stats`)
+        in `versions` and the shadow statistics (see `Shadow.stats`) in
+        `shadow`, only with a shadow version.
+        """
+        stats = {"versions": super(VersionManager, self).stats()}
+        if self.shadow is not None:
+            stats["shadow"] = self.shadow.stats()
+        return stats
@@ -0,0 +1,115 @@
+"""
+Model warmup.
+
+Tensorflow allocates memory and optimizes the graph during the first runs
+of a session, so the first requests served by a new model are much slower.
+Warmup runs synthetic inputs, generated from the placeholders dtypes and
+shapes, or recorded request bodies through every session for each expected
+batch size before the model serves requests.
+"""
+
+import json
+
+import numpy as np
+
+
+def default_batch_sizes(max_batch_size=None):
+    """
+    Return the batch sizes warmed up by default: 1 and, with dynamic
+    batching, the powers of two up to `max_batch_size` and `max_batch_size`.
+    """
+    sizes = [1]
+    while max_batch_size and sizes[-1] * 2 < max_batch_size:
+        sizes.append(sizes[-1] * 2)
+    if max_batch_size and max_batch_size > 1:
+        sizes.append(max_batch_size)
+    return sizes
+
+
+def synthetic_feeds(specs, batch_sizes, dim_size=1, seed=0):
+    """
+    Return one feed dict with random values for placeholder `specs` (as
+    returned by `TFServeApp.input_specs`) per batch size. Unknown dimensions
+    other than the batch dimension have `dim_size` elements.
+
+    :raises ValueError: if values of an input can't be generated.
+    """
+    return [
+        generate_inputs(specs, 1, batch_size, dim_size, seed)[0]
+        for batch_size in batch_sizes
+    ]
+
+
+def recorded_feeds(path, encode, batch_sizes, batch=False):
+    """
+    Return feed dicts from the recorded request bodies in `path`, a file with
+    one JSON request body per line, encoded with `encode`.
+
+    Unless `batch` is True, each encoded input is repeated to fill one batch
+    of each batch size. In batch mode, requests already contain a batch and
+    are used as they are.
+
+    :raises ValueError: if the file is not valid.
+    """
+    feeds = []
+    for body in read_requests(path):
+        feed_dict = encode(body)
+        if batch:
+            feeds.append(feed_dict)
+            continue
+        for batch_size in batch_sizes:
+            feeds.append({
+                name: np.repeat(np.expand_dims(value, axis=0), batch_size, axis=0)
+                for name, value in feed_dict.items()
+            })
+    return feeds
+
+
+def generate_inputs(specs, count, batch_size=None, dim_size=1, seed=0):
+    """
+    Generate `count` input `dict`s with random values for placeholder `specs`
+    (as returned by `TFServeApp.input_specs`).
+
+    Inputs are single values (without the batch dimension), or batches of
+    `batch_size` values. Unknown dimensions have `dim_size` elements.
+
+    :raises ValueError: if a placeholder has an unknown rank.
+    """
+    rng = np.random.RandomState(seed)
+    inputs = []
+    for _ in range(count):
+        values = {}
+        for name, (dtype, shape) in specs.items():
+            if shape is None:
+                raise ValueError("unknown rank of input {}".format(name))
+            shape = [dim_size if d is None else d for d in shape[1:]]
+            if batch_size is not None:
+                shape = [batch_size] + shape
+            values[name] = _random_array(rng, dtype, shape)
+        inputs.append(values)
+    return inputs
+
+
+def _random_array(rng, dtype, shape):
+    if dtype.kind == 'f':
+        return rng.standard_normal(shape).astype(dtype)
+    if dtype.kind in 'iu':
+        return rng.randint(0, 10, size=shape).astype(dtype)
+    if dtype.kind == 'b':
+        return rng.randint(0, 2, size=shape).astype(dtype)
+    raise ValueError("can't generate values of dtype {}".format(dtype))
+
+
+def read_requests(path):
+    """
+    Read request bodies from a file with one JSON request body per line.
+    """
+    with open(path, 'rb') as f:
+        bodies = [line.strip() for line in f]
+    bodies = [body for body in bodies if body]
+    for i, body in enumerate(bodies):
+        try:
+            json.loads(body.decode('utf-8'))
+        except ValueError as e:
+            raise ValueError("{}:{}: invalid JSON: {}".format(path, i + 1, e))
+    return bodies